@@ -0,0 +1,53 @@
+"""
+Shared helpers of the benchmark scripts. The scripts are run from the root
+of the repo against the extension built in place:
+
+    python setup.py build_ext --inplace
+    PYTHONPATH=src python benchmarks/<script>.py
+
+They print plain tables and check nothing, the tests do that.
+"""
+
+import time
+
+import numpy as np
+
+# the size the numbers in the commit messages were taken at
+HEIGHT, WIDTH = 3000, 4000
+
+
+def noise_image(h=HEIGHT, w=WIDTH, dtype=np.uint16, seed=0):
+    """A uniformly random image, the worst case for most of the ops."""
+    rng = np.random.default_rng(seed)
+    high = np.iinfo(dtype).max
+    return rng.integers(0, high, (h, w), dtype=dtype, endpoint=True)
+
+
+def gradient_image(h=HEIGHT, w=WIDTH, dtype=np.uint16):
+    """A horizontal gradient from black to white."""
+    high = np.iinfo(dtype).max
+    row = np.linspace(0, high, w).round().astype(dtype)
+    return np.ascontiguousarray(np.broadcast_to(row, (h, w)))
+
+
+def best_of(fn, repeat=3):
+    """The fastest of repeat calls of fn, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def megapixels(shape, seconds):
+    """The throughput in megapixels per second."""
+    return shape[0] * shape[1] / seconds / 1e6
+
+
+def size_args(parser):
+    """Adds --height, --width and --repeat to an argparse parser."""
+    parser.add_argument("--height", type=int, default=HEIGHT)
+    parser.add_argument("--width", type=int, default=WIDTH)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser
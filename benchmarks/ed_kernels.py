@@ -0,0 +1,48 @@
+"""
+The unrolled integer error diffusions generated by core/compiler/ed_compiler.py
+against the generic float ed/eds they replaced, for every kernel and both
+scan directions, on a single thread:
+
+    PYTHONPATH=src python benchmarks/ed_kernels.py
+"""
+
+import argparse
+
+from common import best_of, megapixels, noise_image, size_args
+
+from hopfer.core.algorithms.cython_ops import ED_KERNELS, ed, ed_kernel, eds
+from hopfer.helpers.kernels import get_kernel
+
+
+def compare(img, name, serpentine, repeat):
+    """The generic and the unrolled version of a kernel, in seconds."""
+    kernel = get_kernel(name)
+    kernel_id = ED_KERNELS[name]
+    if serpentine:
+        generic = best_of(lambda: eds(img, kernel, 1.0), repeat)
+    else:
+        generic = best_of(lambda: ed(img, kernel, 1.0, 1), repeat)
+    unrolled = best_of(
+        lambda: ed_kernel(img, kernel_id, 1.0, serpentine, 1), repeat
+    )
+    return generic, unrolled
+
+
+def main():
+    args = size_args(argparse.ArgumentParser(description=__doc__)).parse_args()
+    img = noise_image(args.height, args.width)
+
+    print(f"{args.width}x{args.height}, best of {args.repeat}, MP/s")
+    print(f"{'':22} {'raster':>16} {'serpentine':>16}")
+    for name in ED_KERNELS:
+        row = f"{name:22}"
+        for serpentine in (False, True):
+            generic, unrolled = compare(img, name, serpentine, args.repeat)
+            before = megapixels(img.shape, generic)
+            after = megapixels(img.shape, unrolled)
+            row += f" {before:6.1f} -> {after:6.1f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
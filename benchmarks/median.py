@@ -0,0 +1,64 @@
+"""
+The 16 bit median of cython_ops, what "median_exact" turns on, against
+the default way through uint8 for cv2.medianBlur and back, which loses
+the low byte:
+
+    PYTHONPATH=src python benchmarks/median.py
+    PYTHONPATH=src python benchmarks/median.py --ksize 7 25 51
+
+cv2.medianBlur on the uint8 image is listed as well, uint8 still goes
+through it.
+"""
+
+import argparse
+from functools import partial
+
+import cv2
+import numpy as np
+from common import best_of, gradient_image, noise_image, size_args
+
+from hopfer.core.algorithms.cython_ops import median
+
+
+def photo_like(h, w):
+    """Smooth areas with some grain on top, closer to a photo than noise."""
+    rng = np.random.default_rng(0)
+    small = rng.random((max(1, h // 64), max(1, w // 64)), dtype=np.float32)
+    img = cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+    img += rng.normal(0, 0.02, (h, w)).astype(np.float32)
+    return (np.clip(img, 0, 1) * 65535).astype(np.uint16)
+
+
+def through_uint8(img, ksize):
+    small = (img >> 8).astype(np.uint8)
+    cv2.medianBlur(small, ksize, dst=small)
+    return small.astype(np.uint16) << 8
+
+
+def main():
+    parser = size_args(argparse.ArgumentParser(description=__doc__))
+    parser.add_argument("--ksize", type=int, nargs="+", default=[7, 25, 51])
+    args = parser.parse_args()
+    h, w = args.height, args.width
+    images = [
+        ("photo-like", photo_like(h, w)),
+        ("gradient", gradient_image(h, w)),
+        ("noise", noise_image(h, w)),
+    ]
+
+    print(f"{w}x{h}, best of {args.repeat}, ms")
+    print(f"{'':16} {'k':>3} {'via uint8':>10} {'uint16':>8} {'uint8 cv2':>10}")
+    for name, img in images:
+        img_u8 = (img >> 8).astype(np.uint8)
+        for ksize in args.ksize:
+            old = best_of(partial(through_uint8, img, ksize), args.repeat)
+            new = best_of(partial(median, img, ksize), args.repeat)
+            u8 = best_of(partial(cv2.medianBlur, img_u8, ksize), args.repeat)
+            print(
+                f"{name:16} {ksize:3} {old * 1e3:10.0f} {new * 1e3:8.0f} "
+                f"{u8 * 1e3:10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+The ordered dithers on a 16 bit image, natively against a 16 bit matrix and
+the way they ran before, shifted down to 8 bit first. Prints the time of
+both, how many pixels differ and how close the density of each is to the
+mean of the image:
+
+    PYTHONPATH=src python benchmarks/ordered_16bit.py
+"""
+
+import argparse
+
+import numpy as np
+from common import best_of, gradient_image, noise_image, size_args
+
+from hopfer.core.algorithms.bayer import bayer, clustered
+from hopfer.core.defaults import DEFAULT_SETTINGS
+
+CASES = [
+    ("Bayer", bayer, DEFAULT_SETTINGS["Bayer"]),
+    ("Clustered dot", clustered, DEFAULT_SETTINGS["Clustered dot"]),
+]
+
+
+def main():
+    args = size_args(argparse.ArgumentParser(description=__doc__)).parse_args()
+    images = [
+        ("gradient", gradient_image(args.height, args.width)),
+        ("noise", noise_image(args.height, args.width)),
+    ]
+
+    print(f"{args.width}x{args.height}, best of {args.repeat}")
+    print(
+        f"{'':24} {'8 bit ms':>9} {'16 bit ms':>10} {'differ':>8} "
+        f"{'mean':>7} {'8 bit':>7} {'16 bit':>7}"
+    )
+    for image_name, img in images:
+        mean = img.mean() / 65535
+        for name, dither, settings in CASES:
+
+            def shifted(img=img, dither=dither, settings=settings):
+                return dither((img >> 8).astype(np.uint8), settings)
+
+            def native(img=img, dither=dither, settings=settings):
+                return dither(img, settings)
+
+            before = np.asarray(shifted())
+            after = np.asarray(native())
+            print(
+                f"{name + ', ' + image_name:24} "
+                f"{best_of(shifted, args.repeat) * 1e3:9.1f} "
+                f"{best_of(native, args.repeat) * 1e3:10.1f} "
+                f"{(before != after).mean():8.2%} "
+                f"{mean:7.4f} {before.mean():7.4f} {after.mean():7.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
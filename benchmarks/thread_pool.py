@@ -0,0 +1,74 @@
+"""
+The throughput of the cython_ops on several independent images at once, in a
+ThreadPoolExecutor with a thread per image, against the same images one after
+the other on a single worker. OpenMP is held to one thread, so what scales is
+only the pool, which works as the ops release the GIL:
+
+    PYTHONPATH=src python benchmarks/thread_pool.py
+    PYTHONPATH=src python benchmarks/thread_pool.py --images 2 4 8
+
+The ops are the ones of threads.py. At most as many images as cores can
+speed up, past that the numbers only show what oversubscribing costs.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from common import best_of, megapixels, size_args
+from threads import cases
+
+
+def run_all(runs, workers):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # list() so exceptions from the workers are raised here
+        list(pool.map(lambda run: run(), runs))
+
+
+def main():
+    parser = size_args(argparse.ArgumentParser(description=__doc__))
+    # smaller than the other scripts, every image has all of its inputs
+    parser.set_defaults(height=1500, width=2000)
+    parser.add_argument(
+        "--images",
+        type=int,
+        nargs="+",
+        default=sorted({2, os.cpu_count() or 1}),
+    )
+    args = parser.parse_args()
+
+    # OpenMP reads it once when it starts, so the script runs again with it
+    if os.environ.get("OMP_NUM_THREADS") != "1":
+        env = {**os.environ, "OMP_NUM_THREADS": "1"}
+        subprocess.run([sys.executable, __file__, *sys.argv[1:]], env=env)
+        return
+
+    shape = (args.height, args.width)
+    results = {}
+    for n in args.images:
+        # the ops of every image, each on inputs of its own
+        per_image = [cases(*shape) for _ in range(n)]
+        for i, (name, _) in enumerate(per_image[0]):
+            runs = [ops[i][1] for ops in per_image]
+            serial = best_of(partial(run_all, runs, 1), args.repeat)
+            pooled = best_of(partial(run_all, runs, n), args.repeat)
+            results.setdefault(name, {})[n] = (
+                megapixels(shape, serial / n),
+                megapixels(shape, pooled / n),
+            )
+
+    print(
+        f"{args.width}x{args.height}, best of {args.repeat}, MP/s over all "
+        f"images, 1 worker / a worker per image, {os.cpu_count()} cores"
+    )
+    print(f"{'':16}" + "".join(f"{f'{n} images':>16}" for n in args.images))
+    for name, row in results.items():
+        cells = (f"{row[n][0]:7.1f} /{row[n][1]:7.1f}" for n in args.images)
+        print(f"{name:16}" + "".join(f"{cell:>16}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
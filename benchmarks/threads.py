@@ -0,0 +1,104 @@
+"""
+The throughput of the cython_ops at every OMP_NUM_THREADS. OpenMP reads the
+variable once when it starts, so every thread count runs in a process of its
+own:
+
+    PYTHONPATH=src python benchmarks/threads.py
+    PYTHONPATH=src python benchmarks/threads.py --threads 1 2 4 8
+
+Normalize and equalize work in place and are timed on a fresh copy, the copy
+is part of their time. On fewer cores than threads nothing gets faster, the
+numbers then only show what oversubscribing costs.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+import numpy as np
+from common import best_of, megapixels, noise_image, size_args
+
+from hopfer.core.algorithms.bayer import generate_bayer_matrix
+from hopfer.core.algorithms.cython_ops import (
+    ED_KERNELS,
+    ed_kernel,
+    equalize,
+    luminance,
+    niblack,
+    noise_gen,
+    normalize,
+    ordered_dither,
+    sauvola,
+)
+
+
+def cases(h, w):
+    """The ops as (name, call), on images of h x w."""
+    img = noise_image(h, w)
+    img_u8 = noise_image(h, w, np.uint8)
+    rgb = noise_image(h, w * 3, np.uint8).reshape(h, w, 3)
+    # not the full range, or normalize has nothing to do
+    narrow = (img // 2 + 16384).astype(np.uint16)
+    bayer = generate_bayer_matrix(3, bit_depth=16)
+    fs = ED_KERNELS["Floyd-Steinberg"]
+
+    return [
+        ("luminance", lambda: luminance(rgb)),
+        ("normalize u16", lambda: normalize(narrow.copy())),
+        ("equalize u16", lambda: equalize(img.copy())),
+        ("niblack", lambda: niblack(img_u8, 25, 0.2)),
+        ("sauvola", lambda: sauvola(img_u8, 25, 0.5, 0.2)),
+        ("bayer u16", lambda: ordered_dither(img, bayer)),
+        # 20 rows of noise, as many pixels as the image
+        ("noise_gen", lambda: noise_gen(h * w // 20)),
+        ("ed_kernel FS", lambda: ed_kernel(img, fs, 1.0, False, 0)),
+    ]
+
+
+def child(args):
+    # prints name and MP/s per line for the parent to pick up
+    for name, run in cases(args.height, args.width):
+        seconds = best_of(run, args.repeat)
+        print(f"{name}\t{megapixels((args.height, args.width), seconds)}")
+
+
+def main():
+    parser = size_args(argparse.ArgumentParser(description=__doc__))
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+    )
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    results = {}
+    for threads in args.threads:
+        env = {**os.environ, "OMP_NUM_THREADS": str(threads)}
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", *sys.argv[1:]],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        for line in out.splitlines():
+            name, mps = line.split("\t")
+            results.setdefault(name, {})[threads] = float(mps)
+
+    print(
+        f"{args.width}x{args.height}, best of {args.repeat}, MP/s "
+        f"by OMP_NUM_THREADS, {os.cpu_count()} cores"
+    )
+    print(f"{'':16}" + "".join(f"{t:>8}" for t in args.threads))
+    for name, row in results.items():
+        print(f"{name:16}" + "".join(f"{row[t]:8.1f}" for t in args.threads))
+
+
+if __name__ == "__main__":
+    main()
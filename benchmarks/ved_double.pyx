@@ -0,0 +1,478 @@
+# cython: language_level=3
+# cython: boundscheck=False
+# cython: wraparound=False
+# cython: initializedcheck=False
+# cython: cdivision=True
+# cython: nonecheck=False
+
+# The variable error diffusions as they were before the Q16 tables, with
+# double coefficients, for benchmarks/ved_q16.py to compare against. Built by
+# pyximport with the flags of setup.py, see ved_double.pyxbld. They share the
+# rows of the error, the packed output and the wavefront with the extension.
+
+import numpy as np
+cimport numpy as cnp
+from libc.stdint cimport uint8_t, uint16_t, uint32_t
+from cython.parallel import prange
+
+include "../src/hopfer/core/algorithms/cython_ops/bits.pxi"
+include "../src/hopfer/core/algorithms/cython_ops/ring.pxi"
+include "../src/hopfer/core/algorithms/cython_ops/wavefront.pxi"
+
+# ostromoukhov.pxi
+from libc.stdint cimport int32_t, uint8_t, uint16_t
+
+def ostromoukhov(img_u16, coeff_array, double str_value, int threads=0, prime=None):
+    cdef int h = img_u16.shape[0]
+    cdef int w = img_u16.shape[1]
+    out = _bits_zeros(h, w)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    cdef double[:, :] coeff_buf = np.array(coeff_array, dtype=np.float64)
+    cdef uint8_t[:, :] out_buf = out
+    threads = _wf_threads(h, w, threads)
+    # the error accumulates in an int32 ring, see ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(1, threads), w, 1)
+    cdef ring_t ring = _ring(err, 1)
+    # priming, see ed
+    cdef const uint16_t[:, ::1] noise
+    cdef uint8_t[:, :] scratch
+    if prime is not None:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        scratch = _bits_zeros(noise.shape[0], w)
+        with nogil:
+            _ostromoukhov_core(noise, &ring, coeff_buf, scratch, noise.shape[0], w, str_value)
+        _ring_skip(err, noise.shape[0])
+    with nogil:
+        if threads > 1:
+            _ostromoukhov_wavefront(src, &ring, coeff_buf, out_buf, h, w, str_value, threads)
+        else:
+            _ostromoukhov_core(src, &ring, coeff_buf, out_buf, h, w, str_value)
+    return out
+
+cdef void _ostromoukhov_core(
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    double[:, :] coeff_array,
+    uint8_t[:, :] out,
+    int h, int w,
+    double str_value
+) noexcept nogil:
+    cdef int y
+
+    for y in range(h):
+        _ostromoukhov_span(src, ring, coeff_array, out, y, 0, w, str_value)
+        _ring_clear(ring, y)
+
+cdef void _ostromoukhov_wavefront(
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    double[:, :] coeff_array,
+    uint8_t[:, :] out,
+    int h, int w,
+    double str_value,
+    int threads
+) noexcept nogil:
+    # see wavefront.pxi
+    cdef int y, x0, x1, need
+    cdef int* progress = _wf_progress(h)
+
+    if progress == NULL:
+        _ostromoukhov_core(src, ring, coeff_array, out, h, w, str_value)
+        return
+
+    for y in prange(h, schedule='static', chunksize=1, num_threads=threads):
+        x0 = 0
+        while x0 < w:
+            x1 = x0 + WF_CHUNK
+            if x1 > w:
+                x1 = w
+            need = x1 + 3
+            if need > w:
+                need = w
+            _wf_wait(progress, y, need)
+            _ostromoukhov_span(src, ring, coeff_array, out, y, x0, x1, str_value)
+            if x1 == w:
+                _ring_clear(ring, y)
+            _wf_done(progress, y, x1)
+            x0 = x1
+
+    free(progress)
+
+cdef void _ostromoukhov_span(
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    double[:, :] coeff_array,
+    uint8_t[:, :] out,
+    int y, int x0, int x1,
+    double str_value
+) noexcept nogil:
+    # processes the pixels x0 to x1 of a single row
+    cdef int x, coeff_idx
+    cdef int32_t old_value, new_value
+    cdef double error
+    cdef int32_t THRESHOLD = 32768
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+
+    for x in range(x0, x1):
+        old_value = src[y, x] + e0[x]
+        coeff_idx = old_value >> 8
+        if coeff_idx < 0:
+            coeff_idx = 0
+        elif coeff_idx > 255:
+            coeff_idx = 255
+        if old_value >= THRESHOLD:
+            new_value = 65535
+            _bit_set(out, y, x)
+        else:
+            new_value = 0
+        error = (old_value - new_value) * str_value
+        # the ring is padded, so no checks are needed
+        e0[x + 1] += <int32_t>(error * coeff_array[coeff_idx, 0])
+        e1[x - 1] += <int32_t>(error * coeff_array[coeff_idx, 1])
+        e1[x] += <int32_t>(error * coeff_array[coeff_idx, 2])
+
+# ostromoukhov_s.pxi
+from libc.stdint cimport int32_t, uint8_t, uint16_t
+
+def ostromoukhov_s(img_u16, coeff_array, double str_value, prime=None):
+    cdef int h = img_u16.shape[0]
+    cdef int w = img_u16.shape[1]
+    out = _bits_zeros(h, w)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    cdef double[:, :] coeff_buf = np.array(coeff_array, dtype=np.float64)
+    cdef uint8_t[:, :] out_buf = out
+    # int32 ring for precise error accumulation, see ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(1, 1), w, 1)
+    cdef ring_t ring = _ring(err, 1)
+    # priming, see ed
+    cdef const uint16_t[:, ::1] noise
+    cdef uint8_t[:, :] scratch
+    if prime is not None:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        scratch = _bits_zeros(noise.shape[0], w)
+        with nogil:
+            _ostromoukhov_s_core(noise, &ring, coeff_buf, scratch, noise.shape[0], w, str_value)
+        _ring_skip(err, noise.shape[0])
+    with nogil:
+        _ostromoukhov_s_core(src, &ring, coeff_buf, out_buf, h, w, str_value)
+    return out
+
+cdef void _ostromoukhov_s_core(
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    double[:, :] coeff_array,
+    uint8_t[:, :] out,
+    int h, int w,
+    double str_value
+) noexcept nogil:
+    cdef int y, x, coeff_idx, actual_x
+    cdef int32_t old_value, new_value
+    cdef double error
+    cdef int32_t THRESHOLD = 32768
+    cdef bint reverse
+    cdef int32_t* e0
+    cdef int32_t* e1
+
+    for y in range(h):
+        reverse = (y % 2 == 0)
+        e0 = _ring_row(ring, y)
+        e1 = _ring_row(ring, y + 1)
+        for x in range(w):
+            actual_x = (w - 1 - x) if reverse else x
+            old_value = src[y, actual_x] + e0[actual_x]
+            coeff_idx = old_value >> 8
+            if coeff_idx < 0:
+                coeff_idx = 0
+            elif coeff_idx > 255:
+                coeff_idx = 255
+            if old_value >= THRESHOLD:
+                new_value = 65535
+                _bit_set(out, y, actual_x)
+            else:
+                new_value = 0
+            error = (old_value - new_value) * str_value
+            # the ring is padded, so no checks are needed
+            if not reverse:
+                e0[actual_x + 1] += <int32_t>(error * coeff_array[coeff_idx, 0])
+                e1[actual_x - 1] += <int32_t>(error * coeff_array[coeff_idx, 1])
+            else:
+                e0[actual_x - 1] += <int32_t>(error * coeff_array[coeff_idx, 0])
+                e1[actual_x + 1] += <int32_t>(error * coeff_array[coeff_idx, 1])
+            e1[actual_x] += <int32_t>(error * coeff_array[coeff_idx, 2])
+        _ring_clear(ring, y)
+
+# zhou_fang.pxi
+from libc.stdint cimport int16_t, int32_t, uint8_t, uint16_t, uint32_t, uint64_t
+
+def zhou_fang_fast(img_u16, coeff_array, pert_array, double str_value, int threads=0, prime=None):
+    cdef int h = img_u16.shape[0]
+    cdef int w = img_u16.shape[1]
+    out = _bits_zeros(h, w)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    cdef double[:, :] coeff_buf = np.array(coeff_array, dtype=np.float64)
+    cdef double[:] pert_buf = np.array(pert_array, dtype=np.float64)
+    # Pre-compute coefficient tables
+    cdef double[:] c0_table = np.array(coeff_array[:, 0] * str_value, dtype=np.float64)
+    cdef double[:] c1_table = np.array(coeff_array[:, 1] * str_value, dtype=np.float64)
+    cdef double[:] c2_table = np.array(coeff_array[:, 2] * str_value, dtype=np.float64)
+    cdef uint8_t[:, :] out_buf = out
+    threads = _wf_threads(h, w, threads)
+    # the error of the int16 pixels is kept in a ring, see ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(1, threads), w, 1)
+    cdef ring_t ring = _ring(err, 1)
+    cdef uint64_t mcg_state = ZF_SEED
+    # priming, see ed. the generator carries on from where the priming
+    # rows left it.
+    cdef const uint16_t[:, ::1] noise
+    cdef uint8_t[:, :] scratch
+    if prime is not None:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        scratch = _bits_zeros(noise.shape[0], w)
+        with nogil:
+            _zhou_fang_core(noise, &ring, pert_buf, c0_table, c1_table, c2_table, scratch, noise.shape[0], w, &mcg_state)
+        _ring_skip(err, noise.shape[0])
+    with nogil:
+        if threads > 1:
+            _zhou_fang_wavefront(src, &ring, pert_buf, c0_table, c1_table, c2_table, out_buf, h, w, mcg_state, threads)
+        else:
+            _zhou_fang_core(src, &ring, pert_buf, c0_table, c1_table, c2_table, out_buf, h, w, &mcg_state)
+    return out
+
+cdef uint64_t ZF_SEED = <uint64_t>0xCAFEF00DD15EA5E5
+cdef uint64_t ZF_MULT = <uint64_t>6364136223846793005
+
+cdef uint64_t _mcg_pow(uint64_t base, uint64_t n) noexcept nogil:
+    # base ** n modulo 2 ** 64, used to jump the generator ahead by n steps
+    cdef uint64_t result = 1
+    while n:
+        if n & 1:
+            result *= base
+        base *= base
+        n >>= 1
+    return result
+
+cdef void _zhou_fang_core(
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    double[:] pert_array,
+    double[:] c0_table,
+    double[:] c1_table,
+    double[:] c2_table,
+    uint8_t[:, :] out,
+    int h, int w,
+    uint64_t* state
+) noexcept nogil:
+    cdef int y
+
+    for y in range(h):
+        _zhou_fang_span(src, ring, pert_array, c0_table, c1_table, c2_table, out, y, 0, w, state)
+        _ring_clear(ring, y)
+
+cdef void _zhou_fang_wavefront(
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    double[:] pert_array,
+    double[:] c0_table,
+    double[:] c1_table,
+    double[:] c2_table,
+    uint8_t[:, :] out,
+    int h, int w,
+    uint64_t seed,
+    int threads
+) noexcept nogil:
+    # see wavefront.pxi. the generator advances once per pixel, so every row
+    # starts from the seed jumped ahead by y * w steps, which gives exactly
+    # the same noise as the serial scan.
+    cdef int y, x0, x1, need
+    cdef uint64_t mcg_state
+    cdef uint64_t row_jump = _mcg_pow(ZF_MULT, <uint64_t>w)
+    cdef int* progress = _wf_progress(h)
+
+    if progress == NULL:
+        _zhou_fang_core(src, ring, pert_array, c0_table, c1_table, c2_table, out, h, w, &seed)
+        return
+
+    for y in prange(h, schedule='static', chunksize=1, num_threads=threads):
+        mcg_state = seed * _mcg_pow(row_jump, <uint64_t>y)
+        x0 = 0
+        while x0 < w:
+            x1 = x0 + WF_CHUNK
+            if x1 > w:
+                x1 = w
+            need = x1 + 3
+            if need > w:
+                need = w
+            _wf_wait(progress, y, need)
+            _zhou_fang_span(src, ring, pert_array, c0_table, c1_table, c2_table, out, y, x0, x1, &mcg_state)
+            if x1 == w:
+                _ring_clear(ring, y)
+            _wf_done(progress, y, x1)
+            x0 = x1
+
+    free(progress)
+
+cdef void _zhou_fang_span(
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    double[:] pert_array,
+    double[:] c0_table,
+    double[:] c1_table,
+    double[:] c2_table,
+    uint8_t[:, :] out,
+    int y, int x0, int x1,
+    uint64_t* state
+) noexcept nogil:
+    # processes the pixels x0 to x1 of a single row, advancing the generator
+    # state once per pixel
+    cdef int x, coeff_idx
+    cdef int16_t old_value, new_value
+    cdef int32_t error, pert_mod
+    cdef int32_t THRESHOLD = 8192
+    cdef uint64_t x_bits
+    cdef uint32_t count, rng_val_u32, pert
+    cdef double c0, c1, c2
+    cdef uint64_t mcg_state = state[0]
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+
+    for x in range(x0, x1):
+        # Generate a random float using pcg32_fast (https://en.wikipedia.org/wiki/Permuted_congruential_generator)
+        # This seems to be almost twice as fast as numpy's random module and produces noise that to me looks just as nice.
+        x_bits = mcg_state
+        count = <uint32_t>(x_bits >> 61)
+        # advance
+        mcg_state = x_bits * ZF_MULT
+        x_bits ^= x_bits >> 22
+        rng_val_u32 = <uint32_t>(x_bits >> (22 + count))
+        # getting the random number as a float seems to be just as fast, then again i think its cleaner to just get the in the range we already nee it.
+        # rand_float = <double>rng_val_u32 * 2.3283064365386963e-10
+        pert = rng_val_u32 >> 17
+        # the pixels are int16 and wrap around just like they used to when
+        # the error was added into the image itself
+        old_value = <int16_t>((src[y, x] >> 2) + e0[x])
+        coeff_idx = old_value >> 8
+        if coeff_idx < 0:
+            coeff_idx = 0
+        elif coeff_idx > 255:
+            coeff_idx = 255
+        pert_mod = <int32_t>(pert * pert_array[coeff_idx])
+        if (old_value + pert_mod) >= THRESHOLD:
+            new_value = 16383
+            _bit_set(out, y, x)
+        else:
+            new_value = 0
+        error = <int32_t>(old_value - new_value)
+        c0 = c0_table[coeff_idx]
+        c1 = c1_table[coeff_idx]
+        c2 = c2_table[coeff_idx]
+        # the ring is padded, so no checks are needed
+        e0[x + 1] += <int16_t>(error * c0)
+        e1[x - 1] += <int16_t>(error * c1)
+        e1[x] += <int16_t>(error * c2)
+
+    state[0] = mcg_state
+
+# zhou_fang_s.pxi
+from libc.stdint cimport int32_t, uint8_t, uint16_t, uint32_t, uint64_t
+
+def zhou_fang_fast_s(img_u16, coeff_array, pert_array, double str_value, prime=None):
+    cdef int h = img_u16.shape[0]
+    cdef int w = img_u16.shape[1]
+    out = _bits_zeros(h, w)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    cdef double[:] pert_buf = np.array(pert_array, dtype=np.float64)
+    cdef double[:] c0_table = np.array(coeff_array[:, 0], dtype=np.float64)
+    cdef double[:] c1_table = np.array(coeff_array[:, 1], dtype=np.float64)
+    cdef double[:] c2_table = np.array(coeff_array[:, 2], dtype=np.float64)
+    cdef uint8_t[:, :] out_buf = out
+    # int32 ring for the error, see ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(1, 1), w, 1)
+    cdef ring_t ring = _ring(err, 1)
+    cdef uint64_t mcg_state = <uint64_t>0xCAFEF00DD15EA5E5
+    # priming, see ed. the generator carries on from where the priming
+    # rows left it.
+    cdef const uint16_t[:, ::1] noise
+    cdef uint8_t[:, :] scratch
+    if prime is not None:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        scratch = _bits_zeros(noise.shape[0], w)
+        with nogil:
+            _zhou_fang_s_core(noise, &ring, pert_buf, c0_table, c1_table, c2_table, scratch, noise.shape[0], w, str_value, &mcg_state)
+        _ring_skip(err, noise.shape[0])
+    with nogil:
+        _zhou_fang_s_core(src, &ring, pert_buf, c0_table, c1_table, c2_table, out_buf, h, w, str_value, &mcg_state)
+    return out
+
+cdef void _zhou_fang_s_core(
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    double[:] pert_array,
+    double[:] c0_table,
+    double[:] c1_table,
+    double[:] c2_table,
+    uint8_t[:, :] out,
+    int h, int w,
+    double str_value,
+    uint64_t* state
+) noexcept nogil:
+    cdef int y, x, coeff_idx
+    cdef int32_t old_value, new_value, e_int, pert_mod
+    cdef int32_t THRESHOLD = 32768
+    cdef uint64_t mcg_state = state[0]
+    cdef uint64_t MULT = <uint64_t>6364136223846793005
+    cdef uint64_t x_bits
+    cdef uint32_t count, rng_val_u32, pert
+    cdef double c0, c1, c2, error
+    cdef bint reverse
+    cdef int32_t* e0
+    cdef int32_t* e1
+
+    for y in range(h):
+        reverse = (y & 1) == 0
+        e0 = _ring_row(ring, y)
+        e1 = _ring_row(ring, y + 1)
+        for x in range(w):
+            # Generate a random float using pcg32_fast (https://en.wikipedia.org/wiki/Permuted_congruential_generator)
+            # This seems to be almost twice as fast as numpy's random module and produces noise that to me looks just as nice.
+            x_bits = mcg_state
+            count = <uint32_t>(x_bits >> 61)
+            # advance
+            mcg_state = x_bits * MULT
+            x_bits ^= x_bits >> 22
+            rng_val_u32 = <uint32_t>(x_bits >> (22 + count))
+            # getting the random number as a float seems to be just as fast, then again i think its cleaner to just get the in the range we already nee it.
+            # rand_float = <double>rng_val_u32 * 2.3283064365386963e-10
+            pert = rng_val_u32 >> 17
+            # map logical x to actual column depending on scan direction
+            x = x if not reverse else (w - 1 - x)
+            old_value = src[y, x] + e0[x]
+            coeff_idx = old_value >> 8
+            if coeff_idx < 0:
+                coeff_idx = 0
+            elif coeff_idx > 255:
+                coeff_idx = 255
+            pert_mod = <int32_t>(pert * pert_array[coeff_idx])
+            if (old_value + pert_mod) >= THRESHOLD:
+                new_value = 65535
+                _bit_set(out, y, x)
+            else:
+                new_value = 0
+            error = (old_value - new_value) * str_value
+            e_int = <int32_t>error
+            c0 = c0_table[coeff_idx]
+            c1 = c1_table[coeff_idx]
+            c2 = c2_table[coeff_idx]
+            # the ring is padded, so no checks are needed
+            if not reverse:
+                e0[x + 1] += <int32_t>(e_int * c0)
+                e1[x - 1] += <int32_t>(e_int * c1)
+            else:
+                e0[x - 1] += <int32_t>(e_int * c0)
+                e1[x + 1] += <int32_t>(e_int * c1)
+            # Vertical always uses c2
+            e1[x] += <int32_t>(e_int * c2)
+        _ring_clear(ring, y)
+
+    state[0] = mcg_state
+
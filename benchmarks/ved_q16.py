@@ -0,0 +1,91 @@
+"""
+The variable error diffusions with the Q16 coefficient tables against the
+double tables they replaced, Ostromoukhov and Zhou-Fang, raster and
+serpentine, on a single thread. The double versions are in ved_double.pyx,
+which pyximport builds on the first run:
+
+    PYTHONPATH=src python benchmarks/ved_q16.py
+
+Prints the time of both, how many pixels differ and the density of each
+next to the mean of the image. Like any error diffusion a tiny change moves
+the pixels around, but the tone stays.
+"""
+
+import argparse
+from functools import partial
+
+import numpy as np
+import pyximport
+from common import best_of, gradient_image, noise_image, size_args
+
+from hopfer.core.algorithms.cython_ops import (
+    ostromoukhov,
+    ostromoukhov_s,
+    zhou_fang_fast,
+    zhou_fang_fast_s,
+)
+from hopfer.core.algorithms.ved_data import (
+    OSTROMOUKHOV_COEFFN,
+    OSTROMOUKHOV_Q16,
+    ZF_COEFFN,
+    ZF_PERT,
+    ZF_PERT_Q16,
+    ZF_Q16,
+)
+
+pyximport.install(language_level=3)
+import ved_double  # noqa: E402
+
+# (name, double, Q16), taking the image
+CASES = [
+    (
+        "ostromoukhov",
+        lambda img: ved_double.ostromoukhov(img, OSTROMOUKHOV_COEFFN, 1.0, 1),
+        lambda img: ostromoukhov(img, OSTROMOUKHOV_Q16, 1.0, 1),
+    ),
+    (
+        "ostromoukhov_s",
+        lambda img: ved_double.ostromoukhov_s(img, OSTROMOUKHOV_COEFFN, 1.0),
+        lambda img: ostromoukhov_s(img, OSTROMOUKHOV_Q16, 1.0),
+    ),
+    (
+        "zhou_fang",
+        lambda img: ved_double.zhou_fang_fast(img, ZF_COEFFN, ZF_PERT, 1.0, 1),
+        lambda img: zhou_fang_fast(img, ZF_Q16, ZF_PERT_Q16, 1.0, 1),
+    ),
+    (
+        "zhou_fang_s",
+        lambda img: ved_double.zhou_fang_fast_s(img, ZF_COEFFN, ZF_PERT, 1.0),
+        lambda img: zhou_fang_fast_s(img, ZF_Q16, ZF_PERT_Q16, 1.0),
+    ),
+]
+
+
+def main():
+    args = size_args(argparse.ArgumentParser(description=__doc__)).parse_args()
+    images = [
+        ("gradient", gradient_image(args.height, args.width)),
+        ("noise", noise_image(args.height, args.width)),
+    ]
+
+    print(f"{args.width}x{args.height}, best of {args.repeat}")
+    print(
+        f"{'':24} {'double ms':>10} {'Q16 ms':>8} {'differ':>8} "
+        f"{'mean':>7} {'double':>7} {'Q16':>7}"
+    )
+    for image_name, img in images:
+        mean = img.mean() / 65535
+        for name, double, q16 in CASES:
+            before = np.unpackbits(double(img), axis=1)[:, : args.width]
+            after = np.unpackbits(q16(img), axis=1)[:, : args.width]
+            print(
+                f"{name + ', ' + image_name:24} "
+                f"{best_of(partial(double, img), args.repeat) * 1e3:10.1f} "
+                f"{best_of(partial(q16, img), args.repeat) * 1e3:8.1f} "
+                f"{(before != after).mean():8.2%} "
+                f"{mean:7.4f} {before.mean():7.4f} {after.mean():7.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+The raster error diffusions on a single thread and as a wavefront on all of
+the OpenMP threads (see cython_ops/wavefront.pxi). The single thread is the
+serial scan they all used before, so the two columns are before and after:
+
+    PYTHONPATH=src python benchmarks/wavefront.py
+    OMP_NUM_THREADS=4 PYTHONPATH=src python benchmarks/wavefront.py
+
+On fewer cores than threads the waiting rows only move on through the
+scheduler, so oversubscribing makes it slower, not faster.
+"""
+
+import argparse
+
+from common import best_of, megapixels, noise_image, size_args
+
+from hopfer.core.algorithms.cython_ops import (
+    ED_KERNELS,
+    ed,
+    ed_kernel,
+    ostromoukhov,
+    sierra24a,
+    zhou_fang_fast,
+)
+from hopfer.core.algorithms.ved_data import (
+    OSTROMOUKHOV_Q16,
+    ZF_PERT_Q16,
+    ZF_Q16,
+)
+from hopfer.helpers.kernels import get_kernel
+
+FS = ED_KERNELS["Floyd-Steinberg"]
+JARVIS = ED_KERNELS["Jarvis"]
+
+# name and a call taking the number of threads, 0 for all of them
+CASES = [
+    (
+        "ed (generic, FS)",
+        lambda img, t: ed(img, get_kernel("Floyd-Steinberg"), 1.0, t),
+    ),
+    ("ed_kernel FS", lambda img, t: ed_kernel(img, FS, 1.0, False, t)),
+    ("ed_kernel Jarvis", lambda img, t: ed_kernel(img, JARVIS, 1.0, False, t)),
+    ("sierra24a", lambda img, t: sierra24a(img, 1.0, False, t)),
+    (
+        "ostromoukhov",
+        lambda img, t: ostromoukhov(img, OSTROMOUKHOV_Q16, 1.0, t),
+    ),
+    (
+        "zhou_fang_fast",
+        lambda img, t: zhou_fang_fast(img, ZF_Q16, ZF_PERT_Q16, 1.0, t),
+    ),
+]
+
+
+def main():
+    args = size_args(argparse.ArgumentParser(description=__doc__)).parse_args()
+    img = noise_image(args.height, args.width)
+
+    print(f"{args.width}x{args.height}, best of {args.repeat}, MP/s")
+    print(f"{'':20} {'serial':>8} {'wavefront':>10}")
+    for name, run in CASES:
+        serial = best_of(lambda run=run: run(img, 1), args.repeat)
+        wavefront = best_of(lambda run=run: run(img, 0), args.repeat)
+        print(
+            f"{name:20} {megapixels(img.shape, serial):8.1f} "
+            f"{megapixels(img.shape, wavefront):10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
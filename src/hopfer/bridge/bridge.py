@@ -12,6 +12,7 @@ from PySide6.QtGui import QGuiApplication
 from hopfer.core.queue_io import QueueReader, QueueWriter
 from hopfer.helpers.config import save_config
 from hopfer.helpers.image_conversion import numpy_to_pixmap, qimage_to_numpy
+from hopfer.helpers.kernels import user_kernels
 
 # still not sure if i want to check available ram
 # from psutil import virtual_memory
@@ -73,6 +74,13 @@ class Bridge(QObject):
 
         self.writer = QueueWriter(self.req_queue, bridge=self)
 
+        # the daemon only hears about the options it acts on
+        options = self.config.options
+        self.writer.send_low_memory(options.low_memory)
+        options.lowMemoryChanged.connect(
+            lambda: self.writer.send_low_memory(options.low_memory)
+        )
+
     def set_window(self, window):
         self._window = window
 
@@ -94,6 +102,12 @@ class Bridge(QObject):
     def ratio(self):
         return self._ratio
 
+    @Property(list, constant=True)
+    def user_kernels(self):
+        # the error diffusion kernels from kernels.json, listed after the
+        # built in algorithms
+        return list(user_kernels())
+
     @Property(str)
     def initial_folder_url(self):
         return QUrl.fromLocalFile(self._initial_folder).toString()
@@ -1,45 +1,14 @@
+from functools import lru_cache
+
 import numpy as np
 
 from hopfer.core.algorithms.cython_ops import ordered_dither, ordered_dither_p
+from hopfer.core.algorithms.screens import dot_period, screen_matrix
+from hopfer.core.packed_bits import PackedBits
+from hopfer.helpers.array_cache import cached_array
 
 
-def generate_halftone_matrix(size, bit_depth=8):
-    max_val = 2**bit_depth - 1
-
-    matrix = np.zeros((size, size), dtype=int)
-    center = (size - 1) / 2
-
-    # the distance map
-    distances = np.zeros((size, size))
-
-    for i in range(size):
-        for j in range(size):
-            distances[i, j] = (i - center) ** 2 + (j - center) ** 2
-
-    # sort the indices by distance from the center
-    sorted_indices = np.argsort(distances, axis=None)
-
-    # Assign values 0 to (size² - 1) based on distance ordering
-    matrix.flat[sorted_indices] = np.arange(size**2)
-
-    matrix = (matrix / np.max(matrix)) * 0.5
-
-    # Generate negative version and stack into a 2x2 grid
-    negative = np.fliplr(1 - matrix)
-
-    # fmt: off
-    stacked_matrix = np.block([[negative, matrix],
-                               [matrix, negative]]).astype(np.float64)
-    # fmt: on
-    normalized_matrix = stacked_matrix / np.max(stacked_matrix)
-
-    # TODO: this could all be way more elegant and done in cython, but it should work as a temporary solution
-    return np.round(normalized_matrix * max_val).astype(
-        np.uint16 if bit_depth == 16 else np.uint8
-    )
-
-
-def generate_bayer_matrix(power, offset=0):
+def generate_bayer_matrix(power, offset=0, bit_depth=8):
     n = 2 ** (power)
 
     bayer = np.array([[0, 2], [3, 1]])
@@ -54,7 +23,118 @@ def generate_bayer_matrix(power, offset=0):
 
     matrix = bayer / (bayer.shape[0] * bayer.shape[1])
 
-    return (np.clip(matrix - offset, 0, 1) * 255).astype(np.uint8)
+    max_val = 2**bit_depth - 1
+    return (np.clip(matrix - offset, 0, 1) * max_val).astype(
+        np.uint16 if bit_depth == 16 else np.uint8
+    )
+
+
+def generate_blue_noise_matrix(size, seed=0, bit_depth=8):
+    """
+    A size x size threshold matrix with a blue noise spectrum, made by the
+    void and cluster method. Slow to build, so it's cached on disk per size
+    and seed and in memory per bit depth as well.
+    """
+    ranks = _blue_noise_ranks(size, seed)
+    max_val = 2**bit_depth - 1
+    # the same spacing as the bayer matrix, rank / size² of the range
+    matrix = (ranks.astype(np.int64) * (max_val + 1) // size**2).astype(
+        np.uint16 if bit_depth == 16 else np.uint8
+    )
+    matrix.flags.writeable = False
+    return matrix
+
+
+@lru_cache(maxsize=8)
+def _blue_noise_ranks(size, seed):
+    return cached_array(
+        "blue_noise",
+        (BLUE_NOISE_VERSION, size, seed, BLUE_NOISE_SIGMA),
+        lambda: void_and_cluster(size, seed),
+    )
+
+
+# the width of the gaussian the clusters and voids are measured with. 1.5 is
+# the usual one, smaller gets grainy and bigger gets low frequencies back.
+BLUE_NOISE_SIGMA = 1.5
+# part of the key of the cached masks, bump it whenever void_and_cluster()
+# orders the pixels differently so the old ones on disk aren't used anymore
+BLUE_NOISE_VERSION = 1
+
+
+def void_and_cluster(size, seed=0, sigma=BLUE_NOISE_SIGMA):
+    """
+    The void and cluster method (Ulichney 1993). Returns the order every
+    pixel is turned on in, 0 to size² - 1, as a uint16 or uint32 array.
+
+    Every step puts a pixel into the biggest void or takes one out of the
+    tightest cluster, measured by a gaussian on a torus so the result tiles.
+    The energy is built with an FFT once and then only updated around the
+    pixel that changed.
+    """
+    rng = np.random.default_rng(seed)
+    n = size * size
+
+    # the gaussian on the torus, cut off where it doesn't matter anymore
+    r = min(int(np.ceil(4 * sigma)), (size - 1) // 2)
+    d = np.arange(-r, r + 1)
+    window = np.exp(-(d[:, None] ** 2 + d[None, :] ** 2) / (2 * sigma**2))
+    kernel = np.zeros((size, size))
+    kernel[np.ix_(d % size, d % size)] = window
+
+    # 10% of the pixels at random to start from
+    pattern = np.zeros((size, size), dtype=bool)
+    pattern.flat[rng.choice(n, max(1, n // 10), replace=False)] = True
+
+    energy = np.fft.irfft2(
+        np.fft.rfft2(pattern) * np.fft.rfft2(kernel), s=(size, size)
+    )
+    # the energy of the set pixels and of the others, the rest masked out, so
+    # both searches are a plain argmax / argmin
+    on = np.where(pattern, energy, -np.inf)
+    off = np.where(pattern, np.inf, energy)
+
+    def flip(i, value):
+        y, x = divmod(int(i), size)
+        rows, cols = np.ix_((y + d) % size, (x + d) % size)
+        sign = 1 if value else -1
+        on[rows, cols] += sign * window
+        off[rows, cols] += sign * window
+        pattern.flat[i] = value
+        e = on.flat[i] if not value else off.flat[i]
+        on.flat[i], off.flat[i] = (e, np.inf) if value else (-np.inf, e)
+
+    # spread the starting pixels out, until moving the tightest one leaves
+    # it in the biggest void
+    while True:
+        cluster = np.argmax(on)
+        flip(cluster, False)
+        void = np.argmin(off)
+        flip(void, True)
+        if void == cluster:
+            break
+    start = pattern.copy()
+    count = int(start.sum())
+
+    ranks = np.zeros(n, dtype=np.uint32)
+    # the starting pixels, ranked by taking them out tightest first
+    for rank in range(count - 1, -1, -1):
+        cluster = np.argmax(on)
+        flip(cluster, False)
+        ranks[cluster] = rank
+
+    # back to the start, then the voids are filled biggest first. past half
+    # the biggest void of the set pixels is the tightest cluster of the
+    # others, so that's all there is to do.
+    for i in np.flatnonzero(start):
+        flip(i, True)
+    for rank in range(count, n):
+        void = np.argmin(off)
+        flip(void, True)
+        ranks[void] = rank
+
+    dtype = np.uint16 if n <= 2**16 else np.uint32
+    return ranks.reshape(size, size).astype(dtype)
 
 
 def bayer(img, settings):
@@ -62,27 +142,32 @@ def bayer(img, settings):
     size = settings["size"]
     perturbation = settings["perturbation"]
     offset = settings["offset"]
-    matrix = generate_bayer_matrix(size, offset)
-
-    # if img.dtype != np.uint8:
-    #     img = (img // 255).astype(np.uint8)
 
+    # 16 bit images are dithered as they are, against a 16 bit matrix
+    bit_depth = 8 if img.dtype == np.uint8 else 16
+    matrix = generate_bayer_matrix(size, offset, bit_depth)
     if perturbation == 0:
-        img = ordered_dither(img, matrix)
+        out = ordered_dither(img, matrix)
     else:
-        img = ordered_dither_p(img, matrix, perturbation)
-    return img
+        seed = settings.get("seed", 0)
+        out = ordered_dither_p(img, matrix, perturbation, seed)
+    return PackedBits(out, img.shape[1])
 
 
 def clustered(img, settings):
-    size = settings["size"] + 1
-    # it proved massively hard to rotate a matrix by an arbitrary angle
-    # and keep it tileable.
-    # angle = settings["angle"]
-    if img.dtype == np.uint8:
-        bit_depth = 8
+    angle = settings.get("angle", 45)
+    lpi = settings.get("lpi", 0)
+    if lpi > 0:
+        period = settings.get("dpi", 600) / lpi
     else:
-        bit_depth = 16
-    matrix = generate_halftone_matrix(size, bit_depth)
-    img = ordered_dither(img, matrix)
-    return img
+        period = dot_period(settings["size"] + 1)
+    bit_depth = 8 if img.dtype == np.uint8 else 16
+    matrix = screen_matrix(period, angle, bit_depth)
+    return PackedBits(ordered_dither(img, matrix), img.shape[1])
+
+
+def blue_noise(img, settings):
+    size = 2 ** settings["size"]
+    bit_depth = 8 if img.dtype == np.uint8 else 16
+    matrix = generate_blue_noise_matrix(size, settings["seed"], bit_depth)
+    return PackedBits(ordered_dither(img, matrix), img.shape[1])
@@ -1,15 +1,21 @@
 from .backend import (
+    ED_KERNELS,
+    apply_lut,
     average,
     cast_f32_u16,
     compare,
     ed,
+    ed_kernel,
     eds,
     equalize,
+    histogram,
+    integral_images,
     levien,
     lightness,
     luma,
     luminance,
     manual,
+    median,
     nakano,
     niblack,
     noise_gen,
@@ -18,29 +24,42 @@ from .backend import (
     ordered_dither_p,
     ostromoukhov,
     ostromoukhov_s,
+    pack_bits,
     phansalkar,
+    random_dither,
+    repair_seam,
     sauvola,
     sierra24a,
+    stack_blur,
     style_alpha,
+    style_alpha_bits,
+    style_bits,
     style_image,
     thresh,
+    unpack_bits,
     value,
     zhou_fang_fast,
     zhou_fang_fast_s,
 )
 
 __all__ = [
+    "ED_KERNELS",
+    "apply_lut",
     "average",
     "cast_f32_u16",
     "compare",
     "ed",
+    "ed_kernel",
     "eds",
     "equalize",
+    "histogram",
+    "integral_images",
     "levien",
     "lightness",
     "luma",
     "luminance",
     "manual",
+    "median",
     "nakano",
     "niblack",
     "noise_gen",
@@ -49,12 +68,19 @@ __all__ = [
     "ordered_dither_p",
     "ostromoukhov",
     "ostromoukhov_s",
+    "pack_bits",
     "phansalkar",
+    "random_dither",
+    "repair_seam",
     "sauvola",
     "sierra24a",
+    "stack_blur",
     "style_alpha",
+    "style_alpha_bits",
+    "style_bits",
     "style_image",
     "thresh",
+    "unpack_bits",
     "value",
     "zhou_fang_fast",
     "zhou_fang_fast_s",
@@ -3,24 +3,28 @@
 def average(img, bint out_8bit=False):
     cdef int h = img.shape[0]
     cdef int w = img.shape[1]
-    is_u8 = img.dtype == np.uint8
+    cdef bint is_u8 = img.dtype == np.uint8
+    out = np.empty((h, w), dtype=np.uint8 if out_8bit else np.uint16)
+    # typed before the gil is released, only the ones that are used are set
+    cdef const uint8_t[:, :, :] src_u8 = img if is_u8 else None
+    cdef const uint16_t[:, :, :] src_u16 = None if is_u8 else img
+    cdef uint8_t[:, :] out_u8 = out if out_8bit else None
+    cdef uint16_t[:, :] out_u16 = None if out_8bit else out
 
-    if out_8bit:
-        out_u8 = np.empty((h, w), dtype=np.uint8)
-        if is_u8:
-            _average_u8_u8(img, out_u8)
+    with nogil:
+        if out_8bit:
+            if is_u8:
+                _average_u8_u8(src_u8, out_u8)
+            else:
+                _average_u16_u8(src_u16, out_u8)
         else:
-            _average_u16_u8(img, out_u8)
-        return out_u8
-    else:
-        out_u16 = np.empty((h, w), dtype=np.uint16)
-        if is_u8:
-            _average_u8_u16(img, out_u16)
-        else:
-            _average_u16_u16(img, out_u16)
-        return out_u16
+            if is_u8:
+                _average_u8_u16(src_u8, out_u16)
+            else:
+                _average_u16_u16(src_u16, out_u16)
+    return out
 
-cdef void _average_u16_u16(uint16_t[:, :, :] img, uint16_t[:, :] out) noexcept nogil:
+cdef void _average_u16_u16(const uint16_t[:, :, :] img, uint16_t[:, :] out) noexcept nogil:
     cdef int y, x, h = img.shape[0], w = img.shape[1]
     cdef uint32_t r, g, b
 
@@ -31,7 +35,7 @@ cdef void _average_u16_u16(uint16_t[:, :, :] img, uint16_t[:, :] out) noexcept n
             b = img[y, x, 2]
             out[y, x] = <uint16_t>((r + g + b + 1) // 3)
 
-cdef void _average_u8_u8(uint8_t[:, :, :] img, uint8_t[:, :] out) noexcept nogil:
+cdef void _average_u8_u8(const uint8_t[:, :, :] img, uint8_t[:, :] out) noexcept nogil:
     cdef int y, x, h = img.shape[0], w = img.shape[1]
     cdef uint16_t r, g, b
 
@@ -42,7 +46,7 @@ cdef void _average_u8_u8(uint8_t[:, :, :] img, uint8_t[:, :] out) noexcept nogil
             b = img[y, x, 2]
             out[y, x] = <uint8_t>((r + g + b + 1) // 3)
 
-cdef void _average_u16_u8(uint16_t[:, :, :] img, uint8_t[:, :] out) noexcept nogil:
+cdef void _average_u16_u8(const uint16_t[:, :, :] img, uint8_t[:, :] out) noexcept nogil:
     cdef int y, x, h = img.shape[0], w = img.shape[1]
     cdef uint32_t r, g, b
 
@@ -53,7 +57,7 @@ cdef void _average_u16_u8(uint16_t[:, :, :] img, uint8_t[:, :] out) noexcept nog
             b = img[y, x, 2]
             out[y, x] = <uint8_t>(((r + g + b + 1) // 3) >> 8)
 
-cdef void _average_u8_u16(uint8_t[:, :, :] img, uint16_t[:, :] out) noexcept nogil:
+cdef void _average_u8_u16(const uint8_t[:, :, :] img, uint16_t[:, :] out) noexcept nogil:
     cdef int y, x, h = img.shape[0], w = img.shape[1]
     cdef uint16_t r, g, b
 
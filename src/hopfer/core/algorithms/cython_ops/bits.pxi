@@ -0,0 +1,61 @@
+# bits.pxi
+# All of the halftones are written packed, 8 pixels per byte, which is an 8th
+# of the memory a bool array takes. Every row starts on a new byte and the
+# first pixel of a byte is its most significant bit, the same layout as
+# np.packbits(img, axis=1). The bits past the width of a row are padding and
+# nothing should rely on their value.
+# The output starts zeroed, so the kernels only ever set the white pixels.
+
+from libc.stdint cimport uint8_t
+
+cdef inline void _bit_set(uint8_t[:, :] out, int y, int x) noexcept nogil:
+    out[y, x >> 3] |= <uint8_t>(0x80 >> (x & 7))
+
+
+cdef inline bint _bit_get(uint8_t[:, :] bits, int y, int x) noexcept nogil:
+    return (bits[y, x >> 3] >> (7 - (x & 7))) & 1
+
+
+def _bits_zeros(int h, int w):
+    return np.zeros((h, (w + 7) >> 3), dtype=np.uint8)
+
+
+def pack_bits(img):
+    """
+    Packs a 2d bool (or 0/1) array. Anything but 0 is set.
+    """
+    cdef int h = img.shape[0]
+    cdef int w = img.shape[1]
+    cdef const uint8_t[:, :] src = np.asarray(img).view(np.uint8)
+    out = _bits_zeros(h, w)
+    cdef uint8_t[:, :] out_buf = out
+    cdef int y, x
+    for y in prange(h, schedule='static', nogil=True):
+        for x in range(w):
+            if src[y, x]:
+                _bit_set(out_buf, y, x)
+    return out
+
+
+def unpack_bits(const uint8_t[:, :] bits, int width, uint8_t one=1):
+    """
+    The reverse of pack_bits, a set bit becomes `one`. 255 gives an image
+    that can be saved as is.
+    """
+    cdef int h = bits.shape[0]
+    out = np.empty((h, width), dtype=np.uint8)
+    cdef uint8_t[:, ::1] out_buf = out
+    cdef int y
+    for y in prange(h, schedule='static', nogil=True):
+        _unpack_row(bits, y, &out_buf[y, 0], width, one)
+    return out
+
+
+cdef inline void _unpack_row(const uint8_t[:, :] bits, int y, uint8_t* row, int width, uint8_t one) noexcept nogil:
+    # branchless, the bit is turned into a mask of all ones or all zeros
+    cdef int x
+    cdef uint8_t byte = 0
+    for x in range(width):
+        if x & 7 == 0:
+            byte = bits[y, x >> 3]
+        row[x] = one & <uint8_t>(-((byte >> (7 - (x & 7))) & 1))
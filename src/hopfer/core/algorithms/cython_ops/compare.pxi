@@ -1,21 +1,71 @@
 # compare.pxi
-from libc.stdint cimport uint8_t
+from libc.stdint cimport uint8_t, uint16_t, uint64_t
 
 def compare(img, noise):
     cdef int h = img.shape[0]
     cdef int w = img.shape[1]
-    out = np.zeros((h, w), dtype=np.uint8)
-    cdef uint8_t[:, :] img_buf = np.array(img, dtype=np.uint8)
-    cdef uint8_t[:, :] noise_buf = np.array(noise, dtype=np.uint8)
-    _compare_core(img_buf, noise_buf, out, h, w)
-    return out.view(np.bool_)
+    out = _bits_zeros(h, w)
+    cdef const uint8_t[:, :] img_buf = np.asarray(img, dtype=np.uint8)
+    cdef const uint8_t[:, :] noise_buf = np.asarray(noise, dtype=np.uint8)
+    cdef uint8_t[:, :] out_buf = out
+    with nogil:
+        _compare_core(img_buf, noise_buf, out_buf, h, w)
+    return out
 
-cdef void _compare_core(uint8_t[:, :] img, uint8_t[:, :] noise, uint8_t[:, :] out, int h, int w) noexcept nogil:
+cdef void _compare_core(const uint8_t[:, :] img, const uint8_t[:, :] noise, uint8_t[:, :] out, int h, int w) noexcept nogil:
     cdef int y, x
     for y in prange(h, schedule='static'):
         for x in range(w):
             # Doing it in this crude nested for loop seems to be a few times faster than using np.where
             if noise[y, x] < img[y, x]:
-                out[y, x] = 1
-            else:
-                out[y, x] = 0
+                _bit_set(out, y, x)
+
+
+def random_dither(img, chance, uint64_t seed=0):
+    """
+    compare against noise that's never made. chance has the chance of every
+    gray level to come out white, in 1 / 2^32, 256 or 65536 of them to match
+    the image. A pixel is white if its random number (see rng.pxi) is below
+    the chance of its level, which is the same as its noise being below it.
+    """
+    cdef int h = img.shape[0]
+    cdef int w = img.shape[1]
+    out = _bits_zeros(h, w)
+    cdef uint8_t[:, ::1] out_buf = out
+    cdef const uint64_t[::1] chance_buf = np.ascontiguousarray(chance, dtype=np.uint64)
+    cdef const uint8_t[:, ::1] src_u8
+    cdef const uint16_t[:, ::1] src_u16
+    if img.dtype == np.uint8:
+        if chance_buf.shape[0] != 256:
+            raise ValueError("A uint8 image needs 256 chances")
+        src_u8 = np.ascontiguousarray(img)
+        with nogil:
+            _random_dither_core(src_u8, chance_buf, out_buf, h, w, seed)
+    else:
+        if chance_buf.shape[0] != 65536:
+            raise ValueError("A uint16 image needs 65536 chances")
+        src_u16 = np.ascontiguousarray(img, dtype=np.uint16)
+        with nogil:
+            _random_dither_core(src_u16, chance_buf, out_buf, h, w, seed)
+    return out
+
+
+cdef void _random_dither_core(const pixel_t[:, ::1] img, const uint64_t[::1] chance, uint8_t[:, ::1] out, int h, int w, uint64_t seed) noexcept nogil:
+    cdef int y, x, k, bytes_full = w >> 3
+    cdef const pixel_t* src
+    cdef uint8_t* row
+    cdef uint8_t byte
+    for y in prange(h, schedule='static'):
+        src = &img[y, 0]
+        row = &out[y, 0]
+        # 8 pixels at a time straight into their byte, see ordered_dither.pxi
+        for x in range(bytes_full):
+            byte = 0
+            for k in range(8):
+                byte = (byte << 1) | (_rng_at(seed, y, x * 8 + k) < chance[src[x * 8 + k]])
+            row[x] = byte
+        if w & 7:
+            byte = 0
+            for k in range(w & 7):
+                byte = byte | ((_rng_at(seed, y, bytes_full * 8 + k) < chance[src[bytes_full * 8 + k]]) << (7 - k))
+            row[bytes_full] = byte
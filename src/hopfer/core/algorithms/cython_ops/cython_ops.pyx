@@ -11,6 +11,12 @@ from libc.stdint cimport uint8_t, uint16_t, uint32_t
 from libcpp cimport bool
 from cython.parallel import prange
 
+# Every function here releases the GIL for the actual work, so several images
+# can be processed by a thread pool at once. Whatever is typed before the GIL
+# is released is either a view of the input or owned by the call, nothing is
+# kept between calls. normalize and equalize work in place, so the same array
+# shouldn't be given to both at once.
+
 ctypedef fused pixel_t:
     uint8_t
     uint16_t
@@ -30,13 +36,21 @@ include "manual.pxi"
 # Image adjustments
 include "normalize.pxi"
 include "equalize.pxi"
+include "tone.pxi" # the fused lut of tone.py
 include "blur_caster.pxi"
+include "median.pxi" # constant time, for the 16 bit median
+include "stack_blur.pxi" # in integers, for the 16 bit stack blur
 
 # Halftoning
+include "bits.pxi" # the packed output of all halftones
+include "ring.pxi" # error rows of the error diffusions
+include "wavefront.pxi" # shared by the raster error diffusions
+include "rng.pxi" # random numbers that don't depend on the thread count
 
 # Thresholds
 include "sierra24a.pxi"
 include "thresh.pxi"
+include "integral.pxi" # shared by the local thresholds
 include "niblack.pxi"
 include "sauvola.pxi"
 include "phansalkar.pxi"
@@ -47,11 +61,12 @@ include "compare.pxi" # masks are generated in their respective modules e.g. mez
 # Ordered
 include "ordered_dither.pxi"
 include "ordered_dither_p.pxi"
-# TODO: Add the perturbed one for Bayer
 
 # Error Diffusion
 include "ed.pxi" # raster scan
 include "eds.pxi" # serpentine scan
+include "ed_kernels.pxi" # generated, unrolled versions of the fixed kernels
+include "seam.pxi" # the seams of the tiled error diffusions, see tiled.py
 
 # VED
 include "ostromoukhov.pxi"
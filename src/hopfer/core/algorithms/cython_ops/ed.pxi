@@ -1,55 +1,134 @@
 # ed.pxi
 from libc.stdint cimport int32_t, uint8_t, uint16_t
 
-def ed(img_u16, kernel, float str_value):
+def ed(img_u16, kernel, float str_value, int threads=0, prime=None):
     """
     A generic error diffusion fuction. Expects the image, the kernel (see src/hopfer/core/image_processor for example) and a strength of diffusion as a float between 0 and 1 which controls the amount of error to be diffused.
+    The number of threads defaults to 0, which lets OpenMP decide. Pass 1 to force the serial scan.
+    `prime` takes rows of noise (uint16, same width) which are diffused before the image and thrown away, see ring.pxi.
     """
     cdef int height = img_u16.shape[0]
     cdef int width = img_u16.shape[1]
-    out = np.zeros((height, width), dtype=np.uint8)
-    # Converting to int32 allows for negative error accumulation while being faster than float.
-    cdef int32_t[:, :] img = np.array(img_u16, dtype=np.int32)
-    cdef double[:, :] kernel_buf = np.array(kernel, dtype=np.float64)
+    out = _bits_zeros(height, width)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    kernel = np.array(kernel, dtype=np.float64)
     cdef int kernel_height = kernel.shape[0]
     cdef int kernel_width = kernel.shape[1]
-    _ed_core(img, kernel_buf, out, height, width, kernel_height, kernel_width, str_value)
-    return out.view(np.bool_)
+    # error pushed into rows that are already done never changed the result,
+    # so those weights are dropped instead of being written into the ring
+    kernel[:kernel_height // 2] = 0
+    cdef double[:, :] kernel_buf = kernel
+    cdef uint8_t[:, :] out_buf = out
+    threads = _wf_threads(height, width, threads)
+    # Only the error is kept, in a ring of rows padded by the kernel width. See ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(kernel_height - 1 - kernel_height // 2, threads), width, kernel_width)
+    cdef ring_t ring = _ring(err, kernel_width)
+    cdef const uint16_t[:, ::1] noise
+    cdef uint8_t[:, :] scratch
+    if prime is not None:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        scratch = _bits_zeros(noise.shape[0], width)
+        with nogil:
+            _ed_core(noise, &ring, kernel_buf, scratch, noise.shape[0], width, kernel_height, kernel_width, str_value)
+        _ring_skip(err, noise.shape[0])
+    with nogil:
+        if threads > 1:
+            _ed_wavefront(src, &ring, kernel_buf, out_buf, height, width, kernel_height, kernel_width, str_value, threads)
+        else:
+            _ed_core(src, &ring, kernel_buf, out_buf, height, width, kernel_height, kernel_width, str_value)
+    return out
 
 cdef void _ed_core(
-    int32_t[:, :] img,
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
     double[:, :] kernel,
     uint8_t[:, :] out,
     int height, int width,
     int kernel_height, int kernel_width,
     float str_value
 ) noexcept nogil:
-    cdef int y, x, ky, kx, kernel_center_x, kernel_center_y, ny, nx
+    cdef int y
+
+    for y in range(height):
+        _ed_span(src, ring, kernel, out, y, 0, width, kernel_height, kernel_width, str_value)
+        _ring_clear(ring, y)
+
+cdef void _ed_wavefront(
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    double[:, :] kernel,
+    uint8_t[:, :] out,
+    int height, int width,
+    int kernel_height, int kernel_width,
+    float str_value,
+    int threads
+) noexcept nogil:
+    # same as _ed_core but the rows run on several threads, see wavefront.pxi
+    cdef int y, x0, x1, need
+    cdef int* progress = _wf_progress(height)
+
+    if progress == NULL:
+        _ed_core(src, ring, kernel, out, height, width, kernel_height, kernel_width, str_value)
+        return
+
+    for y in prange(height, schedule='static', chunksize=1, num_threads=threads):
+        x0 = 0
+        while x0 < width:
+            x1 = x0 + WF_CHUNK
+            if x1 > width:
+                x1 = width
+            # the row above has to be a kernel width ahead
+            need = x1 + kernel_width
+            if need > width:
+                need = width
+            _wf_wait(progress, y, need)
+            _ed_span(src, ring, kernel, out, y, x0, x1, kernel_height, kernel_width, str_value)
+            if x1 == width:
+                # the rows above are done as well, nothing writes here anymore
+                _ring_clear(ring, y)
+            _wf_done(progress, y, x1)
+            x0 = x1
+
+    free(progress)
+
+cdef void _ed_span(
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    double[:, :] kernel,
+    uint8_t[:, :] out,
+    int y, int x0, int x1,
+    int kernel_height, int kernel_width,
+    float str_value
+) noexcept nogil:
+    # processes the pixels x0 to x1 of a single row
+    cdef int x, ky, kx, kernel_center_x, kernel_center_y, slot, first_slot
     cdef int32_t old_pixel, new_pixel
     cdef double error
     cdef int32_t THRESHOLD = 32768
+    cdef int32_t* row = _ring_row(ring, y)
+    cdef int32_t* target
 
     kernel_center_x = kernel_width // 2
     kernel_center_y = kernel_height // 2
+    first_slot = y % ring.rows
 
-    for y in range(height):
-        for x in range(width):
-            old_pixel = img[y, x]
-            if old_pixel >= THRESHOLD:
-                new_pixel = 65535
-                out[y, x] = 1
-            else:
-                new_pixel = 0
-                out[y, x] = 0
-            error = (old_pixel - new_pixel) * str_value
-            for ky in range(kernel_height):
-                for kx in range(kernel_width):
-                    if kernel[ky, kx] != 0:
-                        # check if there is something at the index to diffuse. this led to the biggest improvement in speed.
-                        ny = y + ky - kernel_center_y
-                        nx = x + kx - kernel_center_x
-                        if 0 <= ny < height and 0 <= nx < width:
-                            # check if the pixel is even inside the image. I've tried padding the image to avoid this check but it didn't seem to matter at all.
-                            # Add the error to the int32 array
-                            img[ny, nx] += <int32_t>(error * kernel[ky, kx])
-                            # actually diffuse the error maybe the index could be precomputed
+    for x in range(x0, x1):
+        old_pixel = src[y, x] + row[x]
+        if old_pixel >= THRESHOLD:
+            new_pixel = 65535
+            _bit_set(out, y, x)
+        else:
+            new_pixel = 0
+        error = (old_pixel - new_pixel) * str_value
+        slot = first_slot
+        for ky in range(kernel_center_y, kernel_height):
+            # no bounds checks needed, the ring is padded and rows past the
+            # bottom are never read
+            target = ring.data + slot * ring.stride + ring.pad + x - kernel_center_x
+            for kx in range(kernel_width):
+                if kernel[ky, kx] != 0:
+                    # check if there is something at the index to diffuse. this led to the biggest improvement in speed.
+                    target[kx] += <int32_t>(error * kernel[ky, kx])
+            slot += 1
+            if slot == ring.rows:
+                slot = 0
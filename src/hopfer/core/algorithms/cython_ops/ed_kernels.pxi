@@ -0,0 +1,698 @@
+# ed_kernels.pxi
+# GENERATED by src/hopfer/core/compiler/ed_compiler.py, do not edit by hand.
+from libc.stdint cimport int32_t, uint8_t, uint16_t
+
+ctypedef void (*ed_span_t)(
+    const uint16_t[:, ::1], ring_t*, uint8_t[:, :], int, int, int, float
+) noexcept nogil
+
+# the kernels with a specialized version, maps names to ids
+ED_KERNELS = {
+    "Floyd-Steinberg": 0,
+    "False Floyd-Steinberg": 1,
+    "Jarvis": 2,
+    "Stucki": 3,
+    "Stucki small": 4,
+    "Stucki large": 5,
+    "Atkinson": 6,
+    "Burkes": 7,
+    "Sierra": 8,
+    "Sierra2": 9,
+}
+
+
+def ed_kernel(img_u16, int kernel_id, float str_value, bint serpentine=False, int threads=0, prime=None):
+    """
+    Error diffusion with one of the fixed kernels in ED_KERNELS. Takes the same arguments as ed/eds, except that the kernel is given by its id. The errors are spread with integer weights, so the result can differ from ed/eds by a level here and there.
+    """
+    cdef int h = img_u16.shape[0]
+    cdef int w = img_u16.shape[1]
+    out = _bits_zeros(h, w)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    cdef uint8_t[:, :] out_buf = out
+    cdef ed_span_t span
+    cdef ed_span_t rspan
+    cdef int lag, below, pad
+    cdef const uint16_t[:, ::1] noise
+    cdef uint8_t[:, :] scratch
+
+    if kernel_id == 0:  # Floyd-Steinberg
+        span = _ed_floyd_steinberg_span
+        rspan = _ed_floyd_steinberg_rspan
+        lag = 3
+        below = 1
+        pad = 1
+    elif kernel_id == 1:  # False Floyd-Steinberg
+        span = _ed_false_floyd_steinberg_span
+        rspan = _ed_false_floyd_steinberg_rspan
+        lag = 2
+        below = 1
+        pad = 1
+    elif kernel_id == 2:  # Jarvis
+        span = _ed_jarvis_span
+        rspan = _ed_jarvis_rspan
+        lag = 5
+        below = 2
+        pad = 2
+    elif kernel_id == 3:  # Stucki
+        span = _ed_stucki_span
+        rspan = _ed_stucki_rspan
+        lag = 5
+        below = 2
+        pad = 2
+    elif kernel_id == 4:  # Stucki small
+        span = _ed_stucki_small_span
+        rspan = _ed_stucki_small_rspan
+        lag = 4
+        below = 2
+        pad = 2
+    elif kernel_id == 5:  # Stucki large
+        span = _ed_stucki_large_span
+        rspan = _ed_stucki_large_rspan
+        lag = 7
+        below = 3
+        pad = 3
+    elif kernel_id == 6:  # Atkinson
+        span = _ed_atkinson_span
+        rspan = _ed_atkinson_rspan
+        lag = 4
+        below = 2
+        pad = 2
+    elif kernel_id == 7:  # Burkes
+        span = _ed_burkes_span
+        rspan = _ed_burkes_rspan
+        lag = 5
+        below = 1
+        pad = 2
+    elif kernel_id == 8:  # Sierra
+        span = _ed_sierra_span
+        rspan = _ed_sierra_rspan
+        lag = 5
+        below = 2
+        pad = 2
+    elif kernel_id == 9:  # Sierra2
+        span = _ed_sierra2_span
+        rspan = _ed_sierra2_rspan
+        lag = 5
+        below = 1
+        pad = 2
+    else:
+        raise ValueError(f"Unknown kernel id: {kernel_id}")
+
+    if serpentine:
+        threads = 1
+    else:
+        threads = _wf_threads(h, w, threads)
+
+    # only the error is kept, see ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(below, threads), w, pad)
+    cdef ring_t ring = _ring(err, pad)
+
+    # priming, see ed
+    if prime is not None:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        scratch = _bits_zeros(noise.shape[0], w)
+        with nogil:
+            if serpentine:
+                _edk_serpentine(span, rspan, noise, &ring, scratch, noise.shape[0], w, str_value)
+            else:
+                _edk_raster(span, noise, &ring, scratch, noise.shape[0], w, str_value)
+        _ring_skip(err, noise.shape[0])
+
+    with nogil:
+        if serpentine:
+            _edk_serpentine(span, rspan, src, &ring, out_buf, h, w, str_value)
+        elif threads > 1:
+            _edk_wavefront(span, src, &ring, out_buf, h, w, lag, str_value, threads)
+        else:
+            _edk_raster(span, src, &ring, out_buf, h, w, str_value)
+    return out
+
+cdef void _edk_raster(ed_span_t span, const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int h, int w, float str_value) noexcept nogil:
+    cdef int y
+    for y in range(h):
+        span(src, ring, out, y, 0, w, str_value)
+        _ring_clear(ring, y)
+
+cdef void _edk_serpentine(ed_span_t span, ed_span_t rspan, const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int h, int w, float str_value) noexcept nogil:
+    # same as eds, even rows go left to right
+    cdef int y
+    for y in range(h):
+        if y % 2 == 0:
+            span(src, ring, out, y, 0, w, str_value)
+        else:
+            rspan(src, ring, out, y, 0, w, str_value)
+        _ring_clear(ring, y)
+
+cdef void _edk_wavefront(ed_span_t span, const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int h, int w, int lag, float str_value, int threads) noexcept nogil:
+    # see wavefront.pxi
+    cdef int y, x0, x1, need
+    cdef int* progress = _wf_progress(h)
+
+    if progress == NULL:
+        _edk_raster(span, src, ring, out, h, w, str_value)
+        return
+
+    for y in prange(h, schedule='static', chunksize=1, num_threads=threads):
+        x0 = 0
+        while x0 < w:
+            x1 = x0 + WF_CHUNK
+            if x1 > w:
+                x1 = w
+            need = x1 + lag
+            if need > w:
+                need = w
+            _wf_wait(progress, y, need)
+            span(src, ring, out, y, x0, x1, str_value)
+            if x1 == w:
+                _ring_clear(ring, y)
+            _wf_done(progress, y, x1)
+            x0 = x1
+
+    free(progress)
+
+# Floyd-Steinberg, divisor 16
+cdef void _ed_floyd_steinberg_span(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, left to right
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+
+    for x in range(x0, x1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x + 1] += e * 7 // 16
+        e1[x - 1] += e * 3 // 16
+        e1[x] += e * 5 // 16
+        e1[x + 1] += e * 1 // 16
+
+cdef void _ed_floyd_steinberg_rspan(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, right to left
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+
+    for x in range(x1 - 1, x0 - 1, -1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x - 1] += e * 7 // 16
+        e1[x + 1] += e * 3 // 16
+        e1[x] += e * 5 // 16
+        e1[x - 1] += e * 1 // 16
+
+# False Floyd-Steinberg, divisor 8
+cdef void _ed_false_floyd_steinberg_span(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, left to right
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+
+    for x in range(x0, x1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x + 1] += e * 3 // 8
+        e1[x] += e * 3 // 8
+        e1[x + 1] += e * 2 // 8
+
+cdef void _ed_false_floyd_steinberg_rspan(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, right to left
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+
+    for x in range(x1 - 1, x0 - 1, -1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x - 1] += e * 3 // 8
+        e1[x] += e * 3 // 8
+        e1[x - 1] += e * 2 // 8
+
+# Jarvis, divisor 48
+cdef void _ed_jarvis_span(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, left to right
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+    cdef int32_t* e2 = _ring_row(ring, y + 2)
+
+    for x in range(x0, x1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x + 1] += e * 7 // 48
+        e0[x + 2] += e * 5 // 48
+        e1[x - 2] += e * 3 // 48
+        e1[x - 1] += e * 5 // 48
+        e1[x] += e * 7 // 48
+        e1[x + 1] += e * 5 // 48
+        e1[x + 2] += e * 3 // 48
+        e2[x - 2] += e * 1 // 48
+        e2[x - 1] += e * 3 // 48
+        e2[x] += e * 5 // 48
+        e2[x + 1] += e * 3 // 48
+        e2[x + 2] += e * 1 // 48
+
+cdef void _ed_jarvis_rspan(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, right to left
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+    cdef int32_t* e2 = _ring_row(ring, y + 2)
+
+    for x in range(x1 - 1, x0 - 1, -1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x - 1] += e * 7 // 48
+        e0[x - 2] += e * 5 // 48
+        e1[x + 2] += e * 3 // 48
+        e1[x + 1] += e * 5 // 48
+        e1[x] += e * 7 // 48
+        e1[x - 1] += e * 5 // 48
+        e1[x - 2] += e * 3 // 48
+        e2[x + 2] += e * 1 // 48
+        e2[x + 1] += e * 3 // 48
+        e2[x] += e * 5 // 48
+        e2[x - 1] += e * 3 // 48
+        e2[x - 2] += e * 1 // 48
+
+# Stucki, divisor 42
+cdef void _ed_stucki_span(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, left to right
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+    cdef int32_t* e2 = _ring_row(ring, y + 2)
+
+    for x in range(x0, x1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x + 1] += e * 8 // 42
+        e0[x + 2] += e * 4 // 42
+        e1[x - 2] += e * 2 // 42
+        e1[x - 1] += e * 4 // 42
+        e1[x] += e * 8 // 42
+        e1[x + 1] += e * 4 // 42
+        e1[x + 2] += e * 2 // 42
+        e2[x - 2] += e * 1 // 42
+        e2[x - 1] += e * 2 // 42
+        e2[x] += e * 4 // 42
+        e2[x + 1] += e * 2 // 42
+        e2[x + 2] += e * 1 // 42
+
+cdef void _ed_stucki_rspan(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, right to left
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+    cdef int32_t* e2 = _ring_row(ring, y + 2)
+
+    for x in range(x1 - 1, x0 - 1, -1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x - 1] += e * 8 // 42
+        e0[x - 2] += e * 4 // 42
+        e1[x + 2] += e * 2 // 42
+        e1[x + 1] += e * 4 // 42
+        e1[x] += e * 8 // 42
+        e1[x - 1] += e * 4 // 42
+        e1[x - 2] += e * 2 // 42
+        e2[x + 2] += e * 1 // 42
+        e2[x + 1] += e * 2 // 42
+        e2[x] += e * 4 // 42
+        e2[x - 1] += e * 2 // 42
+        e2[x - 2] += e * 1 // 42
+
+# Stucki small, divisor 12
+cdef void _ed_stucki_small_span(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, left to right
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+    cdef int32_t* e2 = _ring_row(ring, y + 2)
+
+    for x in range(x0, x1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x + 1] += e * 4 // 12
+        e0[x + 2] += e * 1 // 12
+        e1[x - 1] += e * 1 // 12
+        e1[x] += e * 4 // 12
+        e1[x + 1] += e * 1 // 12
+        e2[x] += e * 1 // 12
+
+cdef void _ed_stucki_small_rspan(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, right to left
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+    cdef int32_t* e2 = _ring_row(ring, y + 2)
+
+    for x in range(x1 - 1, x0 - 1, -1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x - 1] += e * 4 // 12
+        e0[x - 2] += e * 1 // 12
+        e1[x + 1] += e * 1 // 12
+        e1[x] += e * 4 // 12
+        e1[x - 1] += e * 1 // 12
+        e2[x] += e * 1 // 12
+
+# Stucki large, divisor 44
+cdef void _ed_stucki_large_span(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, left to right
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+    cdef int32_t* e2 = _ring_row(ring, y + 2)
+    cdef int32_t* e3 = _ring_row(ring, y + 3)
+
+    for x in range(x0, x1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x + 1] += e * 4 // 44
+        e0[x + 2] += e * 2 // 44
+        e0[x + 3] += e * 1 // 44
+        e1[x - 3] += e * 1 // 44
+        e1[x - 2] += e * 2 // 44
+        e1[x - 1] += e * 4 // 44
+        e1[x] += e * 4 // 44
+        e1[x + 1] += e * 4 // 44
+        e1[x + 2] += e * 2 // 44
+        e1[x + 3] += e * 1 // 44
+        e2[x - 3] += e * 1 // 44
+        e2[x - 2] += e * 2 // 44
+        e2[x - 1] += e * 2 // 44
+        e2[x] += e * 2 // 44
+        e2[x + 1] += e * 2 // 44
+        e2[x + 2] += e * 2 // 44
+        e2[x + 3] += e * 1 // 44
+        e3[x - 3] += e * 1 // 44
+        e3[x - 2] += e * 1 // 44
+        e3[x - 1] += e * 1 // 44
+        e3[x] += e * 1 // 44
+        e3[x + 1] += e * 1 // 44
+        e3[x + 2] += e * 1 // 44
+        e3[x + 3] += e * 1 // 44
+
+cdef void _ed_stucki_large_rspan(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, right to left
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+    cdef int32_t* e2 = _ring_row(ring, y + 2)
+    cdef int32_t* e3 = _ring_row(ring, y + 3)
+
+    for x in range(x1 - 1, x0 - 1, -1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x - 1] += e * 4 // 44
+        e0[x - 2] += e * 2 // 44
+        e0[x - 3] += e * 1 // 44
+        e1[x + 3] += e * 1 // 44
+        e1[x + 2] += e * 2 // 44
+        e1[x + 1] += e * 4 // 44
+        e1[x] += e * 4 // 44
+        e1[x - 1] += e * 4 // 44
+        e1[x - 2] += e * 2 // 44
+        e1[x - 3] += e * 1 // 44
+        e2[x + 3] += e * 1 // 44
+        e2[x + 2] += e * 2 // 44
+        e2[x + 1] += e * 2 // 44
+        e2[x] += e * 2 // 44
+        e2[x - 1] += e * 2 // 44
+        e2[x - 2] += e * 2 // 44
+        e2[x - 3] += e * 1 // 44
+        e3[x + 3] += e * 1 // 44
+        e3[x + 2] += e * 1 // 44
+        e3[x + 1] += e * 1 // 44
+        e3[x] += e * 1 // 44
+        e3[x - 1] += e * 1 // 44
+        e3[x - 2] += e * 1 // 44
+        e3[x - 3] += e * 1 // 44
+
+# Atkinson, divisor 8
+cdef void _ed_atkinson_span(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, left to right
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+    cdef int32_t* e2 = _ring_row(ring, y + 2)
+
+    for x in range(x0, x1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x + 1] += e * 1 // 8
+        e0[x + 2] += e * 1 // 8
+        e1[x - 1] += e * 1 // 8
+        e1[x] += e * 1 // 8
+        e1[x + 1] += e * 1 // 8
+        e2[x] += e * 1 // 8
+
+cdef void _ed_atkinson_rspan(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, right to left
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+    cdef int32_t* e2 = _ring_row(ring, y + 2)
+
+    for x in range(x1 - 1, x0 - 1, -1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x - 1] += e * 1 // 8
+        e0[x - 2] += e * 1 // 8
+        e1[x + 1] += e * 1 // 8
+        e1[x] += e * 1 // 8
+        e1[x - 1] += e * 1 // 8
+        e2[x] += e * 1 // 8
+
+# Burkes, divisor 16
+cdef void _ed_burkes_span(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, left to right
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+
+    for x in range(x0, x1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x + 1] += e * 4 // 16
+        e0[x + 2] += e * 2 // 16
+        e1[x - 2] += e * 1 // 16
+        e1[x - 1] += e * 2 // 16
+        e1[x] += e * 4 // 16
+        e1[x + 1] += e * 2 // 16
+        e1[x + 2] += e * 1 // 16
+
+cdef void _ed_burkes_rspan(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, right to left
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+
+    for x in range(x1 - 1, x0 - 1, -1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x - 1] += e * 4 // 16
+        e0[x - 2] += e * 2 // 16
+        e1[x + 2] += e * 1 // 16
+        e1[x + 1] += e * 2 // 16
+        e1[x] += e * 4 // 16
+        e1[x - 1] += e * 2 // 16
+        e1[x - 2] += e * 1 // 16
+
+# Sierra, divisor 32
+cdef void _ed_sierra_span(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, left to right
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+    cdef int32_t* e2 = _ring_row(ring, y + 2)
+
+    for x in range(x0, x1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x + 1] += e * 5 // 32
+        e0[x + 2] += e * 3 // 32
+        e1[x - 2] += e * 2 // 32
+        e1[x - 1] += e * 4 // 32
+        e1[x] += e * 5 // 32
+        e1[x + 1] += e * 4 // 32
+        e1[x + 2] += e * 2 // 32
+        e2[x - 1] += e * 2 // 32
+        e2[x] += e * 3 // 32
+        e2[x + 1] += e * 2 // 32
+
+cdef void _ed_sierra_rspan(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, right to left
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+    cdef int32_t* e2 = _ring_row(ring, y + 2)
+
+    for x in range(x1 - 1, x0 - 1, -1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x - 1] += e * 5 // 32
+        e0[x - 2] += e * 3 // 32
+        e1[x + 2] += e * 2 // 32
+        e1[x + 1] += e * 4 // 32
+        e1[x] += e * 5 // 32
+        e1[x - 1] += e * 4 // 32
+        e1[x - 2] += e * 2 // 32
+        e2[x + 1] += e * 2 // 32
+        e2[x] += e * 3 // 32
+        e2[x - 1] += e * 2 // 32
+
+# Sierra2, divisor 16
+cdef void _ed_sierra2_span(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, left to right
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+
+    for x in range(x0, x1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x + 1] += e * 4 // 16
+        e0[x + 2] += e * 3 // 16
+        e1[x - 2] += e * 1 // 16
+        e1[x - 1] += e * 2 // 16
+        e1[x] += e * 3 // 16
+        e1[x + 1] += e * 2 // 16
+        e1[x + 2] += e * 1 // 16
+
+cdef void _ed_sierra2_rspan(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:
+    # pixels x0 to x1 of a single row, right to left
+    cdef int x
+    cdef int32_t old, e
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+
+    for x in range(x1 - 1, x0 - 1, -1):
+        old = src[y, x] + e0[x]
+        if old >= 32768:
+            e = old - 65535
+            _bit_set(out, y, x)
+        else:
+            e = old
+        e = <int32_t>(e * str_value)
+        e0[x - 1] += e * 4 // 16
+        e0[x - 2] += e * 3 // 16
+        e1[x + 2] += e * 1 // 16
+        e1[x + 1] += e * 2 // 16
+        e1[x] += e * 3 // 16
+        e1[x - 1] += e * 2 // 16
+        e1[x - 2] += e * 1 // 16
@@ -1,33 +1,53 @@
 # eds.pxi
 from libc.stdint cimport int32_t, uint8_t, uint16_t
 
-def eds(img_u16, kernel, double str_value):
+def eds(img_u16, kernel, double str_value, prime=None):
     """
     A generic error diffusion fuction. Expects the image, the kernel (see src/image_processor for example) and a strength of diffusion as a float between 0 and 1 which controls the amount of error to be diffused. This is the serpentine version. It was separated for performance reasons.
+    `prime` is the same as in ed.
     """
     cdef int height = img_u16.shape[0]
     cdef int width = img_u16.shape[1]
-    out = np.zeros((height, width), dtype=np.uint8)
-    cdef int32_t[:, :] img = np.array(img_u16, dtype=np.int32)
-    cdef double[:, :] kernel_buf = np.array(kernel, dtype=np.float64)
+    out = _bits_zeros(height, width)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    kernel = np.array(kernel, dtype=np.float64)
     cdef int kernel_height = kernel.shape[0]
     cdef int kernel_width = kernel.shape[1]
-    _eds_core(img, kernel_buf, out, height, width, kernel_height, kernel_width, str_value)
-    return out.view(np.bool_)
+    # see ed.pxi
+    kernel[:kernel_height // 2] = 0
+    cdef double[:, :] kernel_buf = kernel
+    cdef uint8_t[:, :] out_buf = out
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(kernel_height - 1 - kernel_height // 2, 1), width, kernel_width)
+    cdef ring_t ring = _ring(err, kernel_width)
+    cdef const uint16_t[:, ::1] noise
+    cdef uint8_t[:, :] scratch
+    if prime is not None:
+        # an even number of rows keeps the direction of every image row
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        scratch = _bits_zeros(noise.shape[0], width)
+        with nogil:
+            _eds_core(noise, &ring, kernel_buf, scratch, noise.shape[0], width, kernel_height, kernel_width, str_value)
+        _ring_skip(err, noise.shape[0])
+    with nogil:
+        _eds_core(src, &ring, kernel_buf, out_buf, height, width, kernel_height, kernel_width, str_value)
+    return out
 
 cdef void _eds_core(
-    int32_t[:, :] img,
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
     double[:, :] kernel,
     uint8_t[:, :] out,
     int height, int width,
     int kernel_height, int kernel_width,
     double str_value
 ) noexcept nogil:
-    cdef int y, x, ky, kx, kernel_center_x, kernel_center_y, ny, nx
+    cdef int y, x, ky, kx, kernel_center_x, kernel_center_y, nx, slot, first_slot
     cdef int32_t old_pixel, new_pixel
     cdef double error
     cdef int32_t THRESHOLD = 32768
     cdef bint left_to_right
+    cdef int32_t* row
+    cdef int32_t* target
 
     kernel_center_x = kernel_width // 2
     kernel_center_y = kernel_height // 2
@@ -35,30 +55,30 @@ cdef void _eds_core(
     for y in range(height):
         # flipping the whole image seems like an easy way to do a serpentine raster.
         left_to_right = (y % 2 == 0)
+        row = _ring_row(ring, y)
+        first_slot = y % ring.rows
         for x in range(width):
             # map logical x to actual column depending on scan direction
             nx = x if left_to_right else (width - 1 - x)
-            old_pixel = img[y, nx]
+            old_pixel = src[y, nx] + row[nx]
             if old_pixel >= THRESHOLD:
                 new_pixel = 65535
-                out[y, nx] = 1
+                _bit_set(out, y, nx)
             else:
                 new_pixel = 0
-                out[y, nx] = 0
-            img[y, nx] = new_pixel  # replace the value in place
             error = (old_pixel - new_pixel) * str_value
-            for ky in range(kernel_height):
+            slot = first_slot
+            for ky in range(kernel_center_y, kernel_height):
+                target = ring.data + slot * ring.stride + ring.pad + nx
                 for kx in range(kernel_width):
                     if kernel[ky, kx] != 0:
                         # check if there is something at the index to diffuse. this led to the biggest improvement in speed.
-                        ny = y + ky - kernel_center_y
                         # mirror the kernel x offset on reverse rows so diffusion always points forward
                         if left_to_right:
-                            nx = x + kx - kernel_center_x
+                            target[kx - kernel_center_x] += <int32_t>(error * kernel[ky, kx])
                         else:
-                            nx = (width - 1 - x) - kx + kernel_center_x
-                        if 0 <= ny < height and 0 <= nx < width:
-                            # check if the pixel is even inside the image. I've tried padding the image to avoid this check but it didn't seem to matter at all.
-                            # Add the error to the int32 array
-                            img[ny, nx] += <int32_t>(error * kernel[ky, kx])
-                            # actually diffuse the error. maybe the index could be precomputed
+                            target[kernel_center_x - kx] += <int32_t>(error * kernel[ky, kx])
+                slot += 1
+                if slot == ring.rows:
+                    slot = 0
+        _ring_clear(ring, y)
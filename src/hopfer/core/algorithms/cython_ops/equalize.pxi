@@ -2,18 +2,27 @@
 import numpy as np
 cimport numpy as np
 from libc.stdint cimport uint8_t, uint16_t, uint32_t
+from libc.stdlib cimport calloc, malloc, free
 from cython.parallel import prange
 
 def equalize(img):
     cdef int h = img.shape[0]
     cdef int w = img.shape[1]
 
-    is_u8 = img.dtype == np.uint8
+    cdef bint is_u8 = img.dtype == np.uint8
+    # equalized in place, only the view of the right type is set
+    cdef uint8_t[:, :] img_u8 = img if is_u8 else None
+    cdef uint16_t[:, :] img_u16 = None if is_u8 else img
 
-    if is_u8:
-        _equalize_u8(img, h, w)
-    else:
-        _equalize_u16(img, h, w)
+    cdef int status = 0
+
+    with nogil:
+        if is_u8:
+            _equalize_u8(img_u8, h, w)
+        else:
+            status = _equalize_u16(img_u16, h, w)
+    if status < 0:
+        raise MemoryError()
 
     return img
 
@@ -54,16 +63,19 @@ cdef void _equalize_u8(uint8_t[:, :] img, int h, int w) noexcept nogil:
         for x in range(w):
             img[y, x] = lut[img[y, x]]
 
-cdef void _equalize_u16(uint16_t[:, :] img, int h, int w) noexcept nogil:
+cdef int _equalize_u16(uint16_t[:, :] img, int h, int w) noexcept nogil:
     cdef int y, x, i
-    cdef uint32_t hist[65536]
-    cdef uint16_t lut[65536]
+    # 384 KB, too much for the stack of a thread that isn't the main one
+    # (512 KB on macOS), so they're on the heap
+    cdef uint32_t* hist = <uint32_t*>calloc(65536, sizeof(uint32_t))
+    cdef uint16_t* lut = <uint16_t*>malloc(65536 * sizeof(uint16_t))
     cdef double total_pixels = <double>h * <double>w
     cdef uint32_t current_cdf = 0
 
-    # create the histogram
-    for i in range(65536):
-        hist[i] = 0
+    if hist == NULL or lut == NULL:
+        free(hist)
+        free(lut)
+        return -1
 
     # build it
     for y in range(h):
@@ -90,3 +102,7 @@ cdef void _equalize_u16(uint16_t[:, :] img, int h, int w) noexcept nogil:
     for y in prange(h, schedule='static'):
         for x in range(w):
             img[y, x] = lut[img[y, x]]
+
+    free(hist)
+    free(lut)
+    return 0
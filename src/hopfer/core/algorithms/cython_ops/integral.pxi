@@ -0,0 +1,230 @@
+# integral.pxi
+# The local thresholds all need the mean and the standard deviation of a window
+# around every pixel, which the integral images (summed-area tables, see
+# https://en.wikipedia.org/wiki/Summed-area_table) give in 4 lookups each, no
+# matter how big the window is.
+# The tables are integers. The sums are uint32 and may wrap on big images, but
+# a window is only ever a difference of 4 of them, and that comes out right in
+# unsigned arithmetic as long as the window itself fits, which 255 * 500² does.
+# _local_threshold refuses windows that don't, 4104 x 4104 and up.
+# The squared sums are uint64, as 65025 * 500² doesn't fit in 32 bits.
+# A new local method only needs a rule that turns the sums of a window into a
+# threshold, _local_threshold does the rest.
+
+from libc.stdint cimport int64_t, uint8_t, uint32_t, uint64_t
+from libc.string cimport memset
+cimport openmp
+
+# the threshold of a pixel from the sum and the squared sum of its window
+ctypedef double (*local_rule_t)(double s, double sq, double area, const double* params) noexcept nogil
+
+
+def integral_images(img, out=None):
+    """
+    The integral image and the squared integral image of a uint8 image, both
+    (h + 1) x (w + 1) with a zero first row and column. uint32 and uint64.
+    out is an earlier (s, sq) of the same size to write them to instead of
+    new arrays.
+    """
+    cdef int h = img.shape[0]
+    cdef int w = img.shape[1]
+    cdef const uint8_t[:, ::1] src = np.ascontiguousarray(img, dtype=np.uint8)
+    if out is None:
+        s = np.empty((h + 1, w + 1), dtype=np.uint32)
+        sq = np.empty((h + 1, w + 1), dtype=np.uint64)
+    else:
+        s, sq = out
+        if s.shape != (h + 1, w + 1) or sq.shape != (h + 1, w + 1):
+            raise ValueError("out has to be the size of the image plus 1")
+    cdef uint32_t[:, ::1] s_buf = s
+    cdef uint64_t[:, ::1] sq_buf = sq
+    with nogil:
+        _integral_core(src, s_buf, sq_buf, h, w)
+    return s, sq
+
+
+cdef void _integral_core(const uint8_t[:, ::1] img, uint32_t[:, ::1] s, uint64_t[:, ::1] sq, int h, int w) noexcept nogil:
+    cdef int y, x, c, x0, x1
+    cdef uint32_t acc
+    cdef uint64_t acc_sq
+    cdef uint32_t v
+    # the columns are summed in strips this wide, so every thread walks down
+    # its own strip a cache line at a time
+    cdef int strip = 512
+    cdef int strips = (w + strip - 1) // strip
+
+    memset(&s[0, 0], 0, (w + 1) * sizeof(uint32_t))
+    memset(&sq[0, 0], 0, (w + 1) * sizeof(uint64_t))
+
+    # the sums along every row, each row on its own
+    for y in prange(h, schedule='static'):
+        acc = 0
+        acc_sq = 0
+        s[y + 1, 0] = 0
+        sq[y + 1, 0] = 0
+        for x in range(w):
+            v = img[y, x]
+            acc = acc + v
+            acc_sq = acc_sq + v * v
+            s[y + 1, x + 1] = acc
+            sq[y + 1, x + 1] = acc_sq
+
+    # then down the columns, each strip on its own
+    for c in prange(strips, schedule='static'):
+        x0 = 1 + c * strip
+        x1 = x0 + strip if x0 + strip < w + 1 else w + 1
+        for y in range(2, h + 1):
+            for x in range(x0, x1):
+                s[y, x] += s[y - 1, x]
+                sq[y, x] += sq[y - 1, x]
+
+
+cdef object _local_threshold(img, int n, local_rule_t rule, double[::1] params, integrals, bint low_memory=False):
+    # a pixel is white if it's above the threshold the rule gives for the n x n
+    # window around it, cut off at the edges of the image. integrals are the
+    # tables of integral_images(img) if the caller kept them, built otherwise.
+    # low_memory streams the image instead, see _local_threshold_streamed.
+    cdef int h = img.shape[0]
+    cdef int w = img.shape[1]
+    # the sum of a window has to fit in the uint32 of the tables. a window
+    # never reaches past the image, so only a big one on a big image doesn't.
+    cdef int span = 2 * (n // 2) + 1
+    if 255 * <uint64_t>min(span, h) * <uint64_t>min(span, w) >= 2**32:
+        raise ValueError(f"A block size of {n} is too big for the image")
+    cdef const uint8_t[:, ::1] src = np.ascontiguousarray(img, dtype=np.uint8)
+    out = _bits_zeros(h, w)
+    cdef uint8_t[:, ::1] out_buf = out
+    if low_memory and integrals is None:
+        _local_threshold_streamed(src, out_buf, h, w, n // 2, rule, params)
+        return out
+    if integrals is None:
+        s, sq = integral_images(src)
+    else:
+        s, sq = integrals
+        if s.shape != (h + 1, w + 1) or sq.shape != (h + 1, w + 1):
+            raise ValueError("The integral images don't match the image")
+    cdef const uint32_t[:, ::1] s_buf = s
+    cdef const uint64_t[:, ::1] sq_buf = sq
+    cdef int y, y1, y2, half = n // 2
+    with nogil:
+        for y in prange(h, schedule='static'):
+            y1 = y - half if y - half > 0 else 0
+            y2 = y + half + 1 if y + half + 1 < h else h
+            _threshold_row(
+                &src[y, 0], &out_buf[y, 0], w, half, y2 - y1,
+                &s_buf[y1, 0], &s_buf[y2, 0], &sq_buf[y1, 0], &sq_buf[y2, 0],
+                rule, &params[0],
+            )
+    return out
+
+
+cdef void _local_threshold_streamed(
+    const uint8_t[:, ::1] img,
+    uint8_t[:, ::1] out,
+    int h, int w, int half,
+    local_rule_t rule,
+    double[::1] params
+):
+    # instead of the tables for the whole image, every thread keeps the sums
+    # down the columns of the window of its current row, and slides them down
+    # a row at a time. the rows are then summed up along x just for the row,
+    # which makes it the same lookup as with the tables, against a zero row.
+    # a few rows of w per thread instead of 12 bytes per pixel.
+    cdef int bands = openmp.omp_get_max_threads()
+    if bands > h:
+        bands = h
+    if bands < 1:
+        bands = 1
+    cdef uint32_t[:, ::1] cols = np.empty((bands, w), dtype=np.uint32)
+    cdef uint32_t[:, ::1] cols_sq = np.empty((bands, w), dtype=np.uint32)
+    cdef uint32_t[:, ::1] pre = np.empty((bands, w + 1), dtype=np.uint32)
+    cdef uint64_t[:, ::1] pre_sq = np.empty((bands, w + 1), dtype=np.uint64)
+    cdef uint32_t[::1] zeros = np.zeros(w + 1, dtype=np.uint32)
+    cdef uint64_t[::1] zeros_sq = np.zeros(w + 1, dtype=np.uint64)
+    cdef int b
+    with nogil:
+        for b in prange(bands, schedule='static', chunksize=1):
+            _threshold_band(
+                img, out, h, w, half,
+                h * b // bands, h * (b + 1) // bands,
+                &cols[b, 0], &cols_sq[b, 0], &pre[b, 0], &pre_sq[b, 0],
+                &zeros[0], &zeros_sq[0], rule, &params[0],
+            )
+
+
+cdef void _threshold_band(
+    const uint8_t[:, ::1] img,
+    uint8_t[:, ::1] out,
+    int h, int w, int half,
+    int y_start, int y_end,
+    uint32_t* col, uint32_t* col_sq, uint32_t* pre, uint64_t* pre_sq,
+    const uint32_t* zeros, const uint64_t* zeros_sq,
+    local_rule_t rule,
+    const double* params
+) noexcept nogil:
+    cdef int y, x, r, y1, y2
+    cdef uint32_t v
+    # the window of the first row, from scratch
+    y1 = y_start - half if y_start - half > 0 else 0
+    y2 = y_start + half + 1 if y_start + half + 1 < h else h
+    memset(col, 0, w * sizeof(uint32_t))
+    memset(col_sq, 0, w * sizeof(uint32_t))
+    for r in range(y1, y2):
+        for x in range(w):
+            v = img[r, x]
+            col[x] += v
+            col_sq[x] += v * v
+
+    for y in range(y_start, y_end):
+        # then down a row, the row below comes in and the top one goes out
+        if y + half + 1 <= h and y + half + 1 > y2:
+            for x in range(w):
+                v = img[y2, x]
+                col[x] += v
+                col_sq[x] += v * v
+            y2 += 1
+        if y - half > y1:
+            for x in range(w):
+                v = img[y1, x]
+                col[x] -= v
+                col_sq[x] -= v * v
+            y1 += 1
+
+        pre[0] = 0
+        pre_sq[0] = 0
+        for x in range(w):
+            pre[x + 1] = pre[x] + col[x]
+            pre_sq[x + 1] = pre_sq[x] + col_sq[x]
+
+        _threshold_row(
+            &img[y, 0], &out[y, 0], w, half, y2 - y1,
+            zeros, pre, zeros_sq, pre_sq, rule, params,
+        )
+
+
+cdef inline void _threshold_row(
+    const uint8_t* src,
+    uint8_t* row,
+    int w, int half, int rows,
+    const uint32_t* s_top, const uint32_t* s_bottom,
+    const uint64_t* sq_top, const uint64_t* sq_bottom,
+    local_rule_t rule,
+    const double* params
+) noexcept nogil:
+    # one row against the rows of the integral images above and below its
+    # window, rows apart
+    cdef int x, x1, x2
+    cdef double threshold
+    for x in range(w):
+        x1 = x - half if x - half > 0 else 0
+        x2 = x + half + 1 if x + half + 1 < w else w
+        threshold = rule(
+            # the differences wrap back into range, see the top
+            <double><uint32_t>(s_bottom[x2] - s_bottom[x1] - s_top[x2] + s_top[x1]),
+            # through int64, unsigned 64 bit to double is slow on x86
+            <double><int64_t>(sq_bottom[x2] - sq_bottom[x1] - sq_top[x2] + sq_top[x1]),
+            <double>(rows * (x2 - x1)),
+            params,
+        )
+        if src[x] > threshold:
+            row[x >> 3] |= <uint8_t>(0x80 >> (x & 7))
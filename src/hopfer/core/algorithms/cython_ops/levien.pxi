@@ -1,17 +1,33 @@
 # levien.pxi
 from libc.stdint cimport int32_t, uint8_t, uint16_t
 
-def levien(img_u16, double str_value, double hysteresis_c, bint serpentine):
+def levien(img_u16, double str_value, double hysteresis_c, bint serpentine, prime=None):
     cdef int h = img_u16.shape[0]
     cdef int w = img_u16.shape[1]
-    out = np.zeros((h, w), dtype=np.uint8)
-    cdef int32_t[:, :] img = np.array(img_u16, dtype=np.int32)
-    _levien_core(img, out, h, w, str_value, hysteresis_c, serpentine)
-    return out.view(np.bool_)
+    # priming, see ed. the priming rows go into the first n rows of the
+    # output, so the hysteresis of the first image row sees the last of them.
+    cdef int n = 0 if prime is None else prime.shape[0]
+    out = _bits_zeros(n + h, w)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    cdef uint8_t[:, :] out_buf = out
+    # int32 ring for the error, see ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(1, 1), w, 1)
+    cdef ring_t ring = _ring(err, 1)
+    cdef const uint16_t[:, ::1] noise
+    if n:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        with nogil:
+            _levien_core(noise, &ring, out_buf, 0, n, w, str_value, hysteresis_c, serpentine)
+        _ring_skip(err, n)
+    with nogil:
+        _levien_core(src, &ring, out_buf, n, h, w, str_value, hysteresis_c, serpentine)
+    return out[n:]
 
 cdef void _levien_core(
-    int32_t[:, :] img,
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
     uint8_t[:, :] out,
+    int oy,  # the row of out the first row of src goes to
     int h, int w,
     double str_value,
     double hysteresis_c,
@@ -22,50 +38,48 @@ cdef void _levien_core(
     cdef int32_t THRESHOLD = 32768
     cdef int32_t HVAL = 32767  # this is the value of the hysteresis per pixel
     cdef bint reverse
+    cdef int32_t* e0
+    cdef int32_t* e1
 
     for y in range(h):
         reverse = serpentine and (y % 2 == 0)
+        e0 = _ring_row(ring, y)
+        e1 = _ring_row(ring, y + 1)
         for x in range(w):
             actual_x = (w - 1 - x) if reverse else x
-            old_value = img[y, actual_x]
+            old_value = src[y, actual_x] + e0[actual_x]
             hysteresis = 0
             # get the hysteresis value here. if hysteresis is 0 there is absolutely no need to hit these indeces up and waste time.
             if hysteresis_c != 0:
                 if not reverse:
                     # current row
-                    if actual_x - 1 >= 0 and out[y, actual_x - 1]:
+                    if actual_x - 1 >= 0 and _bit_get(out, oy + y, actual_x - 1):
                         hysteresis += HVAL  # x - 1
                     # row above
-                    if y - 1 >= 0 and out[y - 1, actual_x]:
+                    if oy + y >= 1 and _bit_get(out, oy + y - 1, actual_x):
                         hysteresis += HVAL  # current x
                 else:
                     # current row
-                    if actual_x + 1 < w and out[y, actual_x + 1]:
+                    if actual_x + 1 < w and _bit_get(out, oy + y, actual_x + 1):
                         hysteresis += HVAL  # x - 1
                     # row above
-                    if y - 1 >= 0 and out[y - 1, actual_x]:
+                    if oy + y >= 1 and _bit_get(out, oy + y - 1, actual_x):
                         hysteresis += HVAL  # current x
 
             hysteresis = <int32_t>(hysteresis * hysteresis_c)
             if old_value + hysteresis >= THRESHOLD:
                 new_value = 65535
-                out[y, actual_x] = 1
+                _bit_set(out, oy + y, actual_x)
             else:
                 new_value = 0
-                out[y, actual_x] = 0
             error = <int32_t>((old_value - new_value) * str_value)
             # as the sum of the kernel is 2, bitshifts were used.
+            # the ring is padded and rows past the bottom are never read, so
+            # there is no need for checks.
             if not reverse:
-                # current row
-                if actual_x + 1 < w:
-                    img[y, actual_x + 1] += error >> 1  # x + 1
-                # row bellow
-                if y + 1 < h:
-                    img[y + 1, actual_x] += error >> 1
+                e0[actual_x + 1] += error >> 1  # x + 1
             else:
-                # current row
-                if actual_x - 1 >= 0:
-                    img[y, actual_x - 1] += error >> 1  # x + 1
-                # row bellow
-                if y + 1 < h:
-                    img[y + 1, actual_x] += error >> 1
+                e0[actual_x - 1] += error >> 1  # x + 1
+            # row bellow
+            e1[actual_x] += error >> 1
+        _ring_clear(ring, y)
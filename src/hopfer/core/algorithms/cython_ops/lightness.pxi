@@ -6,24 +6,28 @@ from cython.parallel import prange
 def lightness(img, bint out_8bit=False):
     cdef int h = img.shape[0]
     cdef int w = img.shape[1]
-    is_u8 = img.dtype == np.uint8
-
-    if out_8bit:
-        out_u8 = np.empty((h, w), dtype=np.uint8)
-        if is_u8:
-            _lightness_u8_u8(img, out_u8)
-        else:
-            _lightness_u16_u8(img, out_u8)
-        return out_u8
-    else:
-        out_u16 = np.empty((h, w), dtype=np.uint16)
-        if is_u8:
-            _lightness_u8_u16(img, out_u16)
+    cdef bint is_u8 = img.dtype == np.uint8
+    out = np.empty((h, w), dtype=np.uint8 if out_8bit else np.uint16)
+    # typed before the gil is released, only the ones that are used are set
+    cdef const uint8_t[:, :, :] src_u8 = img if is_u8 else None
+    cdef const uint16_t[:, :, :] src_u16 = None if is_u8 else img
+    cdef uint8_t[:, :] out_u8 = out if out_8bit else None
+    cdef uint16_t[:, :] out_u16 = None if out_8bit else out
+
+    with nogil:
+        if out_8bit:
+            if is_u8:
+                _lightness_u8_u8(src_u8, out_u8)
+            else:
+                _lightness_u16_u8(src_u16, out_u8)
         else:
-            _lightness_u16_u16(img, out_u16)
-        return out_u16
+            if is_u8:
+                _lightness_u8_u16(src_u8, out_u16)
+            else:
+                _lightness_u16_u16(src_u16, out_u16)
+    return out
 
-cdef void _lightness_u16_u16(uint16_t[:, :, :] img, uint16_t[:, :] out) noexcept nogil:
+cdef void _lightness_u16_u16(const uint16_t[:, :, :] img, uint16_t[:, :] out) noexcept nogil:
     cdef int y, x, h = img.shape[0], w = img.shape[1]
     cdef uint16_t r, g, b, mx, mn
 
@@ -43,7 +47,7 @@ cdef void _lightness_u16_u16(uint16_t[:, :, :] img, uint16_t[:, :] out) noexcept
 
             out[y, x] = <uint16_t>((<uint32_t>mx + mn + 1) >> 1)
 
-cdef void _lightness_u8_u8(uint8_t[:, :, :] img, uint8_t[:, :] out) noexcept nogil:
+cdef void _lightness_u8_u8(const uint8_t[:, :, :] img, uint8_t[:, :] out) noexcept nogil:
     cdef int y, x, h = img.shape[0], w = img.shape[1]
     cdef uint8_t r, g, b, mx, mn
 
@@ -63,7 +67,7 @@ cdef void _lightness_u8_u8(uint8_t[:, :, :] img, uint8_t[:, :] out) noexcept nog
 
             out[y, x] = <uint8_t>((<uint16_t>mx + mn + 1) >> 1)
 
-cdef void _lightness_u16_u8(uint16_t[:, :, :] img, uint8_t[:, :] out) noexcept nogil:
+cdef void _lightness_u16_u8(const uint16_t[:, :, :] img, uint8_t[:, :] out) noexcept nogil:
     """16-bit to 8-bit. Shifted by 8 assuming standard u16 scaling."""
     cdef int y, x, h = img.shape[0], w = img.shape[1]
     cdef uint16_t r, g, b, mx, mn
@@ -84,7 +88,7 @@ cdef void _lightness_u16_u8(uint16_t[:, :, :] img, uint8_t[:, :] out) noexcept n
 
             out[y, x] = <uint8_t>(((<uint32_t>mx + mn + 1) >> 1) >> 8)
 
-cdef void _lightness_u8_u16(uint8_t[:, :, :] img, uint16_t[:, :] out) noexcept nogil:
+cdef void _lightness_u8_u16(const uint8_t[:, :, :] img, uint16_t[:, :] out) noexcept nogil:
     """8-bit to 16-bit. Bit-shifted left by 8."""
     cdef int y, x, h = img.shape[0], w = img.shape[1]
     cdef uint8_t r, g, b, mx, mn
@@ -3,24 +3,28 @@
 def manual(img, double rf, double gf, double bf, bint out_8bit=False):
     cdef int h = img.shape[0]
     cdef int w = img.shape[1]
-    is_u8 = img.dtype == np.uint8
-
-    if out_8bit:
-        out_u8 = np.empty((h, w), dtype=np.uint8)
-        if is_u8:
-            _manual_u8_u8(img, out_u8, rf, gf, bf)
-        else:
-            _manual_u16_u8(img, out_u8, rf, gf, bf)
-        return out_u8
-    else:
-        out_u16 = np.empty((h, w), dtype=np.uint16)
-        if is_u8:
-            _manual_u8_u16(img, out_u16, rf, gf, bf)
+    cdef bint is_u8 = img.dtype == np.uint8
+    out = np.empty((h, w), dtype=np.uint8 if out_8bit else np.uint16)
+    # typed before the gil is released, only the ones that are used are set
+    cdef const uint8_t[:, :, :] src_u8 = img if is_u8 else None
+    cdef const uint16_t[:, :, :] src_u16 = None if is_u8 else img
+    cdef uint8_t[:, :] out_u8 = out if out_8bit else None
+    cdef uint16_t[:, :] out_u16 = None if out_8bit else out
+
+    with nogil:
+        if out_8bit:
+            if is_u8:
+                _manual_u8_u8(src_u8, out_u8, rf, gf, bf)
+            else:
+                _manual_u16_u8(src_u16, out_u8, rf, gf, bf)
         else:
-            _manual_u16_u16(img, out_u16, rf, gf, bf)
-        return out_u16
+            if is_u8:
+                _manual_u8_u16(src_u8, out_u16, rf, gf, bf)
+            else:
+                _manual_u16_u16(src_u16, out_u16, rf, gf, bf)
+    return out
 
-cdef void _manual_u16_u16(uint16_t[:, :, :] img, uint16_t[:, :] out, double rf, double gf, double bf) noexcept nogil:
+cdef void _manual_u16_u16(const uint16_t[:, :, :] img, uint16_t[:, :] out, double rf, double gf, double bf) noexcept nogil:
     cdef int y, x, h = img.shape[0], w = img.shape[1]
     cdef double val
     cdef uint16_t r, g, b
@@ -38,7 +42,7 @@ cdef void _manual_u16_u16(uint16_t[:, :, :] img, uint16_t[:, :] out, double rf,
 
             out[y, x] = <uint16_t>val
 
-cdef void _manual_u8_u8(uint8_t[:, :, :] img, uint8_t[:, :] out, double rf, double gf, double bf) noexcept nogil:
+cdef void _manual_u8_u8(const uint8_t[:, :, :] img, uint8_t[:, :] out, double rf, double gf, double bf) noexcept nogil:
     cdef int y, x, h = img.shape[0], w = img.shape[1]
     cdef double val
     cdef uint8_t r, g, b
@@ -56,7 +60,7 @@ cdef void _manual_u8_u8(uint8_t[:, :, :] img, uint8_t[:, :] out, double rf, doub
 
             out[y, x] = <uint8_t>val
 
-cdef void _manual_u16_u8(uint16_t[:, :, :] img, uint8_t[:, :] out, double rf, double gf, double bf) noexcept nogil:
+cdef void _manual_u16_u8(const uint16_t[:, :, :] img, uint8_t[:, :] out, double rf, double gf, double bf) noexcept nogil:
     cdef int y, x, h = img.shape[0], w = img.shape[1]
     cdef double val
 
@@ -69,7 +73,7 @@ cdef void _manual_u16_u8(uint16_t[:, :, :] img, uint8_t[:, :] out, double rf, do
 
             out[y, x] = <uint8_t>val
 
-cdef void _manual_u8_u16(uint8_t[:, :, :] img, uint16_t[:, :] out, double rf, double gf, double bf) noexcept nogil:
+cdef void _manual_u8_u16(const uint8_t[:, :, :] img, uint16_t[:, :] out, double rf, double gf, double bf) noexcept nogil:
     cdef int y, x, h = img.shape[0], w = img.shape[1]
     cdef double val
 
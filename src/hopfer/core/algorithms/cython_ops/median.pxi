@@ -0,0 +1,285 @@
+# median.pxi
+# A median filter in constant time per pixel, whatever its size, for uint16
+# (Perreault & Hébert, "Median Filtering in Constant Time", 2007). uint8 stays
+# with cv2.medianBlur, which is faster at 256 levels than this can be.
+# Every column keeps the histogram of its 2r + 1 pixels around the current row
+# and the histogram of a window is the sum of 2r + 1 of those. Moving a pixel
+# right adds one column and drops another, moving a row down adds a pixel to
+# every column and drops another.
+# 65536 bins are far too many to add up at every pixel, so the histograms come
+# in tiers of 4 bits: 16 bins for the top 4 bits of a level, 16 for the next 4
+# bits within each of those and so on, 4 tiers in all. The first tier is added up at every pixel, a segment of 16 bins of the others
+# only when the median falls into it, from the column it was last up to date.
+# On a smooth image that's mostly the one next to it.
+# The image is filtered in strips of columns, in parallel. A strip takes its
+# pixels out of the histograms again when it's done, so a thread reuses them
+# for the next one without clearing them.
+# The edges are replicated, like cv2.medianBlur does.
+
+from libc.stdint cimport int64_t, uint16_t
+from libc.string cimport memset
+cimport openmp
+
+# a segment of 16 bins is added up as a whole, which the compiler only turns
+# into vector code when it knows the segments don't overlap
+cdef extern from *:
+    """
+    #if defined(_MSC_VER)
+    #define _MEDIAN_RESTRICT __restrict
+    #else
+    #define _MEDIAN_RESTRICT __restrict__
+    #endif
+    static void _median_add(unsigned short *_MEDIAN_RESTRICT k,
+                            const unsigned short *_MEDIAN_RESTRICT add) {
+        for (int i = 0; i < 16; i++)
+            k[i] = (unsigned short)(k[i] + add[i]);
+    }
+    static void _median_step(unsigned short *_MEDIAN_RESTRICT k,
+                             const unsigned short *_MEDIAN_RESTRICT add,
+                             const unsigned short *_MEDIAN_RESTRICT sub) {
+        for (int i = 0; i < 16; i++)
+            k[i] = (unsigned short)(k[i] + add[i] - sub[i]);
+    }
+    """
+    void _median_add(uint16_t* k, const uint16_t* add) noexcept nogil
+    void _median_step(uint16_t* k, const uint16_t* add, const uint16_t* sub) noexcept nogil
+
+# the columns of a strip. the histograms of a thread are (64 + 2r) columns of
+# 69904 bins, 16 MB at a radius of 25.
+MEDIAN_STRIP = 64
+# the tiers of 4 bits of a 16 bit level
+cdef int MEDIAN_TIERS = 4
+
+
+def median(img, int ksize, out=None):
+    """
+    The median of the ksize x ksize window around every pixel of a uint16
+    image, ksize odd and at most 255. Written to out if given, a new array
+    otherwise. out can't be img, the filter reads pixels it has written
+    already.
+    """
+    # the bins count in uint16, a window of 257² pixels would wrap them
+    if ksize < 1 or ksize % 2 == 0 or ksize > 255:
+        raise ValueError("ksize has to be odd and at most 255")
+    if img.dtype != np.uint16:
+        raise ValueError("median supports uint16, use cv2.medianBlur for uint8")
+    img = np.ascontiguousarray(img)
+    if out is None:
+        out = np.empty_like(img)
+    elif out.shape != img.shape or out.dtype != img.dtype:
+        raise ValueError("out has to be of the shape and type of img")
+    elif np.shares_memory(out, img):
+        raise ValueError("out can't be img")
+
+    cdef int h = img.shape[0]
+    cdef int w = img.shape[1]
+    if h == 0 or w == 0:
+        return out
+    cdef int r = ksize // 2
+    cdef int tiers = MEDIAN_TIERS
+    cdef int strip = MEDIAN_STRIP
+    cdef int strips = (w + strip - 1) // strip
+    cdef int bands = openmp.omp_get_max_threads()
+    if bands > strips:
+        bands = strips
+    if bands < 1:
+        bands = 1
+
+    # the bins and the segments of 16 of them over all tiers
+    cdef int bins = 0
+    cdef int segments = 0
+    cdef int t
+    for t in range(tiers):
+        segments += 1 << (4 * t)
+        bins += 1 << (4 * t + 4)
+    # only the column histograms have to start out empty. a segment of the
+    # window histogram is cleared when it's first used in a strip.
+    cols = np.zeros((bands, (strip + 2 * r) * bins), dtype=np.uint16)
+    kern = np.empty((bands, bins), dtype=np.uint16)
+    stamps = np.empty((bands, segments), dtype=np.int64)
+    cdef uint16_t[:, ::1] cols_buf = cols
+    cdef uint16_t[:, ::1] kern_buf = kern
+    cdef int64_t[:, ::1] stamps_buf = stamps
+
+    cdef const uint16_t[:, ::1] src = img
+    cdef uint16_t[:, ::1] dst = out
+    with nogil:
+        _median_core(src, dst, cols_buf, kern_buf, stamps_buf, r, tiers, strip, bands)
+    return out
+
+
+cdef void _median_core(const uint16_t[:, ::1] img, uint16_t[:, ::1] out, uint16_t[:, ::1] cols, uint16_t[:, ::1] kern, int64_t[:, ::1] stamps, int r, int tiers, int strip, int bands) noexcept nogil:
+    cdef int w = img.shape[1]
+    cdef int strips = (w + strip - 1) // strip
+    cdef int b, s, x1
+    # a thread takes every bands-th strip, the strips are all the same work
+    for b in prange(bands, schedule='static', chunksize=1):
+        s = b
+        while s < strips:
+            x1 = (s + 1) * strip
+            if x1 > w:
+                x1 = w
+            _median_strip(img, out, &cols[b, 0], &kern[b, 0], &stamps[b, 0], r, tiers, strip + 2 * r, s * strip, x1)
+            s = s + bands
+
+
+cdef void _median_strip(const uint16_t[:, ::1] img, uint16_t[:, ::1] out, uint16_t* cols, uint16_t* kern, int64_t* stamps, int r, int tiers, int stride, int x0, int x1) noexcept nogil:
+    cdef int h = img.shape[0]
+    cdef int w = img.shape[1]
+    # the columns with a histogram, all the windows of the strip reach
+    cdef int c0 = x0 - r
+    cdef int c1 = x1 + r
+    if c0 < 0:
+        c0 = 0
+    if c1 > w:
+        c1 = w
+    cdef int nc = c1 - c0
+
+    # where the tiers start in cols, kern and stamps. in cols the columns of a
+    # segment are next to each other, so summing them up walks straight on.
+    cdef Py_ssize_t col_off[4]
+    cdef Py_ssize_t kern_off[4]
+    cdef Py_ssize_t stamp_off[4]
+    cdef Py_ssize_t segments = 1
+    cdef Py_ssize_t o_col = 0
+    cdef Py_ssize_t o_kern = 0
+    cdef Py_ssize_t o_stamp = 0
+    cdef int t
+    for t in range(tiers):
+        col_off[t] = o_col
+        kern_off[t] = o_kern
+        stamp_off[t] = o_stamp
+        o_col += segments * stride * 16
+        o_kern += segments * 16
+        o_stamp += segments
+        segments *= 16
+    # every segment of the window histogram is out of date. -1 would be the
+    # pixel before the first one of the image.
+    cdef Py_ssize_t i
+    for i in range(o_stamp):
+        stamps[i] = -2
+
+    cdef int half = ((2 * r + 1) * (2 * r + 1)) // 2
+    cdef int y, x, c, j, row, top, bottom, rank, seg, bin, add_c, sub_c
+    cdef int64_t now
+    cdef int64_t* stamp
+    cdef uint16_t* k
+    cdef const uint16_t* base
+    cdef const uint16_t* src
+    cdef const uint16_t* src2
+
+    # the columns around the first row
+    for j in range(-r, r + 1):
+        row = j
+        if row < 0:
+            row = 0
+        if row > h - 1:
+            row = h - 1
+        src = &img[row, c0]
+        for c in range(nc):
+            _median_count(cols, col_off, stride, tiers, c, src[c], 1)
+
+    for y in range(h):
+        if y > 0:
+            top = y - r - 1
+            bottom = y + r
+            if top < 0:
+                top = 0
+            if bottom > h - 1:
+                bottom = h - 1
+            # the same row at both ends leaves the columns as they are
+            if top != bottom:
+                src = &img[top, c0]
+                src2 = &img[bottom, c0]
+                for c in range(nc):
+                    _median_count(cols, col_off, stride, tiers, c, src[c], -1)
+                    _median_count(cols, col_off, stride, tiers, c, src2[c], 1)
+
+        for x in range(x0, x1):
+            now = ((<int64_t>y) << 32) | x
+            # the columns coming in and going out at this pixel
+            add_c = x + r
+            sub_c = x - r - 1
+            if add_c > w - 1:
+                add_c = w - 1
+            if sub_c < 0:
+                sub_c = 0
+            add_c = (add_c - c0) * 16
+            sub_c = (sub_c - c0) * 16
+            rank = half
+            bin = 0
+            for t in range(tiers):
+                # the segment of this tier is the bin of the one above
+                seg = bin
+                k = kern + kern_off[t] + seg * 16
+                stamp = stamps + stamp_off[t] + seg
+                base = cols + col_off[t] + <Py_ssize_t>seg * stride * 16
+                if stamp[0] == now - 1:
+                    # up to date at the pixel to the left, by far the most
+                    # common case, handled right here
+                    stamp[0] = now
+                    _median_step(k, base + add_c, base + sub_c)
+                else:
+                    _median_sync(k, base, stamp, y, x, r, c0, w)
+                j = 0
+                while rank >= k[j]:
+                    rank = rank - k[j]
+                    j = j + 1
+                bin = bin * 16 + j
+            out[y, x] = <uint16_t>bin
+
+    # the columns around the last row are taken out again, which leaves them
+    # empty for the next strip
+    for j in range(h - 1 - r, h + r):
+        row = j
+        if row < 0:
+            row = 0
+        if row > h - 1:
+            row = h - 1
+        src = &img[row, c0]
+        for c in range(nc):
+            _median_count(cols, col_off, stride, tiers, c, src[c], -1)
+
+
+cdef inline void _median_count(uint16_t* cols, const Py_ssize_t* col_off, int stride, int tiers, int c, unsigned int v, int d) noexcept nogil:
+    # adds d to the bins of v in all tiers of column c
+    cdef int t
+    cdef unsigned int bin
+    cdef uint16_t* p
+    for t in range(tiers):
+        bin = v >> (4 * (tiers - 1 - t))
+        p = cols + col_off[t] + (<Py_ssize_t>(bin >> 4) * stride + c) * 16 + (bin & 15)
+        p[0] = <uint16_t>(p[0] + d)
+
+
+cdef inline void _median_sync(uint16_t* k, const uint16_t* base, int64_t* stamp, int y, int x, int r, int c0, int w) noexcept nogil:
+    # brings a segment of the window histogram to pixel x of row y. base is
+    # the segment of the first column with a histogram, stamp the pixel the
+    # segment was last brought to.
+    cdef int64_t now = ((<int64_t>y) << 32) | x
+    cdef int64_t last = stamp[0]
+    cdef int64_t behind = now - last
+    cdef int j, add_c, sub_c
+    if behind == 0:
+        return
+    stamp[0] = now
+    if last >= 0 and (last >> 32) == y and behind <= r:
+        # a few columns to the right, one in and one out for each
+        for j in range(x - <int>behind + 1, x + 1):
+            add_c = j + r
+            sub_c = j - r - 1
+            if add_c > w - 1:
+                add_c = w - 1
+            if sub_c < 0:
+                sub_c = 0
+            _median_step(k, base + (add_c - c0) * 16, base + (sub_c - c0) * 16)
+    else:
+        # further than the window is wide, summed up anew
+        memset(k, 0, 16 * sizeof(uint16_t))
+        for j in range(x - r, x + r + 1):
+            add_c = j
+            if add_c < 0:
+                add_c = 0
+            if add_c > w - 1:
+                add_c = w - 1
+            _median_add(k, base + (add_c - c0) * 16)
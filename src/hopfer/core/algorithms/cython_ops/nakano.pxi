@@ -1,17 +1,33 @@
 # nakano.pxi
 from libc.stdint cimport int32_t, uint8_t, uint16_t
 
-def nakano(img_u16, double str_value, double hysteresis_c, bint serpentine):
+def nakano(img_u16, double str_value, double hysteresis_c, bint serpentine, prime=None):
     cdef int h = img_u16.shape[0]
     cdef int w = img_u16.shape[1]
-    out = np.zeros((h, w), dtype=np.uint8)
-    cdef int32_t[:, :] img = np.array(img_u16, dtype=np.int32)
-    _nakano_core(img, out, h, w, str_value, hysteresis_c, serpentine)
-    return out.view(np.bool_)
+    # priming, see ed. the priming rows go into the first n rows of the
+    # output, so the hysteresis of the first image row sees the last of them.
+    cdef int n = 0 if prime is None else prime.shape[0]
+    out = _bits_zeros(n + h, w)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    cdef uint8_t[:, :] out_buf = out
+    # int32 ring for the error, see ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(3, 1), w, 3)
+    cdef ring_t ring = _ring(err, 3)
+    cdef const uint16_t[:, ::1] noise
+    if n:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        with nogil:
+            _nakano_core(noise, &ring, out_buf, 0, n, w, str_value, hysteresis_c, serpentine)
+        _ring_skip(err, n)
+    with nogil:
+        _nakano_core(src, &ring, out_buf, n, h, w, str_value, hysteresis_c, serpentine)
+    return out[n:]
 
 cdef void _nakano_core(
-    int32_t[:, :] img,
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
     uint8_t[:, :] out,
+    int oy,  # the row of out the first row of src goes to
     int h, int w,
     double str_value,
     double hysteresis_c,
@@ -21,6 +37,10 @@ cdef void _nakano_core(
     cdef int32_t old_value, new_value, error, hysteresis
     cdef int32_t THRESHOLD = 32768
     cdef bint reverse
+    cdef int32_t* e0
+    cdef int32_t* e1
+    cdef int32_t* e2
+    cdef int32_t* e3
     # precomputed constants for the maximum uint16 value
     cdef int32_t VAL_7 = 28671  # (65535 * 7) >> 4
     cdef int32_t VAL_5 = 20479  # (65535 * 5) >> 4
@@ -29,128 +49,95 @@ cdef void _nakano_core(
 
     for y in range(h):
         reverse = serpentine and (y % 2 == 0)
+        e0 = _ring_row(ring, y)
+        e1 = _ring_row(ring, y + 1)
+        e2 = _ring_row(ring, y + 2)
+        e3 = _ring_row(ring, y + 3)
         for x in range(w):
             actual_x = (w - 1 - x) if reverse else x
-            old_value = img[y, actual_x]
+            old_value = src[y, actual_x] + e0[actual_x]
             hysteresis = 0
             if hysteresis_c > 0:
                 # using rotated Floyd-Steinberg kernel
                 if not reverse: # noqua: SIM102
                     # current row
                     if actual_x - 1 >= 0:  # noqa: SIM102
-                        if out[y, actual_x - 1]:
+                        if _bit_get(out, oy + y, actual_x - 1):
                             hysteresis += VAL_7  # x - 1
                     # row above
-                    if y - 1 >= 0:
-                        if out[y - 1, actual_x]:
+                    if oy + y >= 1:
+                        if _bit_get(out, oy + y - 1, actual_x):
                             hysteresis += VAL_5  # current x
                         if actual_x - 1 >= 0:  # noqa: SIM102
-                            if out[y - 1, actual_x - 1]:
+                            if _bit_get(out, oy + y - 1, actual_x - 1):
                                 hysteresis += VAL_1  # x - 1
                         if actual_x + 1 < w:  # noqa: SIM102
-                            if out[y - 1, actual_x + 1]:
+                            if _bit_get(out, oy + y - 1, actual_x + 1):
                                 hysteresis += VAL_3  # x + 1
                 else:
                     if actual_x + 1 < w:  # noqa: SIM102
-                        if out[y, actual_x + 1]:
+                        if _bit_get(out, oy + y, actual_x + 1):
                             hysteresis += VAL_7  # x - 1
                     # row above
-                    if y - 1 >= 0:
-                        if out[y - 1, actual_x]:
+                    if oy + y >= 1:
+                        if _bit_get(out, oy + y - 1, actual_x):
                             hysteresis += VAL_5  # current x
                         if actual_x + 1 < w:  # noqa: SIM102
-                            if out[y - 1, actual_x + 1]:
+                            if _bit_get(out, oy + y - 1, actual_x + 1):
                                 hysteresis += VAL_1  # x - 1
                         if actual_x - 1 >= 0:  # noqa: SIM102
-                            if out[y - 1, actual_x - 1]:
+                            if _bit_get(out, oy + y - 1, actual_x - 1):
                                 hysteresis += VAL_3  # x + 1
             hysteresis = <int32_t>(hysteresis * hysteresis_c)
             if old_value + hysteresis >= THRESHOLD:
                 new_value = 65535
-                out[y, actual_x] = 1
+                _bit_set(out, oy + y, actual_x)
             else:
                 new_value = 0
-                out[y, actual_x] = 0
             error = <int32_t>((old_value - new_value) * str_value)
             # as the sum of the kernel is 64, bitshifts were used. this shaved about 0.1s from the execution. i'm sorry if someone ever reads the following:
+            # the ring is padded and rows past the bottom are never read, so
+            # there is no need for checks.
             if not reverse:
                 # current row
-                if actual_x + 2 < w:
-                    img[y, actual_x + 2] += (error * 6) >> 6  # x + 2
-                if actual_x + 3 < w:
-                    img[y, actual_x + 3] += (error * 4) >> 6  # x + 3
+                e0[actual_x + 2] += (error * 6) >> 6  # x + 2
+                e0[actual_x + 3] += (error * 4) >> 6  # x + 3
                 # row + 1
-                if y + 1 < h:
-                    if actual_x - 2 >= 0:
-                        img[y + 1, actual_x - 2] += (error * 1) >> 6  # x - 2
-                    if actual_x - 1 >= 0:
-                        img[y + 1, actual_x - 1] += (error * 6) >> 6  # x - 1
-                    if actual_x + 2 < w:
-                        img[y + 1, actual_x + 2] += (error * 5) >> 6  # x + 2
-                    if actual_x + 3 < w:
-                        img[y + 1, actual_x + 3] += (error * 3) >> 6  # x + 3
+                e1[actual_x - 2] += (error * 1) >> 6  # x - 2
+                e1[actual_x - 1] += (error * 6) >> 6  # x - 1
+                e1[actual_x + 2] += (error * 5) >> 6  # x + 2
+                e1[actual_x + 3] += (error * 3) >> 6  # x + 3
                 # row + 2
-                if y + 2 < h:
-                    if actual_x - 1 >= 0:
-                        img[y + 2, actual_x - 1] += (error * 4) >> 6  # x - 1
-                    # no checks, x is directly bellow
-                    img[y + 2, actual_x] += (error * 7) >> 6
-                    if actual_x + 1 < w:
-                        img[y + 2, actual_x + 1] += (error * 3) >> 6  # x + 1
-                    if actual_x + 2 < w:
-                        img[y + 2, actual_x + 2] += (error * 5) >> 6  # x + 2
-                    if actual_x + 3 < w:
-                        img[y + 2, actual_x + 3] += (error * 3) >> 6  # x + 3
+                e2[actual_x - 1] += (error * 4) >> 6  # x - 1
+                e2[actual_x] += (error * 7) >> 6
+                e2[actual_x + 1] += (error * 3) >> 6  # x + 1
+                e2[actual_x + 2] += (error * 5) >> 6  # x + 2
+                e2[actual_x + 3] += (error * 3) >> 6  # x + 3
                 # row + 3
-                if y + 3 < h:
-                    if actual_x - 1 >= 0:
-                        img[y + 3, actual_x - 1] += (error * 3) >> 6  # x - 1
-                    # no checks, same reason
-                    img[y + 3, actual_x] += (error * 5) >> 6
-                    if actual_x + 1 < w:
-                        img[y + 3, actual_x + 1] += (error * 3) >> 6  # x + 1
-                    if actual_x + 2 < w:
-                        img[y + 3, actual_x + 2] += (error * 4) >> 6  # x + 2
-                    if actual_x + 3 < w:
-                        img[y + 3, actual_x + 3] += (error * 2) >> 6  # x + 3
-
+                e3[actual_x - 1] += (error * 3) >> 6  # x - 1
+                e3[actual_x] += (error * 5) >> 6
+                e3[actual_x + 1] += (error * 3) >> 6  # x + 1
+                e3[actual_x + 2] += (error * 4) >> 6  # x + 2
+                e3[actual_x + 3] += (error * 2) >> 6  # x + 3
             else:
                 # current row
-                if actual_x - 2 >= 0:
-                    img[y, actual_x - 2] += (error * 6) >> 6  # x + 2
-                if actual_x - 3 >= 0:
-                    img[y, actual_x - 3] += (error * 4) >> 6  # x + 3
+                e0[actual_x - 2] += (error * 6) >> 6  # x + 2
+                e0[actual_x - 3] += (error * 4) >> 6  # x + 3
                 # row + 1
-                if y + 1 < h:
-                    if actual_x + 2 < w:
-                        img[y + 1, actual_x + 2] += (error * 1) >> 6  # x - 2
-                    if actual_x + 1 < w:
-                        img[y + 1, actual_x + 1] += (error * 6) >> 6  # x - 1
-                    if actual_x - 2 >= 0:
-                        img[y + 1, actual_x - 2] += (error * 5) >> 6  # x + 2
-                    if actual_x - 3 >= 0:
-                        img[y + 1, actual_x - 3] += (error * 3) >> 6  # x + 3
+                e1[actual_x + 2] += (error * 1) >> 6  # x - 2
+                e1[actual_x + 1] += (error * 6) >> 6  # x - 1
+                e1[actual_x - 2] += (error * 5) >> 6  # x + 2
+                e1[actual_x - 3] += (error * 3) >> 6  # x + 3
                 # row + 2
-                if y + 2 < h:
-                    if actual_x + 1 < w:
-                        img[y + 2, actual_x + 1] += (error * 4) >> 6  # x - 1
-                    # no checks, x is directly bellow
-                    img[y + 2, actual_x] += (error * 7) >> 6
-                    if actual_x - 1 >= 0:
-                        img[y + 2, actual_x - 1] += (error * 3) >> 6  # x + 1
-                    if actual_x - 2 < w:
-                        img[y + 2, actual_x - 2] += (error * 5) >> 6  # x + 2
-                    if actual_x - 3 < w:
-                        img[y + 2, actual_x - 3] += (error * 3) >> 6  # x + 3
+                e2[actual_x + 1] += (error * 4) >> 6  # x - 1
+                e2[actual_x] += (error * 7) >> 6
+                e2[actual_x - 1] += (error * 3) >> 6  # x + 1
+                e2[actual_x - 2] += (error * 5) >> 6  # x + 2
+                e2[actual_x - 3] += (error * 3) >> 6  # x + 3
                 # row + 3
-                if y + 3 < h:
-                    if actual_x + 1 < w:
-                        img[y + 3, actual_x + 1] += (error * 3) >> 6  # x - 1
-                    # no checks, same reason
-                    img[y + 3, actual_x] += (error * 5) >> 6
-                    if actual_x - 1 >= 0:
-                      img[y + 3, actual_x - 1] += (error * 3) >> 6  # x + 1
-                    if actual_x - 2 >= 0:
-                      img[y + 3, actual_x - 2] += (error * 4) >> 6  # x + 2
-                    if actual_x - 3 >= 0:
-                      img[y + 3, actual_x - 3] += (error * 2) >> 6  # x + 3
+                e3[actual_x + 1] += (error * 3) >> 6  # x - 1
+                e3[actual_x] += (error * 5) >> 6
+                e3[actual_x - 1] += (error * 3) >> 6  # x + 1
+                e3[actual_x - 2] += (error * 4) >> 6  # x + 2
+                e3[actual_x - 3] += (error * 2) >> 6  # x + 3
+        _ring_clear(ring, y)
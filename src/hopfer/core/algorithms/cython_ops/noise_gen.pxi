@@ -1,11 +1,12 @@
 # noise_gen.pxi
 from libc.stdint cimport uint16_t, uint32_t, uint64_t
 
-def noise_gen(uint16_t w):
+def noise_gen(int w):
     cdef int h = 20
     out = np.zeros((h, w), dtype=np.uint16)
     cdef uint16_t[:, :] noise = out
-    _noise_gen_core(noise, h, w)
+    with nogil:
+        _noise_gen_core(noise, h, w)
     return out
 
 cdef void _noise_gen_core(uint16_t[:, :] noise, int h, int w) noexcept nogil:
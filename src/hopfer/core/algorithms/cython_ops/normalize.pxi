@@ -15,36 +15,43 @@ def normalize(img, bint lut=False):
     cdef uint8_t min_v8, max_v8
     cdef uint16_t min_v16, max_v16
 
-    is_u8 = img.dtype == np.uint8
+    cdef bint is_u8 = img.dtype == np.uint8
+    # normalized in place, only the view of the right type is set
+    cdef uint8_t[:, :] img_u8 = img if is_u8 else None
+    cdef uint16_t[:, :] img_u16 = None if is_u8 else img
 
     if is_u8:
         min_v8 = 255
         max_v8 = 0
-        _find_min_max_u8(img, h, w, &min_v8, &max_v8)
+        with nogil:
+            _find_min_max_u8(img_u8, h, w, &min_v8, &max_v8)
 
         # if it spans the full range, normalizing would do nothing so just return back the image. min_v == max_v would result in divison by zero so return the image too.
         if (min_v8 == 0 and max_v8 == 255) or min_v8 == max_v8:
             return img
 
-        if lut:
-            _normalize_u8_lut(img, h, w, min_v8, max_v8)
-        else:
-            _normalize_u8(img, h, w, min_v8, max_v8)
+        with nogil:
+            if lut:
+                _normalize_u8_lut(img_u8, h, w, min_v8, max_v8)
+            else:
+                _normalize_u8(img_u8, h, w, min_v8, max_v8)
 
     else:
         min_v16 = 65535
         max_v16 = 0
-        _find_min_max_u16(img, h, w, &min_v16, &max_v16)
+        with nogil:
+            _find_min_max_u16(img_u16, h, w, &min_v16, &max_v16)
 
         # if it spans the full range, normalizing would do nothing so just return back the image. min_v == max_v would result in divison by zero so return the image too.
         if (min_v16 == 0 and max_v16 == 65535) or min_v16 == max_v16:
             return img
 
-        _normalize_u16(img, h, w, min_v16, max_v16)
+        with nogil:
+            _normalize_u16(img_u16, h, w, min_v16, max_v16)
 
     return img
 
-cdef void _find_min_max_u8(uint8_t[:, :] img, int h, int w, uint8_t* min_val, uint8_t* max_val) noexcept nogil:
+cdef void _find_min_max_u8(const uint8_t[:, :] img, int h, int w, uint8_t* min_val, uint8_t* max_val) noexcept nogil:
     cdef int y, x
     cdef uint8_t val
 
@@ -64,7 +71,7 @@ cdef void _find_min_max_u8(uint8_t[:, :] img, int h, int w, uint8_t* min_val, ui
     min_val[0] = cur_min
     max_val[0] = cur_max
 
-cdef void _find_min_max_u16(uint16_t[:, :] img, int h, int w, uint16_t* min_val, uint16_t* max_val) noexcept nogil:
+cdef void _find_min_max_u16(const uint16_t[:, :] img, int h, int w, uint16_t* min_val, uint16_t* max_val) noexcept nogil:
     cdef int y, x
     cdef uint16_t val
 
@@ -1,27 +1,65 @@
 # ordered_dither.pxi
-from libc.stdint cimport uint8_t
+from libc.stdint cimport uint8_t, uint16_t
 
 def ordered_dither(img, matrix):
+    """
+    Ordered dithering of a uint8 or uint16 image. The matrix has to be in the
+    same range as the image, it is converted to its type but not scaled.
+    """
     cdef int h = img.shape[0]
     cdef int w = img.shape[1]
-    out = np.zeros((h, w), dtype=np.uint8)
-    cdef uint8_t[:, :] img_buf = np.array(img, dtype=np.uint8)
-    cdef uint8_t[:, :] matrix_buf = np.array(matrix, dtype=np.uint8)
-    cdef int n = matrix.shape[0]
-    cdef int m = matrix.shape[1]
-    _ordered_dither_core(img_buf, matrix_buf, out, h, w, n, m)
-    return out.view(np.bool_)
+    out = _bits_zeros(h, w)
+    cdef uint8_t[:, ::1] out_buf = out
+    # instead of a modulo per pixel, the matrix is tiled once to the width of
+    # the image and every row just picks its row of tiles.
+    # pixels of 0 and 1 (in 8 bit) are always black, even where the matrix is
+    # 0. raising the thresholds to 2 does the same without a branch.
+    is_u8 = img.dtype == np.uint8
+    dtype = np.uint8 if is_u8 else np.uint16
+    tiles = _tile_thresholds(matrix, h, w, dtype, 2 if is_u8 else 2 << 8)
+    cdef const uint8_t[:, ::1] src_u8
+    cdef const uint8_t[:, ::1] tiles_u8
+    cdef const uint16_t[:, ::1] src_u16
+    cdef const uint16_t[:, ::1] tiles_u16
+    if is_u8:
+        src_u8 = np.ascontiguousarray(img, dtype=np.uint8)
+        tiles_u8 = tiles
+        with nogil:
+            _ordered_dither_core(src_u8, tiles_u8, out_buf, h, w)
+    else:
+        src_u16 = np.ascontiguousarray(img, dtype=np.uint16)
+        tiles_u16 = tiles
+        with nogil:
+            _ordered_dither_core(src_u16, tiles_u16, out_buf, h, w)
+    return out
 
-cdef void _ordered_dither_core(uint8_t[:, :] img, uint8_t[:, :] matrix, uint8_t[:, :] out, int h, int w, int n, int m) noexcept nogil:
-    cdef int y, x, i, j
-    cdef uint8_t pixel
-    for y in prange(h):
-        for x in range(w):
-            pixel = img[y, x]
-            j = y % n
-            if not (pixel == 0 or pixel == 1):
-                i = x % m
-                if matrix[j, i] > pixel:
-                    out[y, x] = 0
-                else:
-                    out[y, x] = 1
+
+def _tile_thresholds(matrix, int h, int w, dtype, int floor):
+    # the rows past the height of the image are never used, which matters for
+    # the big supercells of screens.py
+    matrix = np.maximum(np.asarray(matrix)[:h], floor).astype(dtype)
+    reps = -(-w // matrix.shape[1])
+    return np.ascontiguousarray(np.tile(matrix, (1, reps))[:, :w])
+
+
+cdef void _ordered_dither_core(const pixel_t[:, ::1] img, const pixel_t[:, ::1] tiles, uint8_t[:, ::1] out, int h, int w) noexcept nogil:
+    cdef int y, x, k, bytes_full = w >> 3
+    cdef const pixel_t* src
+    cdef const pixel_t* t
+    cdef uint8_t* row
+    cdef uint8_t byte
+    for y in prange(h, schedule='static'):
+        src = &img[y, 0]
+        t = &tiles[y % tiles.shape[0], 0]
+        row = &out[y, 0]
+        # 8 pixels at a time straight into their byte, see bits.pxi
+        for x in range(bytes_full):
+            byte = 0
+            for k in range(8):
+                byte = (byte << 1) | (src[x * 8 + k] >= t[x * 8 + k])
+            row[x] = byte
+        if w & 7:
+            byte = 0
+            for k in range(w & 7):
+                byte = byte | ((src[bytes_full * 8 + k] >= t[bytes_full * 8 + k]) << (7 - k))
+            row[bytes_full] = byte
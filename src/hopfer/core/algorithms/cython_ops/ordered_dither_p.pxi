@@ -1,39 +1,71 @@
 # ordered_dither_p.pxi
-from libc.stdint cimport uint8_t
-from libc.stdlib cimport rand, RAND_MAX
-from cython.parallel cimport prange
+from libc.stdint cimport uint8_t, uint16_t, uint64_t
 
-def ordered_dither_p(img, matrix, double pert=0.1):
+def ordered_dither_p(img, matrix, double pert=0.1, uint64_t seed=0):
+    """
+    ordered_dither with every threshold moved by a random amount, uniform in
+    [-pert, pert] of the range. The same seed gives the same image for any
+    number of threads, see rng.pxi.
+    """
     cdef int h = img.shape[0]
     cdef int w = img.shape[1]
-    out = np.zeros((h, w), dtype=np.uint8)
-    cdef uint8_t[:, :] img_buf = np.array(img, dtype=np.uint8)
-    cdef uint8_t[:, :] matrix_buf = np.array(matrix, dtype=np.uint8)
-    cdef int n = matrix.shape[0]
-    cdef int m = matrix.shape[1]
-    _ordered_dither_p_core(img_buf, matrix_buf, out, h, w, n, m, pert)
-    return out.view(np.bool_)
+    out = _bits_zeros(h, w)
+    cdef uint8_t[:, ::1] out_buf = out
+    is_u8 = img.dtype == np.uint8
+    dtype = np.uint8 if is_u8 else np.uint16
+    # the perturbed thresholds go below the floor of ordered_dither, so the
+    # black pixels are checked on their own here
+    cdef int black = 2 if is_u8 else 2 << 8
+    cdef int amplitude = <int>(pert * (255 if is_u8 else 65535))
+    tiles = _tile_thresholds(matrix, h, w, dtype, 0)
+    cdef const uint8_t[:, ::1] src_u8
+    cdef const uint8_t[:, ::1] tiles_u8
+    cdef const uint16_t[:, ::1] src_u16
+    cdef const uint16_t[:, ::1] tiles_u16
+    if is_u8:
+        src_u8 = np.ascontiguousarray(img, dtype=np.uint8)
+        tiles_u8 = tiles
+        with nogil:
+            _ordered_dither_p_core(src_u8, tiles_u8, out_buf, h, w, black, amplitude, seed)
+    else:
+        src_u16 = np.ascontiguousarray(img, dtype=np.uint16)
+        tiles_u16 = tiles
+        with nogil:
+            _ordered_dither_p_core(src_u16, tiles_u16, out_buf, h, w, black, amplitude, seed)
+    return out
+
 
 cdef void _ordered_dither_p_core(
-    uint8_t[:, :] img,
-    uint8_t[:, :] matrix,
-    uint8_t[:, :] out,
-    int h, int w, int n, int m,
-    double pert
+    const pixel_t[:, ::1] img,
+    const pixel_t[:, ::1] tiles,
+    uint8_t[:, ::1] out,
+    int h, int w,
+    int black, int amplitude,
+    uint64_t seed
 ) noexcept nogil:
-    cdef int y, x, i, j
-    cdef uint8_t pixel
-    cdef double threshold
+    cdef int y, x, k, bytes_full = w >> 3
+    cdef const pixel_t* src
+    cdef const pixel_t* t
+    cdef uint8_t* row
+    cdef uint8_t byte
+    for y in prange(h, schedule='static'):
+        src = &img[y, 0]
+        t = &tiles[y % tiles.shape[0], 0]
+        row = &out[y, 0]
+        # 8 pixels at a time straight into their byte, see ordered_dither.pxi
+        for x in range(bytes_full):
+            byte = 0
+            for k in range(8):
+                byte = (byte << 1) | _perturbed(src, t, x * 8 + k, y, black, amplitude, seed)
+            row[x] = byte
+        if w & 7:
+            byte = 0
+            for k in range(w & 7):
+                byte = byte | (_perturbed(src, t, bytes_full * 8 + k, y, black, amplitude, seed) << (7 - k))
+            row[bytes_full] = byte
+
 
-    for y in prange(h):
-        for x in range(w):
-            pixel = img[y, x]
-            j = y % n
-            if not (pixel == 0 or pixel == 1):
-                i = x % m
-                # uniform in [-pert, +pert], scaled to uint8 range
-                threshold = matrix[j, i] + (<double>rand() / RAND_MAX * 2.0 - 1.0) * pert * 255.0
-                if threshold > pixel:
-                    out[y, x] = 0
-                else:
-                    out[y, x] = 1
+cdef inline uint8_t _perturbed(const pixel_t* src, const pixel_t* t, int x, int y, int black, int amplitude, uint64_t seed) noexcept nogil:
+    if src[x] < black:
+        return 0
+    return src[x] >= t[x] + _rng_range(seed, y, x, amplitude)
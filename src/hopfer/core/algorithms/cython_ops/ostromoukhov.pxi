@@ -1,46 +1,120 @@
 # ostromoukhov.pxi
-from libc.stdint cimport int32_t, uint8_t, uint16_t
+from libc.stdint cimport int32_t, int64_t, uint8_t, uint16_t
 
-def ostromoukhov(img_u16, coeff_array, double str_value):
+cdef inline int32_t _q16_mul(int32_t value, int32_t q16) noexcept nogil:
+    # value * q16 / 65536, rounded. the coefficients of all of the variable
+    # EDs are Q16 integers (see ved_data.py), and so is their strength.
+    return <int32_t>((<int64_t>value * q16 + 0x8000) >> 16)
+
+cdef inline int32_t _q16(double value) noexcept nogil:
+    return <int32_t>(value * 65536.0 + 0.5)
+
+def ostromoukhov(img_u16, coeff_q16, double str_value, int threads=0, prime=None):
     cdef int h = img_u16.shape[0]
     cdef int w = img_u16.shape[1]
-    out = np.zeros((h, w), dtype=np.uint8)
-    # temporary promotion to int32 so that error could accumulate
-    cdef int32_t[:, :] img = np.array(img_u16, dtype=np.int32)
-    cdef double[:, :] coeff_buf = np.array(coeff_array, dtype=np.float64)
-    _ostromoukhov_core(img, coeff_buf, out, h, w, str_value)
-    return out.view(np.bool_)
+    out = _bits_zeros(h, w)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    cdef const int32_t[:, ::1] coeff_buf = np.ascontiguousarray(coeff_q16, dtype=np.int32)
+    cdef int32_t str_q16 = _q16(str_value)
+    cdef uint8_t[:, :] out_buf = out
+    threads = _wf_threads(h, w, threads)
+    # the error accumulates in an int32 ring, see ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(1, threads), w, 1)
+    cdef ring_t ring = _ring(err, 1)
+    # priming, see ed
+    cdef const uint16_t[:, ::1] noise
+    cdef uint8_t[:, :] scratch
+    if prime is not None:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        scratch = _bits_zeros(noise.shape[0], w)
+        with nogil:
+            _ostromoukhov_core(noise, &ring, coeff_buf, scratch, noise.shape[0], w, str_q16)
+        _ring_skip(err, noise.shape[0])
+    with nogil:
+        if threads > 1:
+            _ostromoukhov_wavefront(src, &ring, coeff_buf, out_buf, h, w, str_q16, threads)
+        else:
+            _ostromoukhov_core(src, &ring, coeff_buf, out_buf, h, w, str_q16)
+    return out
 
 cdef void _ostromoukhov_core(
-    int32_t[:, :] img,
-    double[:, :] coeff_array,
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    const int32_t[:, ::1] coeff_array,
     uint8_t[:, :] out,
     int h, int w,
-    double str_value
+    int32_t str_q16
 ) noexcept nogil:
-    cdef int y, x, coeff_idx
-    cdef int32_t old_value, new_value
-    cdef double error
-    cdef int32_t THRESHOLD = 32768
+    cdef int y
 
     for y in range(h):
-        for x in range(w):
-            old_value = img[y, x]
-            coeff_idx = old_value >> 8
-            if coeff_idx < 0:
-                coeff_idx = 0
-            elif coeff_idx > 255:
-                coeff_idx = 255
-            if old_value >= THRESHOLD:
-                new_value = 65535
-                out[y, x] = 1
-            else:
-                new_value = 0
-                out[y, x] = 0
-            error = (old_value - new_value) * str_value
-            if x + 1 < w:
-                img[y, x + 1] += <int32_t>(error * coeff_array[coeff_idx, 0])
-            if x - 1 >= 0 and y + 1 < h:
-                img[y + 1, x - 1] += <int32_t>(error * coeff_array[coeff_idx, 1])
-            if y + 1 < h:
-                img[y + 1, x] += <int32_t>(error * coeff_array[coeff_idx, 2])
+        _ostromoukhov_span(src, ring, coeff_array, out, y, 0, w, str_q16)
+        _ring_clear(ring, y)
+
+cdef void _ostromoukhov_wavefront(
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    const int32_t[:, ::1] coeff_array,
+    uint8_t[:, :] out,
+    int h, int w,
+    int32_t str_q16,
+    int threads
+) noexcept nogil:
+    # see wavefront.pxi
+    cdef int y, x0, x1, need
+    cdef int* progress = _wf_progress(h)
+
+    if progress == NULL:
+        _ostromoukhov_core(src, ring, coeff_array, out, h, w, str_q16)
+        return
+
+    for y in prange(h, schedule='static', chunksize=1, num_threads=threads):
+        x0 = 0
+        while x0 < w:
+            x1 = x0 + WF_CHUNK
+            if x1 > w:
+                x1 = w
+            need = x1 + 3
+            if need > w:
+                need = w
+            _wf_wait(progress, y, need)
+            _ostromoukhov_span(src, ring, coeff_array, out, y, x0, x1, str_q16)
+            if x1 == w:
+                _ring_clear(ring, y)
+            _wf_done(progress, y, x1)
+            x0 = x1
+
+    free(progress)
+
+cdef void _ostromoukhov_span(
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    const int32_t[:, ::1] coeff_array,
+    uint8_t[:, :] out,
+    int y, int x0, int x1,
+    int32_t str_q16
+) noexcept nogil:
+    # processes the pixels x0 to x1 of a single row
+    cdef int x, coeff_idx
+    cdef int32_t old_value, new_value, error
+    cdef int32_t THRESHOLD = 32768
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+
+    for x in range(x0, x1):
+        old_value = src[y, x] + e0[x]
+        coeff_idx = old_value >> 8
+        if coeff_idx < 0:
+            coeff_idx = 0
+        elif coeff_idx > 255:
+            coeff_idx = 255
+        if old_value >= THRESHOLD:
+            new_value = 65535
+            _bit_set(out, y, x)
+        else:
+            new_value = 0
+        error = _q16_mul(old_value - new_value, str_q16)
+        # the ring is padded, so no checks are needed
+        e0[x + 1] += _q16_mul(error, coeff_array[coeff_idx, 0])
+        e1[x - 1] += _q16_mul(error, coeff_array[coeff_idx, 1])
+        e1[x] += _q16_mul(error, coeff_array[coeff_idx, 2])
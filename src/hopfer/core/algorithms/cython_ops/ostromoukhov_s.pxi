@@ -1,34 +1,52 @@
 # ostromoukhov_s.pxi
 from libc.stdint cimport int32_t, uint8_t, uint16_t
 
-def ostromoukhov_s(img_u16, coeff_array, double str_value):
+def ostromoukhov_s(img_u16, coeff_q16, double str_value, prime=None):
     cdef int h = img_u16.shape[0]
     cdef int w = img_u16.shape[1]
-    out = np.zeros((h, w), dtype=np.uint8)
-    # Promotion to int32 for precise error accumulation
-    cdef int32_t[:, :] img = np.array(img_u16, dtype=np.int32)
-    cdef double[:, :] coeff_buf = np.array(coeff_array, dtype=np.float64)
-    _ostromoukhov_s_core(img, coeff_buf, out, h, w, str_value)
-    return out.view(np.bool_)
+    out = _bits_zeros(h, w)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    cdef const int32_t[:, ::1] coeff_buf = np.ascontiguousarray(coeff_q16, dtype=np.int32)
+    cdef int32_t str_q16 = _q16(str_value)
+    cdef uint8_t[:, :] out_buf = out
+    # int32 ring for precise error accumulation, see ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(1, 1), w, 1)
+    cdef ring_t ring = _ring(err, 1)
+    # priming, see ed
+    cdef const uint16_t[:, ::1] noise
+    cdef uint8_t[:, :] scratch
+    if prime is not None:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        scratch = _bits_zeros(noise.shape[0], w)
+        with nogil:
+            _ostromoukhov_s_core(noise, &ring, coeff_buf, scratch, noise.shape[0], w, str_q16)
+        _ring_skip(err, noise.shape[0])
+    with nogil:
+        _ostromoukhov_s_core(src, &ring, coeff_buf, out_buf, h, w, str_q16)
+    return out
 
 cdef void _ostromoukhov_s_core(
-    int32_t[:, :] img,
-    double[:, :] coeff_array,
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    const int32_t[:, ::1] coeff_array,
     uint8_t[:, :] out,
     int h, int w,
-    double str_value
+    int32_t str_q16
 ) noexcept nogil:
     cdef int y, x, coeff_idx, actual_x
-    cdef int32_t old_value, new_value
-    cdef double error
+    cdef int32_t old_value, new_value, error
     cdef int32_t THRESHOLD = 32768
     cdef bint reverse
+    cdef int32_t* e0
+    cdef int32_t* e1
 
     for y in range(h):
         reverse = (y % 2 == 0)
+        e0 = _ring_row(ring, y)
+        e1 = _ring_row(ring, y + 1)
         for x in range(w):
             actual_x = (w - 1 - x) if reverse else x
-            old_value = img[y, actual_x]
+            old_value = src[y, actual_x] + e0[actual_x]
             coeff_idx = old_value >> 8
             if coeff_idx < 0:
                 coeff_idx = 0
@@ -36,20 +54,16 @@ cdef void _ostromoukhov_s_core(
                 coeff_idx = 255
             if old_value >= THRESHOLD:
                 new_value = 65535
-                out[y, actual_x] = 1
+                _bit_set(out, y, actual_x)
             else:
                 new_value = 0
-                out[y, actual_x] = 0
-            error = (old_value - new_value) * str_value
+            error = _q16_mul(old_value - new_value, str_q16)
+            # the ring is padded, so no checks are needed
             if not reverse:
-                if actual_x + 1 < w:
-                    img[y, actual_x + 1] += <int32_t>(error * coeff_array[coeff_idx, 0])
-                if actual_x - 1 >= 0 and y + 1 < h:
-                    img[y + 1, actual_x - 1] += <int32_t>(error * coeff_array[coeff_idx, 1])
+                e0[actual_x + 1] += _q16_mul(error, coeff_array[coeff_idx, 0])
+                e1[actual_x - 1] += _q16_mul(error, coeff_array[coeff_idx, 1])
             else:
-                if actual_x - 1 >= 0:
-                    img[y, actual_x - 1] += <int32_t>(error * coeff_array[coeff_idx, 0])
-                if actual_x + 1 < w and y + 1 < h:
-                    img[y + 1, actual_x + 1] += <int32_t>(error * coeff_array[coeff_idx, 1])
-            if y + 1 < h:
-                img[y + 1, actual_x] += <int32_t>(error * coeff_array[coeff_idx, 2])
+                e0[actual_x - 1] += _q16_mul(error, coeff_array[coeff_idx, 0])
+                e1[actual_x + 1] += _q16_mul(error, coeff_array[coeff_idx, 1])
+            e1[actual_x] += _q16_mul(error, coeff_array[coeff_idx, 2])
+        _ring_clear(ring, y)
@@ -0,0 +1,57 @@
+# ring.pxi
+# The error diffusions used to promote the whole image to int32 and add the
+# error straight into it, which costs 4 bytes per pixel on top of the input and
+# the output. Instead only the error is kept, in a ring of as many rows as the
+# kernel reaches down (plus one per extra thread for the wavefront scans). The
+# value of a pixel is then its input plus its error.
+# Every row of the ring is padded on both sides, so taps past the left or right
+# edge land in the padding instead of needing a bounds check, and taps past the
+# bottom land in rows nobody reads. A row is zeroed once it's done, to be reused
+# for the row `rows` further down.
+
+from libc.stdint cimport int32_t
+from libc.string cimport memset
+
+cdef struct ring_t:
+    int32_t* data
+    int rows
+    int stride
+    int pad
+
+
+cdef inline int _ring_rows(int below, int threads) noexcept nogil:
+    # the rows a kernel reaching `below` rows down needs. on the wavefront
+    # scan the row `threads` further down only starts after the current one
+    # is done, as it runs on the same thread.
+    if threads < 1:
+        threads = 1
+    return below + threads
+
+
+def _ring_buffer(int rows, int w, int pad):
+    return np.zeros((rows, w + 2 * pad), dtype=np.int32)
+
+
+cdef inline ring_t _ring(int32_t[:, ::1] buf, int pad) noexcept nogil:
+    cdef ring_t ring
+    ring.data = &buf[0, 0]
+    ring.rows = buf.shape[0]
+    ring.stride = buf.shape[1]
+    ring.pad = pad
+    return ring
+
+
+cdef inline int32_t* _ring_row(ring_t* ring, int y) noexcept nogil:
+    # the error of row y, indexed by x. stays valid from -pad to w + pad.
+    return ring.data + (y % ring.rows) * ring.stride + ring.pad
+
+
+cdef inline void _ring_clear(ring_t* ring, int y) noexcept nogil:
+    memset(ring.data + (y % ring.rows) * ring.stride, 0, ring.stride * sizeof(int32_t))
+
+
+def _ring_skip(err, int n):
+    # after n rows were diffused into a ring, e.g. rows of noise used for
+    # priming, moves the rows still to be read to the start. the next scan
+    # can then begin at row 0 as if it came right after them.
+    err[...] = np.roll(err, -(n % err.shape[0]), axis=0)
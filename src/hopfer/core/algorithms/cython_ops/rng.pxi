@@ -0,0 +1,21 @@
+# rng.pxi
+# Random numbers for the parallel loops. A generator with a state would either
+# be shared between the threads (libc rand() is, behind a lock) or give a
+# different image for every thread count. Instead the number of a pixel is a
+# hash of the seed and its coordinates, so every pixel can get its own without
+# any state, in any order.
+
+from libc.stdint cimport uint32_t, uint64_t
+
+cdef inline uint32_t _rng_at(uint64_t seed, uint32_t y, uint32_t x) noexcept nogil:
+    # one step of the pcg32 in noise_gen.pxi from the coordinates, with the
+    # seed as the increment, then the rxs-m-xs output permutation of pcg64.
+    # good enough for dithering and about 2 ns.
+    cdef uint64_t state = ((<uint64_t>y << 32) | x) * <uint64_t>6364136223846793005 + (seed << 1 | 1)
+    cdef uint64_t word = ((state >> ((state >> 59) + 5)) ^ state) * <uint64_t>12605985483714917081
+    return <uint32_t>(((word >> 43) ^ word) >> 32)
+
+
+cdef inline int _rng_range(uint64_t seed, uint32_t y, uint32_t x, int amplitude) noexcept nogil:
+    # uniform in [-amplitude, amplitude], without a modulo
+    return <int>((<uint64_t>_rng_at(seed, y, x) * (2 * amplitude + 1)) >> 32) - amplitude
@@ -0,0 +1,139 @@
+# seam.pxi
+# Where two bands of tiled.py meet, the lower one starts a dot pattern of its
+# own, which doesn't line up with the one above. No error can be handed over
+# without running the bands one after the other, so the rows around the seam
+# are touched up afterwards instead, by direct binary search (Analoui &
+# Allebach, "Model-based halftoning using direct binary search", 1992).
+# The eye is modelled as a gaussian of sigma. Flipping a pixel, or swapping it
+# with a neighbour of the other value, changes the squared error between the
+# halftone and the image as seen through it by
+#   (a0² + a1²) cpp(0) + 2 a0 a1 cpp(q - p) + 2 a0 cpe(p) + 2 a1 cpe(q)
+# with a0, a1 the changes of p and q, cpp the gaussian correlated with itself,
+# a gaussian of sigma √2, and cpe the error correlated with cpp. Every change
+# that lowers it is made right away and cpe is updated around it, until a pass
+# over the rows doesn't find any. All but a few are found in the first 3.
+
+from libc.math cimport ceil, exp, sqrt
+from libc.stdint cimport uint8_t, uint16_t
+
+# the neighbours a pixel may swap with
+cdef int[8] _SEAM_DY = [-1, -1, -1, 0, 0, 1, 1, 1]
+cdef int[8] _SEAM_DX = [-1, 0, 1, -1, 1, -1, 0, 1]
+
+
+def repair_seam(uint8_t[:, :] bits, const uint16_t[:, :] img, int y, int rows=4, double sigma=2.0, int passes=3):
+    """
+    Touches up the packed halftone `bits` of img, in place, in the rows from
+    y - rows to y + rows, see above. sigma is about the size a dot is seen
+    at. Returns the number of changes made.
+    """
+    cdef int h = img.shape[0]
+    cdef int w = img.shape[1]
+    if bits.shape[0] != h or bits.shape[1] < (w + 7) >> 3:
+        raise ValueError("bits has to be the packed halftone of img")
+    cdef int y0 = max(0, y - rows)
+    cdef int y1 = min(h, y + rows)
+    if y0 >= y1 or w == 0:
+        return 0
+
+    # cpe of the rows that change needs the error this far around them
+    cdef int reach = <int>ceil(3 * sigma * sqrt(2))
+    cdef int top = max(0, y0 - reach)
+    cdef int n = min(h, y1 + reach) - top
+    cdef int lo = y0 - top
+    cdef int hi = y1 - top
+
+    g_arr = np.empty(2 * reach + 1, dtype=np.float64)
+    cdef double[::1] g = g_arr
+    cdef uint8_t[:, ::1] px = np.empty((n, w), dtype=np.uint8)
+    cdef double[:, ::1] err = np.empty((n, w), dtype=np.float64)
+    cdef double[:, ::1] rowc = np.empty((n, w), dtype=np.float64)
+    cdef double[:, ::1] cpe = np.empty((n, w), dtype=np.float64)
+
+    cdef int r, x, d, rr, xx, k, best_k, p, changes = 0
+    cdef double acc, a0, delta, best
+    cdef double cpp0 = 1.0
+
+    with nogil:
+        # cpp is separable, g(dy) * g(dx)
+        for d in range(-reach, reach + 1):
+            g[d + reach] = exp(-d * d / (4 * sigma * sigma))
+
+        for r in range(n):
+            for x in range(w):
+                px[r, x] = _bit_get(bits, top + r, x)
+                err[r, x] = px[r, x] - img[top + r, x] / 65535.0
+
+        # cpe, along the rows and then down the columns. past the edges
+        # there's no error.
+        for r in range(n):
+            for x in range(w):
+                acc = 0
+                for d in range(max(-reach, -x), min(reach, w - 1 - x) + 1):
+                    acc = acc + g[d + reach] * err[r, x + d]
+                rowc[r, x] = acc
+        for r in range(n):
+            for x in range(w):
+                acc = 0
+                for d in range(max(-reach, -r), min(reach, n - 1 - r) + 1):
+                    acc = acc + g[d + reach] * rowc[r + d, x]
+                cpe[r, x] = acc
+
+        for p in range(passes):
+            k = changes
+            for r in range(lo, hi):
+                for x in range(w):
+                    # white goes dark, dark goes white
+                    a0 = 1 - 2 * px[r, x]
+                    best = cpp0 + 2 * a0 * cpe[r, x]
+                    best_k = -1
+                    for d in range(8):
+                        rr = r + _SEAM_DY[d]
+                        xx = x + _SEAM_DX[d]
+                        if rr < lo or rr >= hi or xx < 0 or xx >= w:
+                            continue
+                        if px[rr, xx] == px[r, x]:
+                            continue
+                        # a1 = -a0
+                        delta = (
+                            2 * cpp0
+                            - 2 * g[_SEAM_DY[d] + reach] * g[_SEAM_DX[d] + reach]
+                            + 2 * a0 * (cpe[r, x] - cpe[rr, xx])
+                        )
+                        if delta < best:
+                            best = delta
+                            best_k = d
+                    # below 0 by more than rounding
+                    if best >= -1e-9:
+                        continue
+                    _seam_flip(px, cpe, g, reach, r, x, a0)
+                    if best_k >= 0:
+                        _seam_flip(
+                            px, cpe, g, reach,
+                            r + _SEAM_DY[best_k], x + _SEAM_DX[best_k], -a0,
+                        )
+                    changes += 1
+            if changes == k:
+                break
+
+        for r in range(lo, hi):
+            for x in range(w):
+                if px[r, x]:
+                    _bit_set(bits, top + r, x)
+                else:
+                    bits[top + r, x >> 3] &= <uint8_t>~(0x80 >> (x & 7))
+
+    return changes
+
+
+cdef inline void _seam_flip(uint8_t[:, ::1] px, double[:, ::1] cpe, double[::1] g, int reach, int r, int x, double a) noexcept nogil:
+    # flips a pixel and adds a times cpp around it to cpe
+    cdef int n = px.shape[0]
+    cdef int w = px.shape[1]
+    cdef int rr, xx
+    cdef double gy
+    px[r, x] ^= 1
+    for rr in range(max(0, r - reach), min(n, r + reach + 1)):
+        gy = a * g[rr - r + reach]
+        for xx in range(max(0, x - reach), min(w, x + reach + 1)):
+            cpe[rr, xx] += gy * g[xx - x + reach]
@@ -2,62 +2,113 @@
 
 from libc.stdint cimport int32_t, uint8_t, uint16_t, uint32_t
 
-def sierra24a(img, float diffusion_factor=1.0, bint serpentine=True):
+def sierra24a(img, float diffusion_factor=1.0, bint serpentine=True, int threads=0, prime=None):
     cdef int h = img.shape[0]
     cdef int w = img.shape[1]
 
-    out = np.zeros((h, w), dtype=np.uint8)
-
-    # signed int32 buffer for errors
-    cdef int32_t[:, :] work_buf = np.array(img, dtype=np.int32)
-
-    _sierra24a_core(work_buf, out, h, w, diffusion_factor, serpentine)
+    out = _bits_zeros(h, w)
+
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img, dtype=np.uint16)
+    cdef uint8_t[:, :] out_buf = out
+    threads = 1 if serpentine else _wf_threads(h, w, threads)
+
+    # signed int32 ring for the errors, see ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(1, threads), w, 1)
+    cdef ring_t ring = _ring(err, 1)
+
+    # priming, see ed
+    cdef const uint16_t[:, ::1] noise
+    cdef uint8_t[:, :] scratch
+    if prime is not None:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        scratch = _bits_zeros(noise.shape[0], w)
+        with nogil:
+            _sierra24a_core(noise, &ring, scratch, noise.shape[0], w, diffusion_factor, serpentine)
+        _ring_skip(err, noise.shape[0])
+
+    with nogil:
+        if threads > 1:
+            _sierra24a_wavefront(src, &ring, out_buf, h, w, diffusion_factor, threads)
+        else:
+            _sierra24a_core(src, &ring, out_buf, h, w, diffusion_factor, serpentine)
 
-    return out.view(np.bool_)
+    return out
 
-cdef void _sierra24a_core(int32_t[:, :] img, uint8_t[:, :] out, int h, int w, float str_val, bint serpentine) noexcept nogil:
+cdef void _sierra24a_core(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int h, int w, float str_val, bint serpentine) noexcept nogil:
     cdef int y, x
     cdef int32_t old_val, new_val, error
     cdef int32_t threshold = 32768
+    cdef int32_t* e0
+    cdef int32_t* e1
 
     for y in range(h):
         if serpentine and (y % 2 == 0):
+            e0 = _ring_row(ring, y)
+            e1 = _ring_row(ring, y + 1)
             for x in range(w - 1, -1, -1):
-                old_val = img[y, x]
+                old_val = src[y, x] + e0[x]
                 if old_val >= threshold:
                     new_val = 65535
-                    out[y, x] = 1
+                    _bit_set(out, y, x)
                 else:
                     new_val = 0
-                    out[y, x] = 0
 
                 error = <int32_t>((old_val - new_val) * str_val)
 
-                if x - 1 >= 0: # left
-                    img[y, x - 1] += (error >> 1)
-
-                if y + 1 < h: # down
-                    img[y + 1, x] += (error >> 2)
-                    if x + 1 < w: # down right
-                        img[y + 1, x + 1] += (error >> 2)
+                # the ring is padded, so none of these need checks
+                e0[x - 1] += (error >> 1) # left
+                e1[x] += (error >> 2) # down
+                e1[x + 1] += (error >> 2) # down right
 
         else:
-            for x in range(w):
-                old_val = img[y, x]
-                if old_val >= threshold:
-                    new_val = 65535
-                    out[y, x] = 1
-                else:
-                    new_val = 0
-                    out[y, x] = 0
-
-                error = <int32_t>((old_val - new_val) * str_val)
-
+            _sierra24a_span(src, ring, out, y, 0, w, str_val)
+        _ring_clear(ring, y)
+
+cdef void _sierra24a_wavefront(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int h, int w, float str_val, int threads) noexcept nogil:
+    # raster only, see wavefront.pxi
+    cdef int y, x0, x1, need
+    cdef int* progress = _wf_progress(h)
+
+    if progress == NULL:
+        _sierra24a_core(src, ring, out, h, w, str_val, False)
+        return
+
+    for y in prange(h, schedule='static', chunksize=1, num_threads=threads):
+        x0 = 0
+        while x0 < w:
+            x1 = x0 + WF_CHUNK
+            if x1 > w:
+                x1 = w
+            need = x1 + 3
+            if need > w:
+                need = w
+            _wf_wait(progress, y, need)
+            _sierra24a_span(src, ring, out, y, x0, x1, str_val)
+            if x1 == w:
+                _ring_clear(ring, y)
+            _wf_done(progress, y, x1)
+            x0 = x1
+
+    free(progress)
+
+cdef void _sierra24a_span(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_val) noexcept nogil:
+    # the left to right scan of the pixels x0 to x1 of a single row
+    cdef int x
+    cdef int32_t old_val, new_val, error
+    cdef int32_t threshold = 32768
+    cdef int32_t* e0 = _ring_row(ring, y)
+    cdef int32_t* e1 = _ring_row(ring, y + 1)
+
+    for x in range(x0, x1):
+        old_val = src[y, x] + e0[x]
+        if old_val >= threshold:
+            new_val = 65535
+            _bit_set(out, y, x)
+        else:
+            new_val = 0
 
-                if x + 1 < w: # right
-                    img[y, x + 1] += (error >> 1)
+        error = <int32_t>((old_val - new_val) * str_val)
 
-                if y + 1 < h: # down
-                    img[y + 1, x] += (error >> 2)
-                    if x - 1 >= 0: # down left
-                        img[y + 1, x - 1] += (error >> 2)
+        e0[x + 1] += (error >> 1) # right
+        e1[x] += (error >> 2) # down
+        e1[x - 1] += (error >> 2) # down left
@@ -0,0 +1,155 @@
+# stack_blur.pxi
+# cv2.stackBlur for uint16 in integers, in place. cv2's own overflows from a
+# ksize of 25 on, so it used to run on a float32 copy of the image.
+# A stack blur weighs the pixels of a window like a tent, 1, 2, .. r + 1, ..
+# 2, 1, which is the sum of 2r + 1 pixels times the sum of the ones coming in
+# minus the ones going out. Moving a pixel on takes 3 running sums, whatever
+# the size. The weights add up to (r + 1)², which keeps every sum below 2^31
+# up to a ksize of 255.
+# Rows first, in parallel, then columns in strips, in parallel again. Every
+# line is copied out first with its edges replicated, so it can be written
+# to while it's read and the sums never run past it. Both passes round to
+# uint16, which is at most 1 off a single rounding at the end.
+
+from libc.stdint cimport int32_t, uint16_t
+from libc.string cimport memcpy
+cimport openmp
+
+# the columns the vertical pass takes at once, one running sum each
+STACK_BLUR_STRIP = 64
+
+
+def stack_blur(img, int ksize):
+    """
+    Blurs a uint16 image with a ksize x ksize stack blur in place and returns
+    it. ksize is odd and at most 255, the edges are replicated.
+    """
+    if ksize < 1 or ksize % 2 == 0 or ksize > 255:
+        raise ValueError("ksize has to be odd and at most 255")
+    if img.dtype != np.uint16:
+        raise ValueError("stack_blur supports uint16")
+    # a rotated or flipped view is blurred as a copy and written back, like
+    # apply_lut does
+    target = img
+    if not img.flags.c_contiguous:
+        img = np.ascontiguousarray(img)
+    cdef int h = img.shape[0]
+    cdef int w = img.shape[1]
+    if h == 0 or w == 0 or ksize == 1:
+        return target
+
+    cdef int r = ksize // 2
+    cdef int strip = STACK_BLUR_STRIP
+    cdef int strips = (w + strip - 1) // strip
+    cdef int bands = openmp.omp_get_max_threads()
+    if bands > max(h, strips):
+        bands = max(h, strips)
+    if bands < 1:
+        bands = 1
+
+    # a padded line for every thread in the horizontal pass, a padded strip
+    # in the vertical one
+    lines = np.empty((bands, w + 2 * r + 3), dtype=np.uint16)
+    blocks = np.empty((bands, (h + 2 * r + 3) * strip), dtype=np.uint16)
+    sums = np.empty((bands, 3 * strip), dtype=np.int32)
+    cdef uint16_t[:, ::1] img_buf = img
+    cdef uint16_t[:, ::1] lines_buf = lines
+    cdef uint16_t[:, ::1] blocks_buf = blocks
+    cdef int32_t[:, ::1] sums_buf = sums
+    with nogil:
+        _stack_blur_core(img_buf, lines_buf, blocks_buf, sums_buf, r, strip, bands)
+    if img is not target:
+        target[...] = img
+    return target
+
+
+cdef void _stack_blur_core(uint16_t[:, ::1] img, uint16_t[:, ::1] lines, uint16_t[:, ::1] blocks, int32_t[:, ::1] sums, int r, int strip, int bands) noexcept nogil:
+    cdef int h = img.shape[0]
+    cdef int w = img.shape[1]
+    cdef int strips = (w + strip - 1) // strip
+    cdef int b, y, i, s, x0, lanes, row
+    cdef uint16_t* line
+    cdef uint16_t* block
+    cdef uint16_t* src
+
+    # the rows, a band of them per thread
+    for b in prange(bands, schedule='static', chunksize=1):
+        line = &lines[b, 0]
+        for y in range(h * b // bands, h * (b + 1) // bands):
+            src = &img[y, 0]
+            for i in range(r + 1):
+                line[i] = src[0]
+                line[r + 1 + w + i] = src[w - 1]
+            line[w + 2 * r + 2] = src[w - 1]
+            memcpy(line + r + 1, src, w * sizeof(uint16_t))
+            _stack_blur_line(line, 1, src, 1, w, r, &sums[b, 0])
+
+    # the columns, every bands-th strip per thread
+    for b in prange(bands, schedule='static', chunksize=1):
+        block = &blocks[b, 0]
+        s = b
+        while s < strips:
+            x0 = s * strip
+            lanes = w - x0
+            if lanes > strip:
+                lanes = strip
+            for i in range(h + 2 * r + 3):
+                row = i - r - 1
+                if row < 0:
+                    row = 0
+                if row > h - 1:
+                    row = h - 1
+                memcpy(block + i * lanes, &img[row, x0], lanes * sizeof(uint16_t))
+            _stack_blur_line(block, lanes, &img[0, x0], w, h, r, &sums[b, 0])
+            s = s + bands
+
+
+cdef void _stack_blur_line(const uint16_t* src, int lanes, uint16_t* dst, Py_ssize_t step, int n, int r, int32_t* sums) noexcept nogil:
+    # blurs lanes lines of n pixels at once. src holds them interleaved and
+    # padded by r + 1 in front and r + 2 behind, pixel i of lane l goes to
+    # dst[i * step + l].
+    cdef int32_t* total = sums
+    cdef int32_t* ins = sums + lanes
+    cdef int32_t* outs = sums + 2 * lanes
+    cdef const uint16_t* p = src + (r + 1) * lanes
+    cdef const uint16_t* p_in
+    cdef const uint16_t* p_mid
+    cdef const uint16_t* p_out
+    cdef uint16_t* d
+    cdef int32_t half = ((r + 1) * (r + 1)) // 2
+    # the rounding of a division by (r + 1)², exact as the quotients are
+    # never closer than 1 / (r + 1)² to the next whole number
+    cdef double inv = 1.0 / ((r + 1) * (r + 1))
+    cdef int i, j, l, weight
+
+    for l in range(lanes):
+        total[l] = 0
+        ins[l] = 0
+        outs[l] = 0
+    # the window around the first pixel, the left half going out next, the
+    # right half coming in
+    for j in range(-r, r + 1):
+        weight = r + 1 - (j if j > 0 else -j)
+        p_mid = p + j * lanes
+        for l in range(lanes):
+            total[l] += weight * p_mid[l]
+            if j <= 0:
+                outs[l] += p_mid[l]
+    p_in = p + (r + 1) * lanes
+    for l in range(lanes):
+        ins[l] += p_in[l]
+    for j in range(1, r + 1):
+        p_mid = p + j * lanes
+        for l in range(lanes):
+            ins[l] += p_mid[l]
+
+    for i in range(n):
+        d = dst + i * step
+        p_mid = p + (i + 1) * lanes
+        p_out = p + (i - r) * lanes
+        p_in = p + (i + r + 2) * lanes
+        for l in range(lanes):
+            d[l] = <uint16_t>((total[l] + half) * inv + 1e-6)
+            total[l] += ins[l] - outs[l]
+            outs[l] += p_mid[l] - p_out[l]
+            ins[l] += p_in[l] - p_mid[l]
@@ -23,3 +23,31 @@ def style_image(uint8_t[:, :] img, uint8_t[:] black, uint8_t[:] white):
                 out[y, x, 2] = b2
 
     return np.asarray(out)
+
+
+def style_bits(const uint8_t[:, :] bits, int width, uint8_t[:] black, uint8_t[:] white):
+    # same as style_image, but reads the packed halftones. see bits.pxi
+    cdef int h = bits.shape[0]
+
+    cdef uint8_t[:, :, ::1] out = np.empty((h, width, 3), dtype=np.uint8)
+
+    cdef uint8_t b0 = black[0], b1 = black[1], b2 = black[2]
+    # the difference is xored in for the white pixels, so there is no branch
+    cdef uint8_t d0 = b0 ^ white[0], d1 = b1 ^ white[1], d2 = b2 ^ white[2]
+
+    cdef int y, x
+    cdef uint8_t byte = 0, mask
+    cdef uint8_t* px
+
+    for y in prange(h, schedule='static', nogil=True):
+        px = &out[y, 0, 0]
+        for x in range(width):
+            if x & 7 == 0:
+                byte = bits[y, x >> 3]
+            mask = <uint8_t>(-((byte >> (7 - (x & 7))) & 1))
+            px[0] = b0 ^ (d0 & mask)
+            px[1] = b1 ^ (d1 & mask)
+            px[2] = b2 ^ (d2 & mask)
+            px = px + 3
+
+    return np.asarray(out)
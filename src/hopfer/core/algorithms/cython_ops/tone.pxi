@@ -0,0 +1,120 @@
+# tone.pxi
+# The two passes of the tone curve of tone.py: the histogram it's built from
+# and the lut it comes out as.
+from libc.stdint cimport uint8_t, uint16_t, uint32_t
+cimport openmp
+
+def histogram(img):
+    """
+    The histogram of a uint8 or uint16 image, 256 or 65536 uint32 counts.
+    """
+    cdef int h = img.shape[0]
+    cdef int w = img.shape[1]
+    cdef int bins = 256 if img.dtype == np.uint8 else 65536
+    # every thread counts a band of rows into histograms of its own, they're
+    # summed up after. no atomics and nothing shared while counting.
+    cdef int bands = openmp.omp_get_max_threads()
+    if bands > h:
+        bands = h
+    if bands < 1:
+        bands = 1
+    # and 4 of them per band, one for every 4th pixel. a run of the same level
+    # then doesn't wait on the count it just wrote.
+    partial = np.zeros((bands, 4, bins), dtype=np.uint32)
+    cdef uint32_t[:, :, ::1] partial_buf = partial
+    cdef const uint8_t[:, ::1] src_u8
+    cdef const uint16_t[:, ::1] src_u16
+    if bins == 256:
+        src_u8 = np.ascontiguousarray(img)
+        with nogil:
+            _histogram_core(src_u8, partial_buf, h, w, bands)
+    else:
+        src_u16 = np.ascontiguousarray(img, dtype=np.uint16)
+        with nogil:
+            _histogram_core(src_u16, partial_buf, h, w, bands)
+    return partial.sum(axis=(0, 1), dtype=np.uint32)
+
+
+cdef void _histogram_core(const pixel_t[:, ::1] img, uint32_t[:, :, ::1] partial, int h, int w, int bands) noexcept nogil:
+    cdef int b, y, x
+    cdef const pixel_t* row
+    cdef uint32_t* h0
+    cdef uint32_t* h1
+    cdef uint32_t* h2
+    cdef uint32_t* h3
+    for b in prange(bands, schedule='static', chunksize=1):
+        h0 = &partial[b, 0, 0]
+        h1 = &partial[b, 1, 0]
+        h2 = &partial[b, 2, 0]
+        h3 = &partial[b, 3, 0]
+        for y in range(h * b // bands, h * (b + 1) // bands):
+            row = &img[y, 0]
+            x = 0
+            while x + 4 <= w:
+                h0[row[x]] += 1
+                h1[row[x + 1]] += 1
+                h2[row[x + 2]] += 1
+                h3[row[x + 3]] += 1
+                x = x + 4
+            while x < w:
+                h0[row[x]] += 1
+                x = x + 1
+
+
+def apply_lut(img, lut):
+    """
+    Maps every pixel of a uint8 or uint16 image through lut, in place. The
+    lut has an entry for every level of the image, in its type.
+    """
+    # the rows are walked as plain pointers, a rotated or flipped view is
+    # mapped as a copy and written back
+    target = img
+    if not img.flags.c_contiguous:
+        img = np.ascontiguousarray(img)
+    cdef int h = img.shape[0]
+    cdef int w = img.shape[1]
+    cdef uint8_t[:, ::1] img_u8
+    cdef uint16_t[:, ::1] img_u16
+    cdef const uint8_t[::1] lut_u8
+    cdef const uint16_t[::1] lut_u16
+    if img.dtype == np.uint8:
+        lut_u8 = np.ascontiguousarray(lut, dtype=np.uint8)
+        if lut_u8.shape[0] != 256:
+            raise ValueError("A uint8 image needs a lut of 256")
+        img_u8 = img
+        with nogil:
+            _apply_lut_core(img_u8, &lut_u8[0], h, w)
+    else:
+        lut_u16 = np.ascontiguousarray(lut, dtype=np.uint16)
+        if lut_u16.shape[0] != 65536:
+            raise ValueError("A uint16 image needs a lut of 65536")
+        img_u16 = img
+        with nogil:
+            _apply_lut_core(img_u16, &lut_u16[0], h, w)
+    if img is not target:
+        target[...] = img
+    return target
+
+
+cdef void _apply_lut_core(pixel_t[:, ::1] img, const pixel_t* lut, int h, int w) noexcept nogil:
+    cdef int y, x
+    cdef pixel_t* row
+    cdef pixel_t p0, p1, p2, p3
+    for y in prange(h, schedule='static'):
+        row = &img[y, 0]
+        x = 0
+        # all 4 read before any is written, a uint8 write could be to the lut
+        # as far as the compiler knows, which would reload it every pixel
+        while x + 4 <= w:
+            p0 = lut[row[x]]
+            p1 = lut[row[x + 1]]
+            p2 = lut[row[x + 2]]
+            p3 = lut[row[x + 3]]
+            row[x] = p0
+            row[x + 1] = p1
+            row[x + 2] = p2
+            row[x + 3] = p3
+            x = x + 4
+        while x < w:
+            row[x] = lut[row[x]]
+            x = x + 1
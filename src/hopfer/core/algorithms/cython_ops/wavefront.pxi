@@ -0,0 +1,94 @@
+# wavefront.pxi
+# Helpers for running a raster error diffusion on several threads at once.
+# Every row is handed to a thread and publishes how far it got in a progress
+# counter. A row only works on a chunk of pixels once the row above is at
+# least a kernel width past that chunk, so all of the error has already
+# arrived and no two threads ever add to the same pixel at the same time.
+# As long as each row is processed by the same row function as in the serial
+# scan, the output is bit-identical to it.
+# Serpentine scans can't be done this way: a reversed row starts right where
+# the row above ended, so they always stay on a single thread.
+
+cimport openmp
+from libc.stdlib cimport calloc, free
+
+cdef extern from *:
+    """
+    #if defined(_MSC_VER)
+    #define WIN32_LEAN_AND_MEAN
+    #include <windows.h>
+    static int _wf_load(int *p) {
+        return (int)_InterlockedCompareExchange((volatile long *)p, 0, 0);
+    }
+    static void _wf_store(int *p, int v) {
+        _InterlockedExchange((volatile long *)p, (long)v);
+    }
+    static void _wf_pause(void) { YieldProcessor(); }
+    static void _wf_yield(void) { SwitchToThread(); }
+    #else
+    #include <sched.h>
+    static int _wf_load(int *p) { return __atomic_load_n(p, __ATOMIC_ACQUIRE); }
+    static void _wf_store(int *p, int v) {
+        __atomic_store_n(p, v, __ATOMIC_RELEASE);
+    }
+    static void _wf_pause(void) {
+    #if defined(__x86_64__) || defined(__i386__)
+        __builtin_ia32_pause();
+    #elif defined(__aarch64__)
+        __asm__ __volatile__("yield");
+    #endif
+    }
+    static void _wf_yield(void) { sched_yield(); }
+    #endif
+    """
+    int _wf_load(int *p) noexcept nogil
+    void _wf_store(int *p, int v) noexcept nogil
+    void _wf_pause() noexcept nogil
+    void _wf_yield() noexcept nogil
+
+# pixels processed between two updates of the progress counter. smaller chunks
+# keep the threads closer together but touch the shared counter more often.
+cdef int WF_CHUNK = 64
+# below this the threads spend more time waiting than working
+cdef long long WF_MIN_PIXELS = 1 << 18
+# spins before a waiting thread gives up its core, helps when there are more
+# threads than cores
+cdef int WF_SPINS = 1024
+
+
+cdef int _wf_threads(int h, int w, int threads) noexcept nogil:
+    """
+    Returns the number of threads to use for a wavefront scan, 1 means the
+    serial scan should be used instead. A thread count of 0 or less picks one
+    based on OpenMP and the size of the image.
+    """
+    if threads <= 0:
+        threads = openmp.omp_get_max_threads()
+        if <long long>h * w < WF_MIN_PIXELS:
+            return 1
+    if threads < 2 or h < 2:
+        return 1
+    if threads > h:
+        threads = h
+    return threads
+
+
+cdef inline int* _wf_progress(int h) noexcept nogil:
+    return <int*>calloc(h, sizeof(int))
+
+
+cdef inline void _wf_wait(int* progress, int y, int need) noexcept nogil:
+    # waits until the row above has processed at least `need` pixels
+    cdef int spins = 0
+    if y == 0:
+        return
+    while _wf_load(&progress[y - 1]) < need:
+        if spins < WF_SPINS:
+            spins += 1
+            _wf_pause()
+        else:
+            _wf_yield()
+
+
+cdef inline void _wf_done(int* progress, int y, int x) noexcept nogil:
+    _wf_store(&progress[y], x)
@@ -1,40 +1,58 @@
 # zhou_fang_s.pxi
-from libc.stdint cimport int32_t, uint8_t, uint16_t, uint32_t, uint64_t
+from libc.stdint cimport int32_t, int64_t, uint8_t, uint16_t, uint32_t, uint64_t
 
-def zhou_fang_fast_s(img_u16, coeff_array, pert_array, double str_value):
+def zhou_fang_fast_s(img_u16, coeff_q16, pert_q16, double str_value, prime=None):
     cdef int h = img_u16.shape[0]
     cdef int w = img_u16.shape[1]
-    out = np.zeros((h, w), dtype=np.uint8)
-    cdef int32_t[:, :] img = np.array(img_u16, dtype=np.int32)
-    cdef double[:] pert_buf = np.array(pert_array, dtype=np.float64)
-    cdef double[:] c0_table = np.array(coeff_array[:, 0], dtype=np.float64)
-    cdef double[:] c1_table = np.array(coeff_array[:, 1], dtype=np.float64)
-    cdef double[:] c2_table = np.array(coeff_array[:, 2], dtype=np.float64)
-    _zhou_fang_s_core(img, pert_buf, c0_table, c1_table, c2_table, out, h, w, str_value)
-    return out.view(np.bool_)
+    out = _bits_zeros(h, w)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    cdef const int32_t[:] pert_buf = np.ascontiguousarray(pert_q16, dtype=np.int32)
+    cdef const int32_t[:, ::1] coeff_buf = np.ascontiguousarray(coeff_q16, dtype=np.int32)
+    cdef int32_t str_q16 = _q16(str_value)
+    cdef uint8_t[:, :] out_buf = out
+    # int32 ring for the error, see ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(1, 1), w, 1)
+    cdef ring_t ring = _ring(err, 1)
+    cdef uint64_t mcg_state = <uint64_t>0xCAFEF00DD15EA5E5
+    # priming, see ed. the generator carries on from where the priming
+    # rows left it.
+    cdef const uint16_t[:, ::1] noise
+    cdef uint8_t[:, :] scratch
+    if prime is not None:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        scratch = _bits_zeros(noise.shape[0], w)
+        with nogil:
+            _zhou_fang_s_core(noise, &ring, pert_buf, coeff_buf, str_q16, scratch, noise.shape[0], w, &mcg_state)
+        _ring_skip(err, noise.shape[0])
+    with nogil:
+        _zhou_fang_s_core(src, &ring, pert_buf, coeff_buf, str_q16, out_buf, h, w, &mcg_state)
+    return out
 
 cdef void _zhou_fang_s_core(
-    int32_t[:, :] img,
-    double[:] pert_array,
-    double[:] c0_table,
-    double[:] c1_table,
-    double[:] c2_table,
+    const uint16_t[:, ::1] src,
+    ring_t* ring,
+    const int32_t[:] pert_array,
+    const int32_t[:, ::1] coeff,
+    int32_t str_q16,
     uint8_t[:, :] out,
     int h, int w,
-    double str_value
+    uint64_t* state
 ) noexcept nogil:
     cdef int y, x, coeff_idx
-    cdef int32_t old_value, new_value, e_int, pert_mod
+    cdef int32_t old_value, new_value, error, pert_mod
     cdef int32_t THRESHOLD = 32768
-    cdef uint64_t mcg_state = <uint64_t>0xCAFEF00DD15EA5E5
+    cdef uint64_t mcg_state = state[0]
     cdef uint64_t MULT = <uint64_t>6364136223846793005
     cdef uint64_t x_bits
     cdef uint32_t count, rng_val_u32, pert
-    cdef double c0, c1, c2, error
     cdef bint reverse
+    cdef int32_t* e0
+    cdef int32_t* e1
 
     for y in range(h):
         reverse = (y & 1) == 0
+        e0 = _ring_row(ring, y)
+        e1 = _ring_row(ring, y + 1)
         for x in range(w):
             # Generate a random float using pcg32_fast (https://en.wikipedia.org/wiki/Permuted_congruential_generator)
             # This seems to be almost twice as fast as numpy's random module and produces noise that to me looks just as nice.
@@ -49,34 +67,28 @@ cdef void _zhou_fang_s_core(
             pert = rng_val_u32 >> 17
             # map logical x to actual column depending on scan direction
             x = x if not reverse else (w - 1 - x)
-            old_value = img[y, x]
+            old_value = src[y, x] + e0[x]
             coeff_idx = old_value >> 8
             if coeff_idx < 0:
                 coeff_idx = 0
             elif coeff_idx > 255:
                 coeff_idx = 255
-            pert_mod = <int32_t>(pert * pert_array[coeff_idx])
+            pert_mod = <int32_t>((<int64_t>pert * pert_array[coeff_idx]) >> 16)
             if (old_value + pert_mod) >= THRESHOLD:
                 new_value = 65535
-                out[y, x] = 1
+                _bit_set(out, y, x)
             else:
                 new_value = 0
-                out[y, x] = 0
-            error = (old_value - new_value) * str_value
-            e_int = <int32_t>error
-            c0 = c0_table[coeff_idx]
-            c1 = c1_table[coeff_idx]
-            c2 = c2_table[coeff_idx]
+            error = _q16_mul(old_value - new_value, str_q16)
+            # the ring is padded, so no checks are needed
             if not reverse:
-                if x + 1 < w:
-                    img[y, x + 1] += <int32_t>(e_int * c0)
-                if x - 1 >= 0 and y + 1 < h:
-                    img[y + 1, x - 1] += <int32_t>(e_int * c1)
+                e0[x + 1] += _q16_mul(error, coeff[coeff_idx, 0])
+                e1[x - 1] += _q16_mul(error, coeff[coeff_idx, 1])
             else:
-                if x - 1 >= 0:
-                    img[y, x - 1] += <int32_t>(e_int * c0)
-                if x + 1 < w and y + 1 < h:
-                    img[y + 1, x + 1] += <int32_t>(e_int * c1)
-            # Vertical always uses c2
-            if y + 1 < h:
-                img[y + 1, x] += <int32_t>(e_int * c2)
+                e0[x - 1] += _q16_mul(error, coeff[coeff_idx, 0])
+                e1[x + 1] += _q16_mul(error, coeff[coeff_idx, 1])
+            # Vertical always uses coefficient 2
+            e1[x] += _q16_mul(error, coeff[coeff_idx, 2])
+        _ring_clear(ring, y)
+
+    state[0] = mcg_state
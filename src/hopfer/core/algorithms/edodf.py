@@ -2,7 +2,10 @@ import logging
 
 import numpy as np
 
-from hopfer.core.algorithms.cython_ops import levien, nakano, noise_gen
+from hopfer.core.algorithms.cython_ops import levien, nakano
+from hopfer.core.packed_bits import PackedBits
+
+from .priming import noise_rows
 
 logger = logging.getLogger(__name__)
 
@@ -12,22 +15,17 @@ def edodf(img, algorithm, settings):
     hysteresis_c = np.float64(settings["hysteresis"])
     serpentine = settings["serpentine"]
     noise = settings["noise"]
-    if noise:
-        noise_array = noise_gen(np.uint16(img.shape[1]))
-        img = np.vstack((noise_array, img))
+    prime = noise_rows(img.shape[1]) if noise else None
 
     if algorithm == "Levien":
-        output_img = levien(img, str, hysteresis_c, serpentine)
+        output_img = levien(img, str, hysteresis_c, serpentine, prime)
     elif algorithm == "Nakano":
         logger.debug(
             f"Nakano : {algorithm}, {str}, {hysteresis_c}, {serpentine}"
         )
-        output_img = nakano(img, str, hysteresis_c, serpentine)
+        output_img = nakano(img, str, hysteresis_c, serpentine, prime)
     else:
         # Default to Zhou-Fang serpentine
-        output_img = levien(img, str, hysteresis_c, serpentine)
-
-    if noise:
-        output_img = output_img[20:, :]
+        output_img = levien(img, str, hysteresis_c, serpentine, prime)
 
-    return output_img
+    return PackedBits(output_img, img.shape[1])
@@ -1,6 +1,15 @@
-import numpy as np
+from hopfer.core.algorithms.cython_ops import (
+    ED_KERNELS,
+    ed,
+    ed_kernel,
+    eds,
+    sierra24a,
+)
+from hopfer.core.compiler.kernel_cache import load_kernel
+from hopfer.core.packed_bits import PackedBits
 
-from hopfer.core.algorithms.cython_ops import ed, eds, noise_gen, sierra24a
+from .priming import noise_rows
+from .tiled import tiled_diffusion
 
 
 def error_diffusion(img, kernel, settings, algorithm):
@@ -12,26 +21,47 @@ def error_diffusion(img, kernel, settings, algorithm):
         kernel (np.ndarray): A 2d numpy array with the error diffusion weights.
         settings (dict): Dictionary with the settings.
     Returns:
-        output_img (np.ndarray): The dithered image as a 2d numpy array.
+        output_img (PackedBits): The dithered image.
     """
     str = settings["diffusion_factor"]
     serpentine = settings["serpentine"]
     noise = settings["noise"]
-    if noise:
-        noise_array = noise_gen(np.uint16(img.shape[1]))
-        img = np.vstack((noise_array, img))
-
-    if algorithm != "Sierra2 4A":
-        # a temporary solution until the rest of the ED's get hardcoded
-        # currently only Sierra2 4A is hardcoded as it has a very small kernel and i had a lot of fun doing it.
-        if serpentine:
-            output_img = eds(img, kernel, str)
+    # trades exactness for using all of the cores on large images
+    tiled = settings.get("tiled", False)
+    # the kernels diffuse the noise before the image themselves
+    prime = noise_rows(img.shape[1]) if noise else None
+
+    # the bands of the tiled mode already keep all cores busy
+    threads = 1 if tiled else 0
+
+    # kernels of the user compiled by core/compiler/kernel_cache.py, None
+    # until the daemon got to building them
+    compiled = None
+    if algorithm not in ED_KERNELS and algorithm != "Sierra2 4A":
+        compiled = load_kernel(kernel)
+
+    def diffuse(img, prime=None):
+        if algorithm in ED_KERNELS:
+            # unrolled versions generated by core/compiler/ed_compiler.py
+            kernel_id = ED_KERNELS[algorithm]
+            return ed_kernel(img, kernel_id, str, serpentine, threads, prime)
+        elif algorithm == "Sierra2 4A":
+            # Sierra2 4A is hardcoded as it has a very small kernel and i had a lot of fun doing it.
+            return sierra24a(img, str, serpentine, threads, prime)
+        elif compiled is not None:
+            return compiled.ed_kernel(img, 0, str, serpentine, threads, prime)
+        elif serpentine:
+            # the generic versions are kept for any other kernel
+            return eds(img, kernel, str, prime)
         else:
-            output_img = ed(img, kernel, str)
-    else:
-        output_img = sierra24a(img, str, serpentine)
+            return ed(img, kernel, str, threads, prime)
 
-    if noise:
-        output_img = output_img[20:, :]
+    if tiled:
+        # the dots only average to the image with all of the error diffused
+        output_img = tiled_diffusion(
+            img, diffuse, prime=prime, repair_seams=str == 1
+        )
+    else:
+        output_img = diffuse(img, prime)
 
-    return output_img
+    return PackedBits(output_img, img.shape[1])
@@ -1,31 +1,106 @@
+import math
+from functools import lru_cache
+
 import numpy as np
 
-from hopfer.core.algorithms.cython_ops import compare
+from hopfer.core.algorithms.cython_ops import random_dither
+from hopfer.core.packed_bits import PackedBits
+
+# a pixel used to be white where the noise was below it, so all that matters
+# is the chance of the noise being below every gray level, its cdf. it's
+# worked out once per setting and random_dither draws the numbers on the fly,
+# without any noise ever being stored.
+ONE = 2**32
 
 
 def mezzo(img, settings, mode="uniform"):
     seed = settings["seed"]
-    h, w = img.shape
-    rng = np.random.default_rng(seed)
+    bit_depth = 8 if img.dtype == np.uint8 else 16
 
     if mode == "uniform":
         # the GUI still works in floats, while i've switched to ints internally
         r_min_f, r_max_f = settings["range"]
-        r_min, r_max = int(r_min_f * 255), int(r_max_f * 255)
-        noise = rng.integers(r_min, r_max + 1, (h, w), dtype=np.uint8)
+        params = (int(r_min_f * 255), int(r_max_f * 255))
+
+    elif mode == "gauss":
+        params = (settings["location"], settings["std"])
+
+    elif mode == "beta":
+        params = (settings["alpha"] / 10, settings["beta"] / 10)
+
+    chance = _chances(mode, params, bit_depth)
+    return PackedBits(random_dither(img, chance, seed), img.shape[1])
+
+
+@lru_cache(maxsize=16)
+def _chances(mode, params, bit_depth):
+    # the gray levels as 0 to 1, the noise of the old arrays was always 8 bit
+    x = np.arange(2**bit_depth) / (2**bit_depth - 1)
+
+    if mode == "uniform":
+        # whole numbers from r_min to r_max, below x * 255 are as many as
+        # there are up to the next whole number
+        r_min, r_max = params
+        below = np.clip(np.ceil(x * 255 - 1e-9) - r_min, 0, r_max - r_min + 1)
+        cdf = below / (r_max - r_min + 1)
 
     elif mode == "gauss":
-        loc = settings["location"]
-        std = settings["std"]
-        # TODO: look for a more elegant solution. currently this would do.
-        noise = (np.clip(rng.normal(loc, std, (h, w)), 0, 1) * 255).astype(
-            np.uint8
-        )
+        loc, std = params
+        if std > 0:
+            cdf = np.array([_normal_cdf(v, loc, std) for v in x])
+        else:
+            cdf = (x > loc).astype(np.float64)
+        # clipped to 0 - 1, so nothing is ever below black
+        cdf[0] = 0
 
     elif mode == "beta":
-        alpha = settings["alpha"] / 10
-        beta = settings["beta"] / 10
-        noise = rng.beta(alpha, beta, (h, w))
+        cdf = _beta_cdf(x, *params)
+
+    chance = np.round(np.clip(cdf, 0, 1) * ONE).astype(np.uint64)
+    chance.flags.writeable = False
+    return chance
+
+
+def _normal_cdf(x, loc, std):
+    return 0.5 * (1 + math.erf((x - loc) / (std * math.sqrt(2))))
+
+
+def _beta_cdf(x, a, b):
+    # the regularized incomplete beta function, by its continued fraction
+    # (numerical recipes, 6.4) for all of x at once
+    x = np.asarray(x, dtype=np.float64)
+    cdf = np.where(x >= 1, 1.0, 0.0)
+    inside = (x > 0) & (x < 1)
+    # the fraction converges quickly on the side of the mean, the other side
+    # is 1 minus the mirrored one
+    flip = inside & (x > (a + 1) / (a + b + 2))
+    keep = inside & ~flip
+    cdf[keep] = _beta_front(x[keep], a, b)
+    cdf[flip] = 1 - _beta_front(1 - x[flip], b, a)
+    return cdf
+
+
+def _beta_front(x, a, b, iterations=300):
+    log_beta = math.lgamma(a) + math.lgamma(b) - math.lgamma(a + b)
+    front = np.exp(a * np.log(x) + b * np.log1p(-x) - log_beta) / a
 
-    img = compare(img, noise)
-    return img
+    # the continued fraction with the modified Lentz method
+    tiny = 1e-300
+    c = np.ones_like(x)
+    d = 1 - (a + b) * x / (a + 1)
+    d = 1 / np.where(np.abs(d) < tiny, tiny, d)
+    f = d.copy()
+    for m in range(1, iterations + 1):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ):
+            d = 1 + numerator * d
+            d = 1 / np.where(np.abs(d) < tiny, tiny, d)
+            c = 1 + numerator / c
+            c = np.where(np.abs(c) < tiny, tiny, c)
+            delta = c * d
+            f *= delta
+        if np.all(np.abs(delta - 1) < 1e-12):
+            break
+    return front * f
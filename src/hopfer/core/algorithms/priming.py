@@ -0,0 +1,31 @@
+from functools import lru_cache
+
+import numpy as np
+
+from hopfer.core.algorithms.cython_ops import noise_gen
+
+# the rows of noise the error diffusions are primed with when "noise" is on.
+# they are diffused before the first row of the image and then thrown away,
+# so the error is already settled when the image starts. even, so serpentine
+# scans don't change direction.
+NOISE_ROWS = 20
+
+
+@lru_cache(maxsize=8)
+def noise_rows(width):
+    """The priming rows of the error diffusions, cached per width."""
+    rows = noise_gen(width)
+    # shared between calls, so nobody gets to modify them
+    rows.flags.writeable = False
+    return rows
+
+
+@lru_cache(maxsize=8)
+def ved_noise_rows(width):
+    """Same as noise_rows, but the darker noise the variable EDs expect."""
+    rng = np.random.default_rng(12345)
+    rows = rng.integers(low=0, high=32768, size=(NOISE_ROWS, width)).astype(
+        np.uint16
+    )
+    rows.flags.writeable = False
+    return rows
@@ -0,0 +1,186 @@
+"""
+Clustered dot screens at any angle and frequency.
+
+A screen rotated by an arbitrary angle doesn't tile, so the angle is
+approximated by a rational tangent j / i instead: a square supercell of n x n
+pixels then holds i² + j² whole cells of the screen, each n / sqrt(i² + j²)
+pixels wide. The dots of the cells don't have to fall on whole pixels, which
+is what makes the angle and the frequency accurate, and a supercell has
+i² + j² times the gray levels of a single cell.
+
+Many angles and frequencies round to the same supercell, and they are cached
+in memory and on disk, so moving a slider back and forth never builds one
+twice.
+"""
+
+import math
+from functools import lru_cache
+
+import numpy as np
+
+from hopfer.helpers.array_cache import cached_array
+
+# the largest supercell, in pixels. ordered_dither tiles it to the width of the
+# image, so this also bounds that to a few MB.
+MAX_SUPERCELL = 1024
+# the largest i and j tried for the tangent
+MAX_TANGENT = 16
+# the error a supercell may have before a bigger one is tried, in degrees of
+# the angle plus percent of the period
+TOLERANCE = 0.25
+# part of the key of the cached supercells, bump it whenever supercell()
+# builds a different matrix so the old ones on disk aren't used anymore
+SCREEN_VERSION = 1
+
+
+def dot_period(size):
+    """The period of the screen with dots of the "Dot size" slider."""
+    # the cells of the old 0° matrix were 2 * size wide, with a white and a
+    # black dot each, which is a 45° screen with this period
+    return size * math.sqrt(2)
+
+
+def screen_matrix(period, angle, bit_depth=8):
+    """
+    Returns the threshold matrix of a screen for ordered_dither.
+
+    Args:
+        period (float): The distance between the dots in pixels, DPI / LPI.
+        angle (float): The angle of the screen in degrees.
+        bit_depth (int): 8 or 16.
+    """
+    # the white and the black dots of a cell form a screen that's 45° off
+    # and sqrt(2) as wide, the supercells are built for that one
+    i, j, n = rational_tangent(period * math.sqrt(2), angle - 45)
+    if (i, j) == (1, 0) and n % 2 == 0:
+        # a single cell, which the defaults end up with. supercell() would
+        # spread the levels over both white and both black blocks, the old
+        # matrix gives them the same thresholds, and it's kept bit for bit.
+        return _classic_matrix(n // 2, bit_depth)
+    return _cached_matrix(i, j, n, bit_depth)
+
+
+def rational_tangent(period, angle):
+    """
+    Finds the supercell that comes closest to a screen of cells of `period`
+    pixels at `angle` degrees.
+
+    Returns:
+        tuple: (i, j, n), the tangent j / i and the size of the supercell.
+    """
+    # the screen is the same every 90°
+    angle %= 90
+    period = max(period, 2.0)
+
+    best = None
+    for i, j, n in _candidates(period):
+        cell = math.hypot(i, j)
+        error = abs(math.degrees(math.atan2(j, i)) - angle)
+        error = min(error, 90 - error)
+        error += 100 * abs(n / cell - period) / period
+        if error <= TOLERANCE:
+            # the candidates are sorted by size, nothing smaller comes after
+            return i, j, n
+        if best is None or error < best[0]:
+            best = (error, (i, j, n))
+    return best[1]
+
+
+@lru_cache(maxsize=64)
+def _candidates(period):
+    candidates = []
+    # i = 0 would be 90°, which is the same as 0°
+    for i in range(1, MAX_TANGENT + 1):
+        for j in range(MAX_TANGENT + 1):
+            if math.gcd(i, j) != 1:
+                continue
+            n = round(period * math.hypot(i, j))
+            if 2 <= n <= MAX_SUPERCELL:
+                candidates.append((n, i, j))
+    if not candidates:
+        # a period too big for any tangent, the plain 0° cell it is
+        return [(1, 0, MAX_SUPERCELL)]
+    return [(i, j, n) for n, i, j in sorted(candidates)]
+
+
+@lru_cache(maxsize=16)
+def _cached_matrix(i, j, n, bit_depth):
+    matrix = cached_array(
+        "screens",
+        (SCREEN_VERSION, i, j, n, bit_depth),
+        lambda: supercell(i, j, n, bit_depth),
+    )
+    # shared between calls, so nobody gets to modify it
+    matrix.flags.writeable = False
+    return matrix
+
+
+@lru_cache(maxsize=16)
+def _classic_matrix(size, bit_depth):
+    matrix = classic_cell(size, bit_depth)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def classic_cell(size, bit_depth=8):
+    """
+    The matrix of the clustered dot from before it had an angle, a cell of
+    2 * size pixels. A quarter is ranked by the distance to its center, from
+    0 to 0.5, and the whites are two of those, the blacks two mirrored
+    negatives of it.
+    """
+    max_val = 2**bit_depth - 1
+
+    center = (size - 1) / 2
+    y, x = np.mgrid[:size, :size]
+    distances = (y - center) ** 2 + (x - center) ** 2
+    # the same sort as always, ties fall the same way
+    matrix = np.zeros((size, size), dtype=int)
+    matrix.flat[np.argsort(distances, axis=None)] = np.arange(size**2)
+
+    matrix = (matrix / max(np.max(matrix), 1)) * 0.5
+    negative = np.fliplr(1 - matrix)
+    # fmt: off
+    stacked = np.block([[negative, matrix],
+                        [matrix, negative]])
+    # fmt: on
+    stacked /= np.max(stacked)
+    return np.round(stacked * max_val).astype(
+        np.uint16 if bit_depth == 16 else np.uint8
+    )
+
+
+def supercell(i, j, n, bit_depth=8):
+    """
+    Builds the n x n threshold matrix of a screen with the tangent j / i.
+
+    Every cell is split into 2 x 2 blocks, like the old 0° matrix. A white dot
+    grows from the center of two of them until it fills them at 50% gray, the
+    other two hold a black dot that shrinks from there. i = 1, j = 0 is the
+    layout of that matrix with a cell of n pixels, see classic_cell().
+    """
+    max_val = 2**bit_depth - 1
+
+    # the pixel centers in cells, along both axes of the screen
+    y, x = np.mgrid[:n, :n] + 0.5
+    u = (x * i + y * j) / n
+    v = (y * i - x * j) / n
+
+    # the 2 x 2 blocks of the cells and the distance to their centers
+    bu, fu = np.divmod(2 * u, 1)
+    bv, fv = np.divmod(2 * v, 1)
+    distance = (fu - 0.5) ** 2 + (fv - 0.5) ** 2
+    white = (bu - bv) % 2 == 1
+
+    # ranked by distance across the whole supercell, the whites from the
+    # center out go from 0 to 0.5 and the blacks from the edge in up to 1
+    matrix = np.empty((n, n))
+    for mask, start, stop in ((white, 0.0, 0.5), (~white, 1.0, 0.5)):
+        order = np.argsort(distance[mask], kind="stable")
+        ranks = np.empty(order.size)
+        ranks[order] = np.linspace(start, stop, order.size)
+        matrix[mask] = ranks
+
+    return np.round(matrix * max_val).astype(
+        np.uint16 if bit_depth == 16 else np.uint8
+    )
@@ -4,30 +4,42 @@ from hopfer.core.algorithms.cython_ops import (
     sauvola,
     thresh,
 )
+from hopfer.core.packed_bits import PackedBits
 
 
 def threshold(img, settings):
     value = settings["threshold"]
-    return thresh(img, value)
+    return PackedBits(thresh(img, value), img.shape[1])
 
 
-def niblack_threshold(img, settings):
+# the local thresholds take the tables of integral_images(img) as integrals, if
+# the caller has them already. they only depend on the image, not the settings.
+# without them, low_memory streams the image instead of building them.
+
+
+def niblack_threshold(img, settings, integrals=None, low_memory=False):
     block_size = int(settings["block_size"])
     k = settings["k_factor"]
-    return niblack(img, block_size, k)
+    return PackedBits(
+        niblack(img, block_size, k, integrals, low_memory), img.shape[1]
+    )
 
 
-def sauvola_threshold(img, settings):
+def sauvola_threshold(img, settings, integrals=None, low_memory=False):
     block_size = int(settings["block_size"])
     dynamic_range = settings["dynamic_range"]
     k = settings["k_factor"]
-    return sauvola(img, block_size, dynamic_range, k)
+    out = sauvola(img, block_size, dynamic_range, k, integrals, low_memory)
+    return PackedBits(out, img.shape[1])
 
 
-def phansalkar_threshold(img, settings):
+def phansalkar_threshold(img, settings, integrals=None, low_memory=False):
     block_size = int(settings["block_size"])
     dynamic_range = settings["dynamic_range"]
     k = settings["k_factor"]
     p = settings["p_factor"]
     q = settings["q_factor"]
-    return phansalkar(img, block_size, dynamic_range, k, p, q)
+    out = phansalkar(
+        img, block_size, dynamic_range, k, p, q, integrals, low_memory
+    )
+    return PackedBits(out, img.shape[1])
@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from hopfer.core.algorithms.cython_ops import repair_seam
+
+# rows of the band above that get diffused and thrown away before each band,
+# so the error is already settled when its first real row is reached.
+# priming longer doesn't make the seams any better, see _band_starts().
+PRIME_ROWS = 32
+# bands smaller than this are not worth a thread of their own
+MIN_BAND_ROWS = 128
+# how far a seam may move from where it would split the image evenly, as a
+# fraction of the band height
+SEAM_REACH = 0.25
+# rows on either side of a seam that are touched up once both bands are done,
+# see cython_ops/seam.pxi
+SEAM_ROWS = 4
+
+
+def tiled_diffusion(
+    img,
+    diffuse,
+    bands=None,
+    prime_rows=PRIME_ROWS,
+    prime=None,
+    repair_seams=True,
+):
+    """
+    Splits the image into horizontal bands and diffuses all of them at the
+    same time. The result is not identical to a single pass, but as every
+    band is primed with the rows above it, the seams are put into busy rows
+    and the rows around them are touched up afterwards, they are hard to
+    spot.
+
+    Args:
+        img (np.ndarray): A 2d numpy array with the grayscale image.
+        diffuse (callable): Takes a 2d array and optional priming rows and
+            returns its dithered version. It has to release the GIL, which
+            all of the cython_ops do.
+        bands (int): The number of bands, defaults to the number of cores.
+        prime_rows (int): The number of rows used for priming each band.
+        prime (np.ndarray): Rows of noise the first band is primed with.
+        repair_seams (bool): Whether to touch up the seams. That goes by the
+            image, so only when all of the error is diffused.
+    Returns:
+        output_img (np.ndarray): The packed rows of the dithered image.
+    """
+    h = img.shape[0]
+    bands = bands or os.cpu_count() or 1
+
+    # both are kept even, so serpentine scans run in the same direction on
+    # every row as they would in a single pass.
+    band_h = max(MIN_BAND_ROWS, -(-h // bands))
+    band_h += band_h & 1
+    prime_rows += prime_rows & 1
+
+    if h <= band_h:
+        return diffuse(img, prime)
+    starts = _band_starts(img, band_h)
+    ends = [*starts[1:], h]
+
+    # packed, see cython_ops/bits.pxi
+    output_img = np.empty((h, (img.shape[1] + 7) // 8), dtype=np.uint8)
+
+    def work(y0, y1):
+        p0 = max(0, y0 - prime_rows)
+        # only the first band has nothing above it to be primed with
+        noise = prime if y0 == 0 else None
+        output_img[y0:y1] = diffuse(img[p0:y1], noise)[y0 - p0 :]
+
+    with ThreadPoolExecutor(max_workers=len(starts)) as pool:
+        # list() so exceptions from the workers are raised here
+        list(pool.map(work, starts, ends))
+        if repair_seams:
+            # the seams are far enough apart to not read each other's rows
+            repair = partial(repair_seam, output_img, img, rows=SEAM_ROWS)
+            list(pool.map(repair, starts[1:]))
+
+    return output_img
+
+
+def _band_starts(img, band_h):
+    # a band picks up its own dot pattern from the priming, which doesn't
+    # line up with the one of the band above. in a flat area that shows as a
+    # line, in a busy one it's hardly there. so every seam moves to the
+    # busiest row near where it would split the image evenly.
+    h = img.shape[0]
+    reach = int(band_h * SEAM_REACH) & ~1
+    starts = [0]
+    for y in range(band_h, h, band_h):
+        lo = max(starts[-1] + 2, y - reach)
+        hi = min(h - 2, y + reach)
+        if lo >= hi:
+            starts.append(y)
+            continue
+        # every 4th column is plenty to tell the busy rows, averaged over a
+        # few rows as a seam shows over a few rows
+        rows = img[lo - 1 : hi, ::4].astype(np.int32)
+        busy = np.abs(np.diff(rows, axis=0)).mean(axis=1)
+        busy += np.abs(np.diff(rows[1:], axis=1)).mean(axis=1)
+        busy = np.convolve(busy, np.ones(9), mode="same")
+        # even, the same as the band height
+        starts.append(lo + 2 * int(np.argmax(busy[::2])))
+    return starts
@@ -6,37 +6,45 @@ from hopfer.core.algorithms.cython_ops import (
     zhou_fang_fast,
     zhou_fang_fast_s,
 )
+from hopfer.core.packed_bits import PackedBits
 
-from .ved_data import OSTROMOUKHOV_COEFFN, ZF_COEFFN, ZF_PERT
+from .priming import ved_noise_rows
+from .tiled import tiled_diffusion
+from .ved_data import OSTROMOUKHOV_Q16, ZF_PERT_Q16, ZF_Q16
 
 
 def variable_ed(img, algorithm, settings):
     str = np.float64(settings["diffusion_factor"])
     serpentine = settings["serpentine"]
     noise = settings["noise"]
-    if noise:
-        rng = np.random.default_rng(12345)
-        noise_array = rng.integers(
-            low=0, high=32768, size=(20, img.shape[1])
-        ).astype(np.uint16)
-
-        img = np.vstack((noise_array, img))
-
-    if algorithm == "Ostromoukhov":
-        if serpentine:
-            output_img = ostromoukhov_s(img, OSTROMOUKHOV_COEFFN, str)
+    tiled = settings.get("tiled", False)
+    prime = ved_noise_rows(img.shape[1]) if noise else None
+
+    threads = 1 if tiled else 0
+
+    def diffuse(img, prime=None):
+        if algorithm == "Ostromoukhov":
+            if serpentine:
+                return ostromoukhov_s(img, OSTROMOUKHOV_Q16, str, prime)
+            else:
+                return ostromoukhov(img, OSTROMOUKHOV_Q16, str, threads, prime)
+        elif algorithm == "Zhou-Fang":
+            if serpentine:
+                return zhou_fang_fast_s(img, ZF_Q16, ZF_PERT_Q16, str, prime)
+            else:
+                return zhou_fang_fast(
+                    img, ZF_Q16, ZF_PERT_Q16, str, threads, prime
+                )
         else:
-            output_img = ostromoukhov(img, OSTROMOUKHOV_COEFFN, str)
-    elif algorithm == "Zhou-Fang":
-        if serpentine:
-            output_img = zhou_fang_fast_s(img, ZF_COEFFN, ZF_PERT, str)
-        else:
-            output_img = zhou_fang_fast(img, ZF_COEFFN, ZF_PERT, str)
+            # Default to Zhou-Fang serpentine
+            return zhou_fang_fast_s(img, ZF_Q16, ZF_PERT_Q16, str, prime)
+
+    if tiled:
+        # the dots only average to the image with all of the error diffused
+        output_img = tiled_diffusion(
+            img, diffuse, prime=prime, repair_seams=str == 1
+        )
     else:
-        # Default to Zhou-Fang serpentine
-        output_img = zhou_fang_fast_s(img, ZF_COEFFN, ZF_PERT, str)
-
-    if noise:
-        output_img = output_img[20:, :]
+        output_img = diffuse(img, prime)
 
-    return output_img
+    return PackedBits(output_img, img.shape[1])
@@ -1308,3 +1308,11 @@ ZF_PERT = np.array(
         0.00,
     ]
 ).astype(np.float64)
+
+# Q16 fixed point versions of the tables above, which is what the kernels
+# actually use. a tap is then an integer multiply and a shift instead of a
+# double multiply and a cast, see ostromoukhov.pxi.
+Q16 = 1 << 16
+OSTROMOUKHOV_Q16 = np.round(OSTROMOUKHOV_COEFFN * Q16).astype(np.int32)
+ZF_Q16 = np.round(ZF_COEFFN * Q16).astype(np.int32)
+ZF_PERT_Q16 = np.round(ZF_PERT * Q16).astype(np.int32)
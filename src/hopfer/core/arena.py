@@ -0,0 +1,47 @@
+"""
+Scratch arrays that are reused from one run to the next instead of being
+allocated for every one of them.
+
+The enhancements and the halftones need a few full size temporaries each, a
+float32 copy of the image, a mask, the image in another bit depth. For a big
+image those are hundreds of MB per run, most of it fresh pages the OS has to
+zero first. An arena hands out the same arrays again as long as the image
+keeps its size.
+"""
+
+import numpy as np
+
+
+class BufferArena:
+    """
+    Scratch arrays by name. A name gets the same array back as long as the
+    shape and the dtype stay the same, a new one replaces it. Whatever is in
+    an array is left over from its last use, nothing is cleared.
+
+    Two temporaries that are used at the same time need two names. An arena
+    is not meant to be shared between threads.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape, dtype):
+        """An uninitialized scratch array of shape and dtype."""
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            # dropped first, so the old and the new one aren't held at once
+            self._buffers.pop(name, None)
+            buffer = np.empty(shape, dtype)
+            self._buffers[name] = buffer
+        return buffer
+
+    @property
+    def nbytes(self):
+        """The memory held by all of the arrays."""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def release(self):
+        """Frees every array, for when the image changes."""
+        self._buffers.clear()
@@ -0,0 +1,271 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from hopfer import VERSION
+from hopfer.core import image_io
+from hopfer.core.compiler.kernel_cache import build_user_kernels
+from hopfer.core.packed_bits import PackedBits
+from hopfer.helpers.kernels import user_kernels
+from hopfer.pipeline import (
+    DEFAULT_ENHANCE,
+    DEFAULT_SETTINGS,
+    Pipeline,
+    default_settings,
+)
+
+logger = logging.getLogger(__name__)
+
+# one pipeline per worker process, so its scratch buffers are reused between
+# files of the same size.
+_pipeline = None
+
+LOG_FORMAT = "%(asctime)s [BATCH] %(levelname)s: %(message)s"
+
+EXTENSIONS = {
+    ".bmp",
+    ".gif",
+    ".jp2",
+    ".jpeg",
+    ".jpg",
+    ".png",
+    ".tif",
+    ".tiff",
+    ".webp",
+}
+
+
+def load_preset(path=None, algorithm=None):
+    """
+    Builds the full set of processing settings. Expects an optional path to a
+    json preset and an optional algorithm name which overrides the preset.
+    """
+    preset = {}
+    if path is not None:
+        with open(path, "r") as f:
+            preset = json.load(f)
+
+    algorithm = algorithm or preset.get("algorithm", "Floyd-Steinberg")
+    if algorithm not in DEFAULT_SETTINGS and algorithm not in user_kernels():
+        raise ValueError(f"Unknown algorithm: {algorithm}")
+
+    settings = default_settings(algorithm)
+    if preset.get("algorithm", algorithm) == algorithm:
+        settings.update(preset.get("settings", {}))
+
+    enhance = dict(DEFAULT_ENHANCE)
+    enhance.update(preset.get("enhance", {}))
+
+    return {
+        "grayscale": preset.get("grayscale", "Luminance"),
+        "grayscale_settings": preset.get("grayscale_settings", {}),
+        "enhance": enhance,
+        "algorithm": algorithm,
+        "settings": settings,
+    }
+
+
+def collect_inputs(inputs):
+    """Expands folders into the supported image files they contain."""
+    files = []
+    for item in inputs:
+        path = Path(item).expanduser()
+        if path.is_dir():
+            files.extend(
+                sorted(
+                    p
+                    for p in path.iterdir()
+                    if p.is_file() and p.suffix.lower() in EXTENSIONS
+                )
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def read_image(path):
+    image = image_io.read_image(path)
+    if image is None:
+        raise ValueError("Unsupported image format")
+
+    image, alpha, _ = image_io.split_channels(image)
+    return np.ascontiguousarray(image), alpha
+
+
+def write_image(path, processed, alpha=None):
+    if isinstance(processed, PackedBits):
+        image = processed.unpack(255)
+    else:
+        image = processed
+
+    if alpha is not None:
+        # cv2 can't handle grayscale with alpha, same hack as in the storage
+        bgr = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        image = np.dstack((bgr, alpha))
+
+    if not image_io.write_image(path, image):
+        raise OSError(f"Failed writing {path}")
+
+
+def process_file(path, output, preset):
+    """
+    Runs a single file through the same steps the daemon uses. This is the
+    function executed in the worker processes.
+    """
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = Pipeline()
+
+    record = {"input": os.fspath(path), "output": None}
+    try:
+        start = time.perf_counter()
+        image, alpha = read_image(path)
+        h, w = image.shape[:2]
+        loaded = time.perf_counter()
+
+        processed = _pipeline.run(
+            image,
+            grayscale=preset["grayscale"],
+            grayscale_settings=preset["grayscale_settings"],
+            enhance=preset["enhance"],
+            algorithm=preset["algorithm"],
+            settings=preset["settings"],
+        )
+        done = time.perf_counter()
+
+        write_image(output, processed, alpha)
+        saved = time.perf_counter()
+
+        megapixels = h * w / 1e6
+        record.update(
+            {
+                "output": os.fspath(output),
+                "width": w,
+                "height": h,
+                "megapixels": round(megapixels, 3),
+                "load_seconds": round(loaded - start, 4),
+                "process_seconds": round(done - loaded, 4),
+                "save_seconds": round(saved - done, 4),
+                "mp_per_s": round(megapixels / max(done - loaded, 1e-9), 3),
+            }
+        )
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+def output_paths(files, output, extension):
+    # keeps outputs unique when several inputs share the same stem
+    taken = set()
+    paths = []
+    for path in files:
+        name = f"{path.stem}.{extension}"
+        counter = 1
+        while name in taken:
+            name = f"{path.stem}_{counter:03d}.{extension}"
+            counter += 1
+        taken.add(name)
+        paths.append(output / name)
+    return paths
+
+
+def run_batch(args):
+    files = collect_inputs(args.inputs)
+    if not files:
+        logger.error("No input files found")
+        return 1
+
+    preset = load_preset(args.preset, args.algorithm)
+
+    if preset["algorithm"] in user_kernels():
+        # built once here, the workers then only load it
+        build_user_kernels()
+
+    output = Path(args.output).expanduser()
+    output.mkdir(parents=True, exist_ok=True)
+    outputs = output_paths(files, output, args.format.lstrip("."))
+
+    jobs = max(1, min(args.jobs, len(files)))
+    threads = args.threads or max(1, (os.cpu_count() or 1) // jobs)
+
+    # the workers are spawned, so they pick this up before OpenMP is loaded.
+    # without it every worker would start a thread per core.
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+
+    logger.info(
+        f"Processing {len(files)} files with {preset['algorithm']} "
+        f"on {jobs} workers x {threads} threads"
+    )
+
+    records = [None] * len(files)
+    start = time.perf_counter()
+
+    # using spawn to be consistent with the GUI and across platforms
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+        futures = {
+            pool.submit(process_file, path, out, preset): i
+            for i, (path, out) in enumerate(zip(files, outputs, strict=True))
+        }
+        for future in as_completed(futures):
+            record = future.result()
+            records[futures[future]] = record
+            if "error" in record:
+                logger.error(f"{record['input']}: {record['error']}")
+            else:
+                logger.info(
+                    f"{Path(record['input']).name}: "
+                    f"{record['megapixels']:.2f} MP in "
+                    f"{record['process_seconds']:.3f}s "
+                    f"({record['mp_per_s']:.2f} MP/s)"
+                )
+
+    wall = time.perf_counter() - start
+    total_mp = sum(r.get("megapixels", 0) for r in records)
+    failed = sum(1 for r in records if "error" in r)
+
+    manifest = {
+        "version": VERSION,
+        "grayscale": preset["grayscale"],
+        "grayscale_settings": preset["grayscale_settings"],
+        "enhance": preset["enhance"],
+        "algorithm": preset["algorithm"],
+        "settings": preset["settings"],
+        "jobs": jobs,
+        "threads": threads,
+        "files": records,
+        "failed": failed,
+        "megapixels": round(total_mp, 3),
+        "wall_seconds": round(wall, 3),
+        "mp_per_s": round(total_mp / max(wall, 1e-9), 3),
+    }
+    with open(output / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(
+        f"Done: {total_mp:.2f} MP in {wall:.2f}s "
+        f"({manifest['mp_per_s']:.2f} MP/s aggregate), {failed} failed"
+    )
+
+    return 1 if failed else 0
+
+
+def main(argv):
+    from hopfer.helpers.parse import parse_batch_args
+
+    args = parse_batch_args(VERSION, argv)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format=LOG_FORMAT,
+        datefmt="%H:%M:%S",
+    )
+
+    return run_batch(args)
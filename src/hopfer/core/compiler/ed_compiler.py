@@ -0,0 +1,306 @@
+"""
+Generates cython_ops/ed_kernels.pxi, with an unrolled raster and serpentine
+error diffusion for every fixed kernel in helpers/kernels.py.
+
+The generic ed/eds loop over the whole kernel matrix, skip the zeros and do a
+float multiply per tap. Here every tap becomes a single line with an integer
+weight and a constant divisor, and as the error is kept in a padded ring (see
+ring.pxi) there are no bounds checks at all. Run it again after changing a kernel:
+
+    python -m hopfer.core.compiler.ed_compiler
+"""
+
+import math
+import os
+from fractions import Fraction
+from pathlib import Path
+
+from hopfer.helpers.kernels import get_kernel
+
+BASE_DIR = Path(__file__).resolve().parent.parent / "algorithms" / "cython_ops"
+
+# the largest divisor of the integer weights. the error of a pixel is below
+# 2^16, times a weight of at most this it stays well within an int32.
+MAX_DIVISOR = 4096
+
+# Sierra2 4A has its own hand written sierra24a.pxi, and Nakano isn't used
+# as a plain error diffusion
+KERNELS = [
+    "Floyd-Steinberg",
+    "False Floyd-Steinberg",
+    "Jarvis",
+    "Stucki",
+    "Stucki small",
+    "Stucki large",
+    "Atkinson",
+    "Burkes",
+    "Sierra",
+    "Sierra2",
+]
+
+HEADER = """\
+# ed_kernels.pxi
+# GENERATED by src/hopfer/core/compiler/ed_compiler.py, do not edit by hand.
+from libc.stdint cimport int32_t, uint8_t, uint16_t
+
+ctypedef void (*ed_span_t)(
+    const uint16_t[:, ::1], ring_t*, uint8_t[:, :], int, int, int, float
+) noexcept nogil
+
+# the kernels with a specialized version, maps names to ids
+ED_KERNELS = {{
+{kernels}
+}}
+
+
+def ed_kernel(img_u16, int kernel_id, float str_value, bint serpentine=False, int threads=0, prime=None):
+    \"\"\"
+    Error diffusion with one of the fixed kernels in ED_KERNELS. Takes the same arguments as ed/eds, except that the kernel is given by its id. The errors are spread with integer weights, so the result can differ from ed/eds by a level here and there.
+    \"\"\"
+    cdef int h = img_u16.shape[0]
+    cdef int w = img_u16.shape[1]
+    out = _bits_zeros(h, w)
+    cdef const uint16_t[:, ::1] src = np.ascontiguousarray(img_u16, dtype=np.uint16)
+    cdef uint8_t[:, :] out_buf = out
+    cdef ed_span_t span
+    cdef ed_span_t rspan
+    cdef int lag, below, pad
+    cdef const uint16_t[:, ::1] noise
+    cdef uint8_t[:, :] scratch
+
+"""
+
+FOOTER = """
+    if serpentine:
+        threads = 1
+    else:
+        threads = _wf_threads(h, w, threads)
+
+    # only the error is kept, see ring.pxi
+    cdef int32_t[:, ::1] err = _ring_buffer(_ring_rows(below, threads), w, pad)
+    cdef ring_t ring = _ring(err, pad)
+
+    # priming, see ed
+    if prime is not None:
+        noise = np.ascontiguousarray(prime, dtype=np.uint16)
+        scratch = _bits_zeros(noise.shape[0], w)
+        with nogil:
+            if serpentine:
+                _edk_serpentine(span, rspan, noise, &ring, scratch, noise.shape[0], w, str_value)
+            else:
+                _edk_raster(span, noise, &ring, scratch, noise.shape[0], w, str_value)
+        _ring_skip(err, noise.shape[0])
+
+    with nogil:
+        if serpentine:
+            _edk_serpentine(span, rspan, src, &ring, out_buf, h, w, str_value)
+        elif threads > 1:
+            _edk_wavefront(span, src, &ring, out_buf, h, w, lag, str_value, threads)
+        else:
+            _edk_raster(span, src, &ring, out_buf, h, w, str_value)
+    return out
+
+cdef void _edk_raster(ed_span_t span, const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int h, int w, float str_value) noexcept nogil:
+    cdef int y
+    for y in range(h):
+        span(src, ring, out, y, 0, w, str_value)
+        _ring_clear(ring, y)
+
+cdef void _edk_serpentine(ed_span_t span, ed_span_t rspan, const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int h, int w, float str_value) noexcept nogil:
+    # same as eds, even rows go left to right
+    cdef int y
+    for y in range(h):
+        if y % 2 == 0:
+            span(src, ring, out, y, 0, w, str_value)
+        else:
+            rspan(src, ring, out, y, 0, w, str_value)
+        _ring_clear(ring, y)
+
+cdef void _edk_wavefront(ed_span_t span, const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int h, int w, int lag, float str_value, int threads) noexcept nogil:
+    # see wavefront.pxi
+    cdef int y, x0, x1, need
+    cdef int* progress = _wf_progress(h)
+
+    if progress == NULL:
+        _edk_raster(span, src, ring, out, h, w, str_value)
+        return
+
+    for y in prange(h, schedule='static', chunksize=1, num_threads=threads):
+        x0 = 0
+        while x0 < w:
+            x1 = x0 + WF_CHUNK
+            if x1 > w:
+                x1 = w
+            need = x1 + lag
+            if need > w:
+                need = w
+            _wf_wait(progress, y, need)
+            span(src, ring, out, y, x0, x1, str_value)
+            if x1 == w:
+                _ring_clear(ring, y)
+            _wf_done(progress, y, x1)
+            x0 = x1
+
+    free(progress)
+"""
+
+
+def identifier(name):
+    return "".join(c if c.isalnum() else "_" for c in name.lower())
+
+
+def _tap_fractions(kernel):
+    # the weights of the taps as fractions, by (dy, dx)
+    kh, kw = kernel.shape
+    cy, cx = kh // 2, kw // 2
+    fractions = {}
+    for ky in range(kh):
+        for kx in range(kw):
+            if kernel[ky, kx] != 0:
+                if ky < cy or (ky == cy and kx <= cx):
+                    raise ValueError("Kernel diffuses into processed pixels")
+                fractions[(ky - cy, kx - cx)] = Fraction(
+                    float(kernel[ky, kx])
+                ).limit_denominator(1024)
+    return fractions
+
+
+def kernel_is_exact(kernel):
+    """Whether kernel_taps gives the exact weights of a kernel."""
+    fractions = _tap_fractions(kernel)
+    return math.lcm(*(f.denominator for f in fractions.values())) <= MAX_DIVISOR
+
+
+def kernel_taps(kernel):
+    """
+    Returns the taps of a kernel as (dy, dx, weight) relative to the current
+    pixel, with integer weights, and their common divisor. Weights that need
+    a divisor over MAX_DIVISOR are rounded to MAX_DIVISOR instead, keeping
+    their sum, see kernel_is_exact().
+    """
+    fractions = _tap_fractions(kernel)
+    divisor = math.lcm(*(f.denominator for f in fractions.values()))
+    if divisor <= MAX_DIVISOR:
+        taps = [
+            (dy, dx, int(f * divisor))
+            for (dy, dx), f in sorted(fractions.items())
+        ]
+        return taps, divisor
+
+    # the lcm of a few denominators up to 1024 easily runs into the millions,
+    # which overflows e * weight. rounded down first, then the ones that lost
+    # the most get the rest, so the kernel still diffuses the same total.
+    divisor = MAX_DIVISOR
+    scaled = {tap: f * divisor for tap, f in fractions.items()}
+    weights = {tap: math.floor(v) for tap, v in scaled.items()}
+    rest = round(sum(scaled.values())) - sum(weights.values())
+    for tap in sorted(scaled, key=lambda t: weights[t] - scaled[t])[:rest]:
+        weights[tap] += 1
+
+    taps = [(dy, dx, w) for (dy, dx), w in sorted(weights.items()) if w > 0]
+    if not taps:
+        raise ValueError("The weights of the kernel are too small")
+    return taps, divisor
+
+
+def emit_pixel(taps, divisor, reverse, indent):
+    """The body processing a single pixel at x."""
+    pad = " " * indent
+    lines = [
+        "old = src[y, x] + e0[x]",
+        "if old >= 32768:",
+        "    e = old - 65535",
+        "    _bit_set(out, y, x)",
+        "else:",
+        "    e = old",
+        "e = <int32_t>(e * str_value)",
+    ]
+    for dy, dx, weight in taps:
+        # serpentine rows going right to left mirror the kernel
+        dx = -dx if reverse else dx
+        col = "x" if dx == 0 else f"x {'+' if dx > 0 else '-'} {abs(dx)}"
+        lines.append(f"e{dy}[{col}] += e * {weight} // {divisor}")
+    return "\n".join(pad + line for line in lines) + "\n"
+
+
+def emit_span(name, taps, divisor, reverse):
+    """
+    A function processing the pixels x0 to x1 of a single row. The error
+    ring is padded by the reach of the kernel, so there are no bounds checks.
+    """
+    below = max(dy for dy, _, _ in taps)
+    suffix = "rspan" if reverse else "span"
+    order = "right to left" if reverse else "left to right"
+    out = [
+        f"cdef void _ed_{name}_{suffix}(const uint16_t[:, ::1] src, ring_t* ring, uint8_t[:, :] out, int y, int x0, int x1, float str_value) noexcept nogil:",
+        f"    # pixels x0 to x1 of a single row, {order}",
+        "    cdef int x",
+        "    cdef int32_t old, e",
+    ]
+    for dy in range(below + 1):
+        offset = f" + {dy}" if dy else ""
+        out.append(f"    cdef int32_t* e{dy} = _ring_row(ring, y{offset})")
+    out.append("")
+    if reverse:
+        out.append("    for x in range(x1 - 1, x0 - 1, -1):")
+    else:
+        out.append("    for x in range(x0, x1):")
+    out.append(emit_pixel(taps, divisor, reverse, 8))
+    return "\n".join(out)
+
+
+def generate(kernels=None):
+    """
+    The source of ed_kernels.pxi. Takes a list of (name, kernel) pairs, the
+    fixed kernels in KERNELS by default. core/compiler/kernel_cache.py uses it
+    for the kernels of the users as well.
+    """
+    if kernels is None:
+        kernels = [(algorithm, get_kernel(algorithm)) for algorithm in KERNELS]
+
+    dispatch = []
+    names = []
+    spans = []
+    for kernel_id, (algorithm, kernel) in enumerate(kernels):
+        name = identifier(algorithm)
+        taps, divisor = kernel_taps(kernel)
+        left = max([0] + [-dx for _, dx, _ in taps if dx < 0])
+        right = max([0] + [dx for _, dx, _ in taps if dx > 0])
+
+        names.append(f'    "{algorithm}": {kernel_id},')
+        keyword = "if" if kernel_id == 0 else "elif"
+        dispatch.append(
+            f"    {keyword} kernel_id == {kernel_id}:  # {algorithm}\n"
+            f"        span = _ed_{name}_span\n"
+            f"        rspan = _ed_{name}_rspan\n"
+            f"        lag = {left + right + 1}\n"
+            f"        below = {max(dy for dy, _, _ in taps)}\n"
+            f"        pad = {max(left, right)}"
+        )
+        spans.append(f"# {algorithm}, divisor {divisor}")
+        spans.append(emit_span(name, taps, divisor, False))
+        spans.append(emit_span(name, taps, divisor, True))
+
+    dispatch.append(
+        '    else:\n        raise ValueError(f"Unknown kernel id: {kernel_id}")'
+    )
+
+    return (
+        HEADER.format(kernels="\n".join(names))
+        + "\n".join(dispatch)
+        + "\n"
+        + FOOTER
+        + "\n"
+        + "\n".join(spans)
+    )
+
+
+def main():
+    path = BASE_DIR / "ed_kernels.pxi"
+    with open(path, "w") as f:
+        f.write(generate())
+    print(f"Wrote {os.fspath(path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Compiles the error diffusion kernels of the user (see user_kernels() in
+helpers/kernels.py) into the same unrolled native code ed_compiler.py
+generates for the fixed ones.
+
+Every kernel becomes a small extension module of its own, built once and
+cached in the user cache dir under a hash of its weights. Editing a kernel
+builds a new module, an unchanged one is never built again. Building needs
+Cython and a C compiler, without them (or until the build is done) the kernel
+runs through the generic ed/eds.
+"""
+
+import hashlib
+import importlib.util
+import logging
+import os
+import sys
+import sysconfig
+import tempfile
+from pathlib import Path
+
+import platformdirs
+
+from hopfer import VERSION
+from hopfer.helpers.kernels import user_kernels
+
+from .ed_compiler import (
+    BASE_DIR,
+    MAX_DIVISOR,
+    generate,
+    kernel_is_exact,
+    kernel_taps,
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(platformdirs.user_cache_dir("hopfer")) / "kernels"
+
+# the same as cython_ops.pyx, the generated code then goes right after it
+MODULE_HEADER = """\
+# cython: language_level=3
+# cython: boundscheck=False
+# cython: wraparound=False
+# cython: initializedcheck=False
+# cython: cdivision=True
+# cython: nonecheck=False
+
+import numpy as np
+cimport numpy as cnp
+from cython.parallel import prange
+
+include "bits.pxi"
+include "ring.pxi"
+include "wavefront.pxi"
+
+"""
+
+# the same as setup.py
+if sys.platform.startswith("win"):
+    COMPILE_ARGS = ["/openmp", "/O2", "/fp:fast"]
+    LINK_ARGS = ["/openmp"]
+else:
+    COMPILE_ARGS = ["-fopenmp", "-O3", "-ffast-math", "-mtune=generic"]
+    LINK_ARGS = ["-fopenmp"]
+
+# the modules loaded by this process, by hash
+_loaded = {}
+
+
+def kernel_hash(kernel):
+    """A short hash of the integer weights of a kernel."""
+    taps, divisor = kernel_taps(kernel)
+    # the shared .pxi files may change between versions, so the modules of
+    # an older one aren't reused
+    key = repr((VERSION, taps, divisor))
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _module_name(digest):
+    return f"ed_user_{digest}"
+
+
+def _module_path(digest):
+    suffix = sysconfig.get_config_var("EXT_SUFFIX")
+    return CACHE_DIR / (_module_name(digest) + suffix)
+
+
+def load_kernel(kernel):
+    """
+    Returns the compiled module of a kernel if it was built already, None
+    otherwise. Never builds anything, so it's cheap enough to call on every
+    run. The module has the ed_kernel of cython_ops, with the kernel as id 0.
+    """
+    digest = kernel_hash(kernel)
+    if digest in _loaded:
+        return _loaded[digest]
+
+    path = _module_path(digest)
+    if not path.exists():
+        return None
+
+    try:
+        spec = importlib.util.spec_from_file_location(
+            _module_name(digest), path
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except ImportError as e:
+        logger.warning(f"Could not load {path}: {e}")
+        return None
+
+    _loaded[digest] = module
+    return module
+
+
+def build_kernel(kernel):
+    """
+    Compiles a kernel into the cache, unless it's there already. Takes a few
+    seconds and raises if Cython or the compiler are missing or fail.
+
+    Returns:
+        Path: The compiled module.
+    """
+    digest = kernel_hash(kernel)
+    path = _module_path(digest)
+    if path.exists():
+        return path
+
+    # only needed for building, which a lot of installs never do
+    import numpy as np
+    from Cython.Build import cythonize
+    from setuptools import Distribution, Extension
+
+    name = _module_name(digest)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=CACHE_DIR) as tmp:
+        source = Path(tmp) / f"{name}.pyx"
+        source.write_text(MODULE_HEADER + generate([("User", kernel)]))
+
+        extension = Extension(
+            name,
+            [os.fspath(source)],
+            extra_compile_args=COMPILE_ARGS,
+            extra_link_args=LINK_ARGS,
+            include_dirs=[np.get_include()],
+            define_macros=[("NPY_NO_DEPRECATED_API", "NPY_1_7_API_VERSION")],
+        )
+        dist = Distribution(
+            {
+                "ext_modules": cythonize(
+                    [extension],
+                    include_path=[os.fspath(BASE_DIR)],
+                    quiet=True,
+                )
+            }
+        )
+        build = dist.get_command_obj("build_ext")
+        build.build_lib = os.path.join(tmp, "lib")
+        build.build_temp = os.path.join(tmp, "temp")
+        build.ensure_finalized()
+        build.run()
+
+        # a process building the same kernel at the same time just ends up
+        # replacing it with an identical file
+        os.replace(build.get_ext_fullpath(name), path)
+
+    return path
+
+
+def build_user_kernels():
+    """
+    Builds every kernel of kernels.json that isn't in the cache yet. Slow the
+    first time, so the daemon runs it in the background.
+    """
+    for name, kernel in user_kernels().items():
+        try:
+            if not kernel_is_exact(kernel):
+                logger.warning(
+                    f"The weights of the kernel {name} don't fit a divisor of "
+                    f"{MAX_DIVISOR}, the compiled kernel rounds them"
+                )
+            build_kernel(kernel)
+        except Exception as e:
+            logger.warning(
+                f"Could not compile the kernel {name}, using the generic "
+                f"error diffusion instead: {e}"
+            )
@@ -1,9 +1,12 @@
 import os
+import threading
 
 from setproctitle import setproctitle
 
+from hopfer.core.compiler.kernel_cache import build_user_kernels
 from hopfer.core.image_processor import ImageProcessor
 from hopfer.core.image_storage import ImageStorage
+from hopfer.core.stages import STAGE_CACHE_BYTES
 from hopfer.helpers.hex_rgb import hex_to_numpy
 
 
@@ -33,6 +36,10 @@ class Daemon:
         self.storage = ImageStorage(self)
         self.processor = ImageProcessor(self, self.storage)
 
+        # compiling the kernels of the user takes a few seconds the first
+        # time. they run through the generic error diffusion until it's done.
+        threading.Thread(target=build_user_kernels, daemon=True).start()
+
         if os.name != "nt":
             # setproctitle does not work on windows
             setproctitle("hopferd")
@@ -92,26 +99,32 @@ class Daemon:
             elif message["type"] == "ignore_alpha":
                 value = message["value"]
                 self.storage.ignore_alpha = value
+            elif message["type"] == "low_memory":
+                self.processor.low_memory = message["value"]
+                if message["value"]:
+                    self.storage.release_integral_images()
+                # only the last enhanced and processed image are kept then
+                self.storage.stage_cache.budget = (
+                    0 if message["value"] else STAGE_CACHE_BYTES
+                )
 
             # PROCESSOR RELATED
             elif message["type"] == "process":
-                step = []
+                # only the settings that changed are sent. the stages find
+                # out themselves what has to run again, see stages.py
                 if message["g_mode"] is not None:
                     self.processor.grayscale_mode = message["g_mode"]
                     self.processor.grayscale_settings = message["g_settings"]
                     self.processor.convert = True
-                    step.append(0)
                 if message["e_settings"] is not None:
                     self.processor.image_settings = message["e_settings"]
-                    step.append(0)
                 if message["h_algorithm"] is not None:
                     self.processor.algorithm = message["h_algorithm"]
                     self.processor.settings = message["h_settings"]
                     logger.debug(f"Algorithm: {message['h_algorithm']}.")
                     logger.debug(f"Settings: {message['h_settings']}.")
-                    step.append(1)
                 if self.storage.original_image is not None:
-                    self.processor.start(step=min(step))
+                    self.processor.start()
 
             elif message["type"] == "exit":
                 del self.storage.shm_preview
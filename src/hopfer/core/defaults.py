@@ -0,0 +1,77 @@
+"""
+The default settings of the enhancements and of every algorithm. They're in
+a module of their own so the pipeline, the batch runner and the user kernels
+can all import them without importing each other.
+"""
+
+# the same settings the GUI starts with, so callers only need to pass the
+# values they actually change.
+DEFAULT_ENHANCE = {
+    "normalize": False,
+    "equalize": False,
+    "bc_t": False,
+    "blur_t": False,
+    "unsharp_t": False,
+    "laplacian_t": False,
+    "brightness": 0.0,
+    "contrast": 0.0,
+    "box": 0,
+    "blur": 0,
+    "median": 1,
+    # the 16 bit median keeps the low byte, at several times the time
+    "median_exact": False,
+    "u_radius": 3,
+    "u_strength": 0.25,
+    "u_thresh": 0.3,
+    "l_strength": 0.25,
+    "l_ksize": 1,
+}
+
+_ED = {
+    "diffusion_factor": 1.0,
+    "serpentine": False,
+    "noise": False,
+    "tiled": False,
+}
+_ED_S = {**_ED, "serpentine": True}
+_EDODF = {"diffusion_factor": 1.0, "serpentine": True, "noise": False}
+
+DEFAULT_SETTINGS = {
+    "None": {},
+    "Fixed threshold": {"threshold": 0.5},
+    "Niblack threshold": {"block_size": 25, "k_factor": 0.1},
+    "Sauvola threshold": {
+        "block_size": 25,
+        "dynamic_range": 0.5,
+        "k_factor": 0.1,
+    },
+    "Phansalkar threshold": {
+        "block_size": 25,
+        "dynamic_range": 0.5,
+        "k_factor": 0.25,
+        "p_factor": 0.3,
+        "q_factor": 1,
+    },
+    "Mezzotint uniform": {"range": [0, 1], "seed": 3750},
+    "Mezzotint normal": {"location": 0.5, "std": 0.2, "seed": 3750},
+    # alpha and beta in tenths, 20 is 2.0
+    "Mezzotint beta": {"alpha": 20, "beta": 20, "seed": 3750},
+    "Bayer": {"size": 2, "perturbation": 0, "offset": 0, "seed": 0},
+    "Clustered dot": {"size": 15, "angle": 45, "lpi": 0, "dpi": 600},
+    "Blue noise": {"size": 6, "seed": 0},
+    "Floyd-Steinberg": _ED,
+    "False Floyd-Steinberg": _ED,
+    "Jarvis": _ED,
+    "Stucki": _ED,
+    "Stucki small": _ED,
+    "Stucki large": _ED,
+    "Atkinson": _ED,
+    "Burkes": _ED,
+    "Sierra": _ED,
+    "Sierra2": _ED,
+    "Sierra2 4A": _ED_S,
+    "Ostromoukhov": _ED_S,
+    "Zhou-Fang": _ED_S,
+    "Levien": {**_EDODF, "hysteresis": 1.0},
+    "Nakano": {**_EDODF, "hysteresis": 0.1},
+}
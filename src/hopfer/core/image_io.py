@@ -0,0 +1,127 @@
+"""
+Qt-free helpers for reading, splitting and writing images. Shared by the
+ImageStorage in the daemon and by the headless batch mode.
+"""
+
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# cv2 is imported where it's used, it takes about as long to import as all of
+# the daemon and is only needed once an image is read or written
+
+
+def read_image(path):
+    """
+    Reads an image from disk with all of its channels and bit depth intact.
+    Returns None if the format is not supported.
+    """
+    import cv2
+
+    image = cv2.imread(os.fspath(path), cv2.IMREAD_UNCHANGED)
+
+    if image is None:
+        # HACK: numpy is used to bypass windows problems with non-latin
+        # encoding of folder and file names
+        file_bytes = np.fromfile(path, dtype=np.uint8)
+        image = cv2.imdecode(file_bytes, cv2.IMREAD_UNCHANGED)
+
+    return image
+
+
+def decode_image(data):
+    """Decodes an encoded image from a bytes-like object."""
+    import cv2
+
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+def write_image(path, image):
+    """
+    Writes an image to disk. Expects the channels in the order cv2 does,
+    i.e. BGR(A). Returns True on success.
+    """
+    import cv2
+
+    path = os.fspath(path)
+    if cv2.imwrite(path, image):
+        return True
+
+    # HACK: same as in read_image
+    ext = os.path.splitext(path)[1]
+    success, buffer = cv2.imencode(ext, image)
+    if success:
+        buffer.tofile(path)
+    return bool(success)
+
+
+def discard_alpha(alpha):
+    # discard the alpha channel if its full of equal numbers
+    # to save on furher processing.
+    if np.all(alpha == alpha[0, 0]):
+        return None
+    else:
+        return alpha
+
+
+def bgr_to_rgb(image):
+    return image[:, :, ::-1]
+
+
+def check_grayscale(rgb):
+    """This is just a small function to check if an RGB image is actually grayscale. It saves time and resources on converting it to grayscale later on. Turns out using numpy's array_equal is much faster."""
+
+    if np.array_equal(rgb[:, :, 0], rgb[:, :, 1]) and np.array_equal(
+        rgb[:, :, 0], rgb[:, :, 2]
+    ):
+        r = np.copy(rgb[:, :, 0])
+        return r, True
+    else:
+        return rgb, False
+
+
+def split_channels(image):
+    """
+    Splits an image loaded with cv2.IMREAD_UNCHANGED into its color/grayscale
+    part and alpha.
+
+    Returns:
+        tuple: (image, alpha, is_grayscale). The image is RGB or 2d, alpha is
+        a uint8 array or None.
+    """
+    num_channels = 1 if image.ndim == 2 else image.shape[-1]
+
+    if num_channels == 1:
+        logger.debug("Image has 1 channel")
+        return image, None, True
+
+    elif num_channels == 2:
+        # This one is never used as cv2 converts them automatically to RGBA
+        logger.debug("Image has 2 channels")
+        L = image[:, :, 0]
+        A = discard_alpha(image[:, :, 1])
+        if A is not None and A.dtype == np.uint16:
+            A = (A >> 8).astype(np.uint8)
+        return L, A, True
+
+    elif num_channels == 3:
+        logger.debug("Image has 3 channels")
+        RGB, is_gray = check_grayscale(bgr_to_rgb(image))
+        return RGB, None, is_gray
+
+    elif num_channels == 4:
+        logger.debug("Image has 4 channels")
+        RGB = bgr_to_rgb(image[:, :, :3])
+        # TODO: Fix the logic here so that the alpha is 16bit if needed
+        A = discard_alpha(image[:, :, 3])
+        if A is not None and A.dtype == np.uint16:
+            A = (A >> 8).astype(np.uint8)
+
+        # Check for grayscale conversion and status update
+        RGB, is_gray = check_grayscale(RGB)
+        return RGB, A, is_gray
+
+    raise ValueError(f"Unsupported number of channels: {num_channels}")
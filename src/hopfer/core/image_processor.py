@@ -1,19 +1,18 @@
 import logging
 import time
 
-import cv2
 import numpy as np
 
-from hopfer.core.algorithms.bayer import bayer, clustered
+from hopfer.core.algorithms.bayer import bayer, blue_noise, clustered
 from hopfer.core.algorithms.cython_ops import (
     average,
     cast_f32_u16,
-    equalize,
     lightness,
     luma,
     luminance,
     manual,
-    normalize,
+    median,
+    stack_blur,
     value,
 )
 from hopfer.core.algorithms.edodf import edodf
@@ -26,10 +25,20 @@ from hopfer.core.algorithms.threshold import (
     threshold,
 )
 from hopfer.core.algorithms.variable_ed import variable_ed
-from hopfer.helpers.kernels import get_kernel
+from hopfer.core.arena import BufferArena
+from hopfer.core.stages import stage_key
+from hopfer.core.tone import adjust_tone, brightness_contrast
+from hopfer.helpers.kernels import get_kernel, user_kernels
 
 logger = logging.getLogger(__name__)
 
+# the thresholds that use the integral images of ImageStorage
+LOCAL_THRESHOLDS = (
+    "Niblack threshold",
+    "Sauvola threshold",
+    "Phansalkar threshold",
+)
+
 
 class ImageProcessor:
     """
@@ -67,7 +76,15 @@ class ImageProcessor:
             "brightness": 0.0,
             "contrast": 0.0,
             "sharpness": 0.0,
-            "blur": 0.0,
+            "box": 0,
+            "blur": 0,
+            "median": 1,
+            "median_exact": False,
+            "u_radius": 3,
+            "u_strength": 0.25,
+            "u_thresh": 0.3,
+            "l_strength": 0.25,
+            "l_ksize": 1,
         }
         # Algorithm is initialized to None - just returning the original image
         self.algorithm = "None"
@@ -77,8 +94,14 @@ class ImageProcessor:
         self.convert = True
         # Reset is used a flag for the viewer to be reset. Set to True when a new image is loaded.
         self.reset = True
-
-    def start(self, step=0):
+        # low_memory of the options. the local thresholds then stream the
+        # image instead of keeping its integral images.
+        self.low_memory = False
+        # the scratch arrays of the enhancements and the halftones, released
+        # by the storage when the image changes
+        self.arena = BufferArena()
+
+    def start(self):
         self.processing = True
         start = time.perf_counter()
 
@@ -88,31 +111,7 @@ class ImageProcessor:
 
         try:
             self.res_queue.put({"type": "started_processing"})
-            # step = self._determine_processing_step(step)
-
-            # As grayscaling is done in parallel now and is so fast i merged the grayscaling and enchancement step into a single one to save on memory.
-            if step == 0:
-                if self.storage.original_grayscale:
-                    gray_input = self.storage.resized.copy()
-                    logger.debug(
-                        "Skipping grayscale: Image is already grayscale."
-                    )
-                else:
-                    gray_input = self._convert_to_grayscale(
-                        self.storage.resized,
-                        self.grayscale_mode,
-                        self.grayscale_settings,
-                    )
-                    logger.debug(
-                        f"Converted to grayscale via {self.grayscale_mode}"
-                    )
-
-                self.storage.enhanced_image = self._enhance_image(
-                    gray_input, self.image_settings
-                )
-                logger.debug("Finished image adjustments")
-
-            processed_image = self._process_algorithm()
+            processed_image = self._run_stages()
 
         except Exception as e:
             logger.error(f"Error in processing: {e}")
@@ -124,27 +123,81 @@ class ImageProcessor:
 
     # --- Helper Methods ---
 
-    def _process_enhancement(self, grayscale_image, step):
-        """Enhances the image based on the provided settings."""
-        im_settings = self.image_settings
-        if step < 1 and any(
-            im_settings[key]
-            for key in [
-                "normalize",
-                "equalize",
-                "bc_t",
-                "blur_t",
-                "unsharp_t",
-                "laplacian_t",
-            ]
-        ):
-            self.storage.enhanced_image = self._enhance_image(
-                grayscale_image, im_settings
-            )
-            logger.debug("Finished image adjustments")
+    def _run_stages(self):
+        """
+        Runs the stages from the first one whose output isn't in the stage
+        cache for the current settings, see stages.py. Returns the processed
+        image.
+        """
+        cache = self.storage.stage_cache
+
+        # the keys of the whole chain first, they are just the settings
+        if self.storage.original_grayscale:
+            key = stage_key("grayscale", None)
         else:
-            self.storage.enhanced_image = grayscale_image
-            logger.debug("Enhanced is just grayscale")
+            key = stage_key(
+                "grayscale",
+                (self.grayscale_mode, sorted(self.grayscale_settings.items())),
+            )
+        plan = [("grayscale", key, self._grayscale_stage)]
+        for name, settings_of, run in ENHANCEMENTS:
+            stage_settings = settings_of(self.image_settings)
+            if stage_settings is None:
+                # off, the image just passes through
+                continue
+            key = stage_key(name, stage_settings, key)
+            plan.append((name, key, run))
+
+        # then back from the end to the last output there already is
+        image = None
+        first = 0
+        for i in range(len(plan) - 1, -1, -1):
+            image = cache.get(plan[i][1])
+            if image is not None:
+                first = i + 1
+                break
+        cached = image is not None
+
+        for name, key, run in plan[first:]:
+            if cached:
+                # the enhancements work in place, the cached one stays as is
+                image = image.copy()
+            image = run(image, self.image_settings, self.arena)
+            cached = cache.put(key, image)
+            logger.debug(f"Ran the {name} stage")
+
+        cache.pin("enhanced", key, image)
+        if image is not self.storage.enhanced_image:
+            self.storage.enhanced_image = image
+
+        key = stage_key("halftone", self._halftone_settings(), key)
+        processed_image = cache.get(key)
+        if processed_image is None:
+            processed_image = self._process_algorithm()
+            cache.put(key, processed_image)
+            logger.debug(f"Ran the halftone stage: {self.algorithm}")
+        cache.pin("processed", key, processed_image)
+        self.storage.processed_key = key
+        return processed_image
+
+    def _grayscale_stage(self, image, im_settings, arena):
+        # always a new array, the enhancements modify it
+        if self.storage.original_grayscale:
+            logger.debug("Skipping grayscale: Image is already grayscale.")
+            return self.storage.resized.copy()
+        logger.debug(f"Converted to grayscale via {self.grayscale_mode}")
+        return self._convert_to_grayscale(
+            self.storage.resized, self.grayscale_mode, self.grayscale_settings
+        )
+
+    def _halftone_settings(self):
+        # sorted, so the same settings from the GUI in another order are the
+        # same key
+        settings = (self.algorithm, sorted(self.settings.items()))
+        if self.algorithm in user_kernels():
+            # a kernel of the user can be edited under the same name
+            return settings, get_kernel(self.algorithm).tolist()
+        return settings
 
     def _process_algorithm(self):
         """Applies the processing algorithm if selected."""
@@ -160,7 +213,23 @@ class ImageProcessor:
             return None
 
         if self.algorithm != "None":
-            return self._apply_algorithm(source, self.algorithm, self.settings)
+            integrals = None
+            if (
+                self.algorithm in LOCAL_THRESHOLDS
+                and source is self.storage.enhanced_image
+                and not self.low_memory
+            ):
+                integrals = self.storage.integral_images(self.arena)
+            else:
+                self.storage.release_integral_images()
+            return self._apply_algorithm(
+                source,
+                self.algorithm,
+                self.settings,
+                integrals,
+                self.low_memory,
+                self.arena,
+            )
 
         if source.dtype == np.uint16:
             return (source >> 8).astype(np.uint8)
@@ -202,163 +271,43 @@ class ImageProcessor:
             return luminance(image, out_8bit=flag)
 
     @staticmethod
-    def _enhance_image(image, im_settings):
+    def _enhance_image(image, im_settings, arena=None):
         """
-        This is the method for image enchancements e.g. blurs.
+        This is the method for image enchancements e.g. blurs. Runs every
+        stage of ENHANCEMENTS that's on, in place. The temporaries come from
+        arena if there is one, or are allocated for this call only.
         """
-
         logger.debug(f"Image arrived ad Enhancement as {image.dtype}")
-
-        _brightness = im_settings["brightness"]
-        if _brightness > 0:
-            # using a log function makes the adjustment feel a bit more natural
-            _brightness = 5 * (
-                np.log(1 + (0.01 - 1) * _brightness) / np.log(0.01)
-            )
-        _brightness += 1
-
-        _contrast = im_settings["contrast"]
-        if _contrast > 0:
-            # using a log function makes the adjustment feel a bit more natural
-            _contrast = 5 * (np.log(1 + (0.01 - 1) * _contrast) / np.log(0.01))
-        _contrast += 1
-
-        if im_settings["normalize"]:
-            # nomalize comes from the cython_ops module and is much faster than cv2 lut
-            image = normalize(image, lut=True)
-            logger.debug(f"Image left Normalize as {image.dtype}")
-
-        if im_settings["equalize"]:
-            if image.dtype == np.uint8:
-                # cv2 is at least 2x faster for uint8
-                cv2.equalizeHist(image, dst=image)
-            else:
-                # unfortunately it does not support uint16 so we use a cython implementation
-                image = equalize(image)
-            logger.debug(f"Image left EQ as {image.dtype}")
-
-        if im_settings["bc_t"] and (_brightness != 1.0 or _contrast != 1.0):
-            alpha = float(_contrast)
-            if image.dtype == np.uint8:
-                scale = 255
-            else:
-                scale = 65535
-
-            beta = (scale / 2) * (1.0 - alpha) + (_brightness - 1.0) * scale
-            # addWeighted is much much faster than any implementation i could come up and it does support uint16 ootb
-            image = cv2.addWeighted(image, alpha, image, 0, beta, dst=image)
-            logger.debug(f"Image left Contrast as {image.dtype}")
-
-        if im_settings["blur_t"]:
-            _box = int(im_settings["box"])
-            _blur = int(im_settings["blur"])
-            _median = int(im_settings["median"])
-            if _median > 1:
-                # medianBlur only supports uint8
-                old_type = image.dtype
-                if image.dtype != np.uint8 and _median > 5:
-                    image = (image >> 8).astype(np.uint8)
-
-                cv2.medianBlur(image, ksize=_median, dst=image)
-
-                if old_type == np.uint16 and image.dtype != old_type:
-                    logger.debug("Casting back to uint16")
-                    image = image.astype(np.uint16) << 8
-
-            if _box > 1:
-                cv2.blur(image, ksize=(_box, _box), dst=image)
-            if _blur > 1:
-                if image.dtype == np.uint8:
-                    cv2.stackBlur(image, ksize=(_blur, _blur), dst=image)
-                else:
-                    # if using uint16 stackBlur returns an overflowed image at kernel size 25 and up. therefore the image is cast to a float and the calculations are done like so.
-                    img_f32 = image.astype(np.float32)
-                    cv2.stackBlur(img_f32, ksize=(_blur, _blur), dst=img_f32)
-                    # Slightly faster than casting and clipping with numpy, also a bit more memory efficient as we reuse the old array
-                    cast_f32_u16(img_f32, image)
-            logger.debug(f"Image left Blurs as {image.dtype}")
-
-        if im_settings["unsharp_t"]:
-            radius = im_settings["u_radius"] + 0.01
-            strength = float(im_settings["u_strength"] * 3)
-
-            if image.dtype == np.uint16:
-                thresh = (im_settings["u_thresh"] / 10) * 65535
-
-                blurred = cv2.GaussianBlur(image, ksize=(0, 0), sigmaX=radius)
-
-                # diff in int32 to prevent wrap-around
-                unsharp_mask = image.astype(np.int32) - blurred.astype(np.int32)
-
-                if thresh > 0:
-                    unsharp_mask[np.abs(unsharp_mask) < thresh] = 0
-
-                res = cv2.addWeighted(
-                    image.astype(np.float32),
-                    1.0,
-                    unsharp_mask.astype(np.float32),
-                    strength,
-                    0,
-                )
-                # clip and cast back to original buffer
-                cast_f32_u16(res, image)
-            else:
-                thresh = (im_settings["u_thresh"] / 10) * 255
-
-                blurred = cv2.GaussianBlur(image, ksize=(0, 0), sigmaX=radius)
-
-                # int16 should be enough
-                unsharp_mask = image.astype(np.int16) - blurred.astype(np.int16)
-
-                if thresh > 0:
-                    unsharp_mask[np.abs(unsharp_mask) < thresh] = 0
-
-                res = cv2.addWeighted(
-                    image.astype(np.float32),
-                    1.0,
-                    unsharp_mask.astype(np.float32),
-                    strength,
-                    0,
-                )
-                image[:] = np.clip(res, 0, 255).astype(np.uint8)
-            logger.debug(f"Image left Unsharp as {image.dtype}")
-
-        if im_settings["laplacian_t"]:
-            strength = float(im_settings["l_strength"])
-            size = int(im_settings["l_ksize"])
-            if image.dtype == np.uint16:
-                laplacian_mask = cv2.Laplacian(
-                    image, ddepth=cv2.CV_32F, ksize=size
-                )
-
-                res = cv2.addWeighted(
-                    image.astype(np.float32), 1.0, laplacian_mask, -strength, 0
-                )
-
-                cast_f32_u16(res, image)
-            else:
-                laplacian_mask = cv2.Laplacian(
-                    image, ddepth=cv2.CV_32F, ksize=size
-                )
-
-                res = cv2.addWeighted(
-                    image.astype(np.float32), 1.0, laplacian_mask, -strength, 0
-                )
-
-                image[:] = np.clip(res, 0, 255).astype(np.uint8)
-            logger.debug(f"Image left Laplacian as {image.dtype}")
-
+        if arena is None:
+            arena = BufferArena()
+        for _, settings_of, run in ENHANCEMENTS:
+            if settings_of(im_settings) is not None:
+                image = run(image, im_settings, arena)
         return image
 
     @staticmethod
-    def _apply_algorithm(image, algorithm, settings):
-        """Apply the selected halftoning algorithm to the image via worker_h."""
+    def _apply_algorithm(
+        image,
+        algorithm,
+        settings,
+        integrals=None,
+        low_memory=False,
+        arena=None,
+    ):
+        """
+        Apply the selected halftoning algorithm to the image via worker_h.
+        integrals are the integral images of the image for the local
+        thresholds, built here if not given, or streamed with low_memory.
+        The image in another bit depth goes into a scratch array of arena.
+        """
+        if arena is None:
+            arena = BufferArena()
         image_dtype = image.dtype
         logger.debug(f"Image arrived for processing as {image_dtype}")
         if algorithm == "Fixed threshold":
             # demote to uint8. no visual differences found.
             if image_dtype == np.uint16:
-                image = (image >> 8).astype(np.uint8)
+                image = _downshift(image, arena)
             elif image_dtype in (np.float64, np.float32, np.float16):
                 image = (image * 255).astype(np.uint8)
             processed_image = threshold(image, settings)
@@ -369,60 +318,67 @@ class ImageProcessor:
         elif algorithm == "Niblack threshold":
             # demote to uint8. no visual differences found.
             if image_dtype == np.uint16:
-                image = (image >> 8).astype(np.uint8)
-            processed_image = niblack_threshold(image, settings)
+                image = _downshift(image, arena)
+            processed_image = niblack_threshold(
+                image, settings, integrals, low_memory
+            )
 
         elif algorithm == "Sauvola threshold":
             # demote to uint8. no visual differences found.
             if image_dtype == np.uint16:
-                image = (image >> 8).astype(np.uint8)
-            processed_image = sauvola_threshold(image, settings)
+                image = _downshift(image, arena)
+            processed_image = sauvola_threshold(
+                image, settings, integrals, low_memory
+            )
 
         elif algorithm == "Phansalkar threshold":
             # demote to uint8. no visual differences found.
             if image_dtype == np.uint16:
-                image = (image >> 8).astype(np.uint8)
-            processed_image = phansalkar_threshold(image, settings)
+                image = _downshift(image, arena)
+            processed_image = phansalkar_threshold(
+                image, settings, integrals, low_memory
+            )
 
         elif algorithm == "Mezzotint uniform":
-            if image_dtype == np.uint16:
-                image = (image >> 8).astype(np.uint8)
+            # 16 bit is dithered natively, see mezzo.py
             processed_image = mezzo(image, settings, mode="uniform")
 
         elif algorithm == "Mezzotint normal":
             processed_image = mezzo(image, settings, mode="gauss")
 
         elif algorithm == "Mezzotint beta":
-            # TODO: get that working
             processed_image = mezzo(image, settings, mode="beta")
 
         elif algorithm == "Clustered dot":
-            if image_dtype == np.uint16:
-                image = (image >> 8).astype(np.uint8)
+            # 16 bit is dithered natively, with a 16 bit matrix
             processed_image = clustered(image, settings)
 
         elif algorithm == "Bayer":
-            # TODO: Handling 16bit may be beneficial in some cases.
-            if image_dtype == np.uint16:
-                image = (image >> 8).astype(np.uint8)
             processed_image = bayer(image, settings)
 
-        elif algorithm in [
-            "Floyd-Steinberg",
-            "False Floyd-Steinberg",
-            "Jarvis",
-            "Stucki",
-            "Stucki small",
-            "Stucki large",
-            "Atkinson",
-            "Burkes",
-            "Sierra",
-            "Sierra2",
-            "Sierra2 4A",
-        ]:
+        elif algorithm == "Blue noise":
+            processed_image = blue_noise(image, settings)
+
+        elif (
+            algorithm
+            in [
+                "Floyd-Steinberg",
+                "False Floyd-Steinberg",
+                "Jarvis",
+                "Stucki",
+                "Stucki small",
+                "Stucki large",
+                "Atkinson",
+                "Burkes",
+                "Sierra",
+                "Sierra2",
+                "Sierra2 4A",
+            ]
+            or algorithm in user_kernels()
+        ):
             # Expanding seems to give much better results in high contrast images and does not seem to slow the processing too much, so keeping it like that. Also saves me a bit of work on making a separate uint8 version.
             if image.dtype == np.uint8:
-                image = (image).astype(np.uint16) << 8
+                image = _expand(image, arena)
             kernel = get_kernel(algorithm)
             processed_image = error_diffusion(
                 image, kernel, settings, algorithm
@@ -431,13 +387,13 @@ class ImageProcessor:
         elif algorithm in ["Ostromoukhov", "Zhou-Fang"]:
             # Expanding seems to give much better results in high contrast images and does not seem to slow the processing too much, so keeping it like that. Also saves me a bit of work on making a separate uint8 version.
             if image.dtype == np.uint8:
-                image = (image).astype(np.uint16) << 8
+                image = _expand(image, arena)
             processed_image = variable_ed(image, algorithm, settings)
 
         elif algorithm in ["Levien", "Nakano"]:
             # Expanding seems to give much better results in high contrast images and does not seem to slow the processing too much, so keeping it like that. Also saves me a bit of work on making a separate uint8 version.
             if image.dtype == np.uint8:
-                image = (image).astype(np.uint16) << 8
+                image = _expand(image, arena)
             processed_image = edodf(image, algorithm, settings)
 
         elif algorithm == "None":
@@ -468,3 +424,188 @@ class ImageProcessor:
 
     def _delayed_method_call(self, method, args, kwargs):
         method(self, *args, **kwargs)
+
+
+# --- Enhancement stages ---
+# every stage has a function that returns the settings its output depends on,
+# None if it's off, and one that runs it on an image it may modify, with the
+# scratch arrays of a BufferArena. cv2 is imported in the stages as it is only
+# needed for the enhancements and takes a good part of the startup time of a
+# worker otherwise.
+
+
+def _tone_settings(im_settings):
+    bc = brightness_contrast(im_settings)
+    if not (im_settings["normalize"] or im_settings["equalize"] or bc):
+        return None
+    return bool(im_settings["normalize"]), bool(im_settings["equalize"]), bc
+
+
+def _tone(image, im_settings, arena):
+    # normalize, equalize and brightness / contrast are a single lut
+    image = adjust_tone(image, im_settings)
+    logger.debug(f"Image left the tone curve as {image.dtype}")
+    return image
+
+
+def _median_settings(im_settings):
+    # the values are only read once the blurs are on, the GUI doesn't send
+    # them before the adjustments were touched
+    if not im_settings["blur_t"]:
+        return None
+    _median = int(im_settings.get("median", 1))
+    if _median <= 1:
+        return None
+    return _median, bool(im_settings.get("median_exact", False))
+
+
+def _median(image, im_settings, arena):
+    import cv2
+
+    _median = int(im_settings["median"])
+    exact = im_settings.get("median_exact", False)
+    if image.dtype == np.uint8 or _median <= 5:
+        cv2.medianBlur(image, ksize=_median, dst=image)
+    elif exact and _median <= 255:
+        # all 16 bits, but several times slower than the round trip below
+        filtered = arena.get("median", image.shape, image.dtype)
+        median(image, _median, out=filtered)
+        np.copyto(image, filtered)
+    else:
+        # medianBlur only supports uint8 for the bigger kernels
+        small = _downshift(image, arena)
+        cv2.medianBlur(small, ksize=_median, dst=small)
+        np.copyto(image, small)
+        image <<= 8
+    return image
+
+
+def _blur_settings(im_settings):
+    if not im_settings["blur_t"]:
+        return None
+    _box = int(im_settings.get("box", 0))
+    _blur = int(im_settings.get("blur", 0))
+    if _box <= 1 and _blur <= 1:
+        return None
+    return _box, _blur
+
+
+def _blur(image, im_settings, arena):
+    import cv2
+
+    _box = int(im_settings.get("box", 0))
+    _blur = int(im_settings.get("blur", 0))
+    if _box > 1:
+        cv2.blur(image, ksize=(_box, _box), dst=image)
+    if _blur > 1:
+        if image.dtype == np.uint8:
+            # stackBlur can't work in place, up to a kernel size of 9 it
+            # reads pixels it has already blurred
+            blurred = arena.get("blurred", image.shape, image.dtype)
+            cv2.stackBlur(image, ksize=(_blur, _blur), dst=blurred)
+            np.copyto(image, blurred)
+        else:
+            # stackBlur overflows for uint16 from a kernel size of 25 on, our
+            # own sums in integers and works in place
+            stack_blur(image, _blur)
+    logger.debug(f"Image left Blurs as {image.dtype}")
+    return image
+
+
+def _unsharp_settings(im_settings):
+    if not im_settings["unsharp_t"]:
+        return None
+    return (
+        im_settings["u_radius"],
+        im_settings["u_strength"],
+        im_settings["u_thresh"],
+    )
+
+
+def _unsharp(image, im_settings, arena):
+    import cv2
+
+    radius = im_settings["u_radius"] + 0.01
+    strength = float(im_settings["u_strength"] * 3)
+    max_val = 65535 if image.dtype == np.uint16 else 255
+    thresh = (im_settings["u_thresh"] / 10) * max_val
+
+    blurred = arena.get("blurred", image.shape, image.dtype)
+    cv2.GaussianBlur(image, ksize=(0, 0), sigmaX=radius, dst=blurred)
+
+    # the difference is exact in float32 for both bit depths, so it's taken
+    # there right away instead of through int32 (int16 for uint8)
+    unsharp_mask = arena.get("mask", image.shape, np.float32)
+    np.subtract(image, blurred, out=unsharp_mask, dtype=np.float32)
+
+    img_f32 = arena.get("image_f32", image.shape, np.float32)
+    if thresh > 0:
+        # img_f32 holds the absolute values until it holds the image
+        small = arena.get("small", image.shape, np.bool_)
+        np.less(np.abs(unsharp_mask, out=img_f32), thresh, out=small)
+        np.copyto(unsharp_mask, 0, where=small)
+
+    np.copyto(img_f32, image)
+    res = cv2.addWeighted(img_f32, 1.0, unsharp_mask, strength, 0, dst=img_f32)
+    _store_f32(res, image)
+    logger.debug(f"Image left Unsharp as {image.dtype}")
+    return image
+
+
+def _laplacian_settings(im_settings):
+    if not im_settings["laplacian_t"]:
+        return None
+    return im_settings["l_strength"], int(im_settings["l_ksize"])
+
+
+def _laplacian(image, im_settings, arena):
+    import cv2
+
+    strength = float(im_settings["l_strength"])
+    size = int(im_settings["l_ksize"])
+    laplacian_mask = arena.get("mask", image.shape, np.float32)
+    cv2.Laplacian(image, ddepth=cv2.CV_32F, dst=laplacian_mask, ksize=size)
+
+    img_f32 = arena.get("image_f32", image.shape, np.float32)
+    np.copyto(img_f32, image)
+    res = cv2.addWeighted(
+        img_f32, 1.0, laplacian_mask, -strength, 0, dst=img_f32
+    )
+    _store_f32(res, image)
+    logger.debug(f"Image left Laplacian as {image.dtype}")
+    return image
+
+
+def _store_f32(res, image):
+    # clip and cast back to original buffer
+    if image.dtype == np.uint16:
+        cast_f32_u16(res, image)
+    else:
+        # truncated, like astype(np.uint8) did
+        np.clip(res, 0, 255, out=res)
+        np.copyto(image, res, casting="unsafe")
+
+
+def _downshift(image, arena):
+    # a uint16 image as uint8, in a scratch array
+    small = arena.get("small_u8", image.shape, np.uint8)
+    np.right_shift(image, 8, out=small, casting="unsafe")
+    return small
+
+
+def _expand(image, arena):
+    # a uint8 image as uint16, in a scratch array
+    wide = arena.get("wide_u16", image.shape, np.uint16)
+    np.copyto(wide, image)
+    wide <<= 8
+    return wide
+
+
+# the enhancement stages in the order they run, as (name, settings, run)
+ENHANCEMENTS = (
+    ("tone", _tone_settings, _tone),
+    ("median", _median_settings, _median),
+    ("blur", _blur_settings, _blur),
+    ("unsharp", _unsharp_settings, _unsharp),
+    ("laplacian", _laplacian_settings, _laplacian),
+)
@@ -5,21 +5,25 @@ from multiprocessing.shared_memory import SharedMemory
 from pathlib import Path
 from urllib.parse import unquote, urlparse
 
-import cv2
 import numpy as np
-import requests
-from platformdirs import user_pictures_dir
-from PySide6.QtGui import QPixmap
 
-from hopfer.helpers.image_conversion import numpy_to_pixmap
-
-try:
-    from hopfer.core.algorithms.cython_ops import style_alpha, style_image
-except ImportError:
-    from hopfer.core.algorithms.numba_ops import style_alpha, style_image
+from hopfer.core.algorithms.cython_ops import integral_images
+from hopfer.core.image_io import (
+    decode_image,
+    read_image,
+    split_channels,
+    write_image,
+)
+from hopfer.core.packed_bits import PackedBits
+from hopfer.core.stages import StageCache, stage_key
 
 logger = logging.getLogger(__name__)
 
+# NOTE: nothing in here should import PySide6 (or anything else heavy) at
+# module level. the daemon and any worker processes import this module, and
+# with spawn every one of them would pay for it on startup. that goes for cv2
+# as well, it's imported where it's used.
+
 
 class ImageStorage:
     """
@@ -52,13 +56,20 @@ class ImageStorage:
 
         self.original_image = None  # uint16
         self.original_grayscale = False
+        # the outputs of the processing stages, see stages.py
+        self.stage_cache = StageCache()
+        # the key of the processed image in it, None once it's transformed
+        self.processed_key = None
         self.resized = None  # uint16
         # self.grayscale_image = None  # uint16
+        # bumped whenever enhanced_image is replaced, see integral_images
+        self.enhanced_version = 0
+        self._integrals = None
         self.enhanced_image = None  # uint16
         self.alpha = None  # uint8
         self.ignore_alpha = False
         self.edited_image = None
-        self.processed_image = None  # bool
+        self.processed_image = None  # PackedBits, uint8 for "None"
 
         self.color_dark = np.array((28, 27, 31)).astype(np.uint8)
         self.color_light = np.array((255, 255, 255)).astype(np.uint8)
@@ -67,6 +78,66 @@ class ImageStorage:
         self.reset_view = True
         self.algorithm = "None"
 
+    @property
+    def resized(self):
+        return self._resized
+
+    @resized.setter
+    def resized(self, image):
+        # everything the stages cached was made from the old one
+        self._resized = image
+        self.stage_cache.clear()
+        self.processed_key = None
+        # the scratch arrays are of the old size as well, the daemon only has
+        # a processor once the storage is set up
+        processor = getattr(self.daemon, "processor", None)
+        if processor is not None:
+            processor.arena.release()
+
+    @property
+    def enhanced_image(self):
+        return self._enhanced_image
+
+    @enhanced_image.setter
+    def enhanced_image(self, image):
+        # the enhanced image is only ever replaced, never modified in place,
+        # so anything derived from it stays valid until this runs again.
+        # the integral images are stale then, but their arrays are kept to
+        # be built into again.
+        self._enhanced_image = image
+        self.enhanced_version += 1
+
+    def integral_images(self, arena=None):
+        """
+        The integral images of the enhanced image for the local thresholds,
+        from the same uint8 image they threshold. Built on the first call
+        after the enhanced image changed, so moving just the sliders of a
+        threshold doesn't rebuild them. A rebuild of the same size reuses the
+        arrays, the uint8 image is a scratch array of arena if given.
+        """
+        version = self.enhanced_version
+        if self._integrals is None or self._integrals[0] != version:
+            image = self.enhanced_image
+            if image.dtype == np.uint16:
+                small = (
+                    np.empty(image.shape, np.uint8)
+                    if arena is None
+                    else arena.get("small_u8", image.shape, np.uint8)
+                )
+                image = np.right_shift(image, 8, out=small, casting="unsafe")
+            out = None
+            if self._integrals is not None:
+                out = self._integrals[1]
+                if out[0].shape != (image.shape[0] + 1, image.shape[1] + 1):
+                    # a new size, the old ones go first
+                    self._integrals = out = None
+            self._integrals = (version, integral_images(image, out=out))
+        return self._integrals[1]
+
+    def release_integral_images(self):
+        # they take 12 bytes per pixel, not worth keeping for other algorithms
+        self._integrals = None
+
     def create_shm(self, height, width):
         if self.shm is not None:
             self.shm.close()
@@ -151,7 +222,7 @@ class ImageStorage:
 
         try:
             logger.debug("Started processing")
-            self.daemon.processor.start(step=0)
+            self.daemon.processor.start()
         except Exception as e:
             logger.warning(f"Failed processing: {e}")
 
@@ -162,11 +233,7 @@ class ImageStorage:
         :param image_path: Path to the image file to load.
         """
 
-        cv_image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
-
-        if cv_image is None:
-            file_bytes = np.fromfile(image_path, dtype=np.uint8)
-            cv_image = cv2.imdecode(file_bytes, cv2.IMREAD_UNCHANGED)
+        cv_image = read_image(image_path)
 
         if cv_image is not None:
             self._load(cv_image)
@@ -193,10 +260,11 @@ class ImageStorage:
                 url = local_path
                 self.load_image(url)
             else:
+                import requests
+
                 response = requests.get(url)
                 if response.status_code == 200:
-                    image_data = np.frombuffer(response.content, np.uint8)
-                    cv_image = cv2.imdecode(image_data, cv2.IMREAD_UNCHANGED)
+                    cv_image = decode_image(response.content)
                     self._load(cv_image)
 
                 else:
@@ -214,15 +282,6 @@ class ImageStorage:
         message = {"type": "load_failed"}
         self.res_queue.put(message)
 
-    @staticmethod
-    def discard_alpha(alpha):
-        # discard the alpha channel if its full of equal numbers
-        # to save on furher processing.
-        if np.all(alpha == alpha[0, 0]):
-            return None
-        else:
-            return alpha
-
     def extract_alpha(self, image):
         """
         Extracts alpha and color/grayscale channels from an OpenCV image based on its channels.
@@ -230,10 +289,6 @@ class ImageStorage:
         """
 
         np_image_uint16 = self.image_to_uint16(image)
-        if len(np_image_uint16.shape) == 2:
-            num_channels = 1
-        else:
-            num_channels = np_image_uint16.shape[-1]
 
         h, w = np_image_uint16.shape[0], np_image_uint16.shape[1]
 
@@ -241,68 +296,15 @@ class ImageStorage:
             {"type": "image_size", "height": h, "width": w, "ratio": h / w},
             block=False,
         )
-        if num_channels == 1:
-            logger.debug("Image has 1 channel")
-            L = np_image_uint16
-            A = None
-            self.original_grayscale = True
-            return L, A
-
-        elif num_channels == 2:
-            # This one is never used as cv2 converts them automatically to RGBA
-            logger.debug("Image has 2 channels")
-            L = np_image_uint16[:, :, 0]
-            A = (self.discard_alpha(np_image_uint16[:, :, 1]) >> 8).astype(
-                np.uint8
-            )
 
-            cv2.imwrite("test_alpha.png", A)
-            logger.debug("Saved alpha as an image")
-
-            self.original_grayscale = True
-            return L, A
-
-        elif num_channels == 3:
-            logger.debug("Image has 3 channels")
-            BGR = np_image_uint16
-            RGB = self.bgr_to_rgb(BGR)
-            A = None
-
-            # Check for grayscale conversion and status update
-            RGB, is_gray = self.check_grayscale(RGB)
-
-            self.original_grayscale = is_gray
-            return RGB, A  # Color_BGR is (H, W, 3), A is None
-
-        elif num_channels == 4:
-            logger.debug("Image has 4 channels")
-            BGR = np_image_uint16[:, :, :3]
-            RGB = self.bgr_to_rgb(BGR)
-            # TODO: Fix the logic here so that the alpha is 16bit if needed
-
-            alpha_tmp = self.discard_alpha(np_image_uint16[:, :, 3])
-
-            if alpha_tmp is not None:
-                if alpha_tmp.dtype == np.uint16:
-                    A = (alpha_tmp >> 8).astype(np.uint8)
-                else:
-                    A = alpha_tmp
-            else:
-                A = None
-
-            # Check for grayscale conversion and status update
-            RGB, is_gray = self.check_grayscale(RGB)
-
-            self.original_grayscale = is_gray
-            return RGB, A
-
-        else:
+        try:
+            image, alpha, is_gray = split_channels(np_image_uint16)
+        except ValueError:
             self.show_notification("Unsupported number of channels")
+            return None, None
 
-    @staticmethod
-    def bgr_to_rgb(image):
-        RGB = image[:, :, ::-1]
-        return RGB
+        self.original_grayscale = is_gray
+        return image, alpha
 
     @staticmethod
     def image_to_uint16(image):
@@ -313,19 +315,9 @@ class ImageStorage:
 
         return image
 
-    @staticmethod
-    def check_grayscale(rgb):
-        """This is just a small function to check if an RGB image is actually grayscale. It saves time and resources on converting it to grayscale later on. Turns out using numpy's array_equal is much faster."""
-
-        if np.array_equal(rgb[:, :, 0], rgb[:, :, 1]) and np.array_equal(
-            rgb[:, :, 0], rgb[:, :, 2]
-        ):
-            r = np.copy(rgb[:, :, 0])
-            return r, True
-        else:
-            return rgb, False
-
     def resize_original(self, w, h, interpolation):
+        import cv2
+
         resized = self.original_image.copy()
 
         if interpolation.lower() == "nearest neighbor":
@@ -352,7 +344,7 @@ class ImageStorage:
 
         try:
             self.daemon.processor.reset = True
-            self.daemon.processor.start(step=0)
+            self.daemon.processor.start()
         except Exception as e:
             logger.error(f"Failed processing: {e}")
 
@@ -373,6 +365,8 @@ class ImageStorage:
         save_path = path
 
         if not save_path:
+            from platformdirs import user_pictures_dir
+
             base_path = user_pictures_dir()
             save_path = os.path.join(base_path, "hopfer.png")
 
@@ -380,12 +374,15 @@ class ImageStorage:
         base_name = os.path.basename(save_path)
         save_path = self.generate_unique_save_path(base_path, base_name)
 
-        if self.save_like_preview and self.daemon.processor.algorithm != "None":
-            image = style_image(
-                self.processed_image, self.color_dark, self.color_light
+        packed = isinstance(self.processed_image, PackedBits)
+        if self.save_like_preview and packed:
+            image = self.processed_image.style(
+                self.color_dark, self.color_light
             )
         else:
-            image = self.processed_image.astype(np.uint8) * 255
+            # cv2 can only encode a byte per pixel, so this is the one place
+            # the halftone gets unpacked
+            image = self._unpacked()
 
         if self.ignore_alpha or self.alpha is None:
             output_image = image
@@ -403,6 +400,8 @@ class ImageStorage:
                 alpha = output_image[:, :, 1]
 
                 # Convert grayscale → BGR
+                import cv2
+
                 bgr = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
 
                 # Rebuild BGRA
@@ -416,15 +415,7 @@ class ImageStorage:
                 output_image = output_image[:, :, [2, 1, 0, 3]]
 
         try:
-            success = cv2.imwrite(save_path, output_image)
-            if not success:
-                # HACK: used numpy to bypass windows problems with non-latin encoding of folder and file names
-                ext = os.path.splitext(save_path)[1]
-                np_success, buffer = cv2.imencode(ext, output_image)
-
-                if np_success:
-                    buffer.tofile(save_path)
-
+            write_image(save_path, output_image)
         except Exception as e:
             self.show_notification(f"Error: {e}", duration=10000)
             return
@@ -525,9 +516,9 @@ class ImageStorage:
             if processor.algorithm == "None":
                 return self._handle_no_algorithm(reset, clipboard)
 
-            result = self._process_image(compositing, styled)
             if clipboard:
-                return result
+                return self._process_image(compositing, styled)
+            result = self._styled_preview(compositing, styled)
 
             self.shm_preview[:] = result
             self.res_queue.put(
@@ -537,6 +528,28 @@ class ImageStorage:
 
             processor.processing = False
 
+    def _styled_preview(self, compositing, styled):
+        # the style stage, cached like the others as long as the processed
+        # image is the one of its key
+        if self.processed_key is None:
+            return self._process_image(compositing, styled)
+        key = stage_key(
+            "style",
+            (
+                compositing,
+                styled,
+                self.color_dark.tobytes(),
+                self.color_light.tobytes(),
+                self.color_alpha.tobytes(),
+            ),
+            self.processed_key,
+        )
+        result = self.stage_cache.get(key)
+        if result is None:
+            result = self._process_image(compositing, styled)
+            self.stage_cache.put(key, result)
+        return result
+
     def _handle_no_algorithm(self, reset, clipboard):
         # Handles the case when "None" is the algo
         try:
@@ -566,20 +579,19 @@ class ImageStorage:
         if self.alpha is not None:
             return self._apply_styling_with_alpha(compositing, *color_params)
 
-        return style_image(self.processed_image, *color_params[:2])
+        return self.processed_image.style(*color_params[:2])
 
     def _apply_styling_with_alpha(
         self, compositing, color_dark, color_light, color_alpha
     ):
         logger.debug(
-            f"Alpha styling image of dtype: {self.processed_image.dtype}"
+            f"Alpha styling image of shape: {self.processed_image.shape}"
         )
         logger.debug(f"Alpha channel of dtype: {self.alpha.dtype}")
         # Applies the styling and composits
         if compositing:
             try:
-                return style_alpha(
-                    self.processed_image,
+                return self.processed_image.style_alpha(
                     self.alpha,
                     color_dark,
                     color_light,
@@ -588,13 +600,13 @@ class ImageStorage:
             except Exception as e:
                 logger.error(f"Failed compositing {e}")
 
-        styled_img = style_image(self.processed_image, color_dark, color_light)
+        styled_img = self.processed_image.style(color_dark, color_light)
         alpha = self.alpha
         return np.dstack((styled_img, alpha))
 
     def _convert_to_uint8(self):
         # Cenverts to uint8 and adds alpha
-        img_uint8 = self.processed_image.astype(np.uint8) * 255
+        img_uint8 = self._unpacked()
 
         if self.alpha is not None:
             alpha = self.alpha
@@ -602,6 +614,12 @@ class ImageStorage:
 
         return img_uint8
 
+    def _unpacked(self):
+        # the halftones are packed, the "None" result is already uint8
+        if isinstance(self.processed_image, PackedBits):
+            return self.processed_image.unpack(255)
+        return self.processed_image
+
     def _get_image_pixmap(self, image_array):
         """
         Helper method to convert an image array to QPixmap.
@@ -609,6 +627,11 @@ class ImageStorage:
         :param image_array: Image in NumPy array format.
         :return: QPixmap object corresponding to the image array.
         """
+        # Qt is imported only here, so the daemon can run without it.
+        from PySide6.QtGui import QPixmap
+
+        from hopfer.helpers.image_conversion import numpy_to_pixmap
+
         if image_array is not None:
             return numpy_to_pixmap(image_array)
         else:
@@ -624,11 +647,14 @@ class ImageStorage:
         self.processed_image = processed_image
 
     def rotate_image(self, cw=True):
+        enhanced_key = self.stage_cache.pinned("enhanced")
         if cw:
             self.original_image = np.rot90(self.original_image, k=-1)
             self.resized = np.rot90(self.resized, k=-1)
             self.enhanced_image = np.rot90(self.enhanced_image, k=-1)
-            self.processed_image = np.rot90(self.processed_image, k=-1)
+            self.processed_image = self._transform(
+                lambda img: img.rot90(-1), lambda img: np.rot90(img, k=-1)
+            )
             if self.alpha is not None:
                 self.alpha = np.rot90(self.alpha, k=-1)
             self.shm_preview = np.rot90(self.shm_preview, k=-1)
@@ -636,7 +662,9 @@ class ImageStorage:
             self.original_image = np.rot90(self.original_image, k=1)
             self.resized = np.rot90(self.resized, k=1)
             self.enhanced_image = np.rot90(self.enhanced_image, k=1)
-            self.processed_image = np.rot90(self.processed_image, k=1)
+            self.processed_image = self._transform(
+                lambda img: img.rot90(1), lambda img: np.rot90(img, k=1)
+            )
             if self.alpha is not None:
                 self.alpha = np.rot90(self.alpha, k=1)
             # if os.name != "nt":
@@ -648,35 +676,51 @@ class ImageStorage:
         )
 
         # while this does not produce accurate results for the dithering it is much faster than reprocessing the image on each transform. the halftoning would be accurate again on the next reprocess.
+        self._keep_enhanced(enhanced_key)
         self.reset_view = True
 
     def flip_image(self):
+        enhanced_key = self.stage_cache.pinned("enhanced")
         self.original_image = np.fliplr(self.original_image)
         self.resized = np.fliplr(self.resized)
         # self.grayscale_image = np.fliplr(self.grayscale_image)
         self.enhanced_image = np.fliplr(self.enhanced_image)
-        self.processed_image = np.fliplr(self.processed_image)
+        self.processed_image = self._transform(PackedBits.fliplr, np.fliplr)
         if self.alpha is not None:
             self.alpha = np.fliplr(self.alpha)
 
         # while this does not produce accurate results for the dithering it is much faster than reprocessing the image on each transform. the halftoning would be accurate again on the next reprocess.
+        self._keep_enhanced(enhanced_key)
+
+    def _keep_enhanced(self, key):
+        # a new resized image clears the stage cache, but the enhanced image
+        # was transformed along with it and is still used for the next
+        # halftone, like before the transform
+        if key is not None:
+            self.stage_cache.pin("enhanced", key, self.enhanced_image)
+
+    def _transform(self, packed, unpacked):
+        # applies the right version of a transform to the processed image
+        if isinstance(self.processed_image, PackedBits):
+            return packed(self.processed_image)
+        return unpacked(self.processed_image)
 
     def invert_image(self):
-        if self.original_image.dtype == np.uint16:
-            self.original_image = 65535 - self.original_image
-            self.resized = 65535 - self.resized
-            self.enhanced_image = 65535 - self.enhanced_image
-        else:
-            self.original_image = 255 - self.original_image
-            self.resized = 255 - self.resized
-            self.enhanced_image = 255 - self.enhanced_image
+        # the bitwise not of an unsigned int is its max minus it, and it's
+        # done in place instead of in three new arrays. the enhanced image
+        # still goes through its setter, its integral images are stale now.
+        enhanced_key = self.stage_cache.pinned("enhanced")
+        self.original_image = _invert(self.original_image)
+        self.resized = _invert(self.resized)
+        self.enhanced_image = _invert(self.enhanced_image)
 
         logger.debug(f"Enhanced image: {self.enhanced_image.dtype}")
-        logger.debug(f"Processed image: {self.processed_image.dtype}")
-        if self.processed_image.dtype == np.uint8:
+        if isinstance(self.processed_image, PackedBits):
+            # no need to unpack, every byte is just inverted
+            self.processed_image.invert()
+        elif self.processed_image.dtype == np.uint8:
             self.processed_image = 255 - self.processed_image
-        elif self.processed_image.dtype in [np.bool, np.bool_]:
-            np.logical_not(self.processed_image, out=self.processed_image)
+        self._keep_enhanced(enhanced_key)
 
         # It may be a bit of a personal preference, but i don't believe
         # the view should be reset after inverting the colors.
@@ -691,3 +735,10 @@ class ImageStorage:
             "duration": duration,
         }
         self.res_queue.put(message)
+
+
+def _invert(image):
+    # a loaded image may be read only, that one is inverted into a new array
+    if image.flags.writeable:
+        return np.invert(image, out=image)
+    return np.invert(image)
@@ -0,0 +1,105 @@
+"""
+The halftones as packed bits, 8 pixels per byte.
+
+All of the halftoning cython_ops write their result like this, see bits.pxi
+for the layout. It is the same as np.packbits(img, axis=1), so numpy can
+always read it as well.
+"""
+
+import numpy as np
+
+from hopfer.core.algorithms.cython_ops import (
+    pack_bits,
+    style_alpha_bits,
+    style_bits,
+    unpack_bits,
+)
+
+# every byte with its bits in reverse order, used for flipping
+_REVERSED = np.array(
+    [int(f"{i:08b}"[::-1], 2) for i in range(256)], dtype=np.uint8
+)
+
+
+class PackedBits:
+    """
+    A 1 bit image. Takes an 8th of the memory of a bool array and is styled,
+    inverted and flipped without being unpacked.
+
+    Args:
+        data (np.ndarray): The packed rows, a 2d uint8 array.
+        width (int): The width of the image in pixels.
+    """
+
+    __slots__ = ("data", "width")
+
+    def __init__(self, data, width):
+        self.data = data
+        self.width = int(width)
+
+    @classmethod
+    def pack(cls, img):
+        """Packs a 2d bool array."""
+        return cls(pack_bits(img), img.shape[1])
+
+    @property
+    def height(self):
+        return self.data.shape[0]
+
+    @property
+    def shape(self):
+        return (self.data.shape[0], self.width)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def __getitem__(self, rows):
+        # only whole rows can be sliced without unpacking
+        if not isinstance(rows, slice):
+            raise TypeError("PackedBits can only be sliced by rows")
+        return PackedBits(self.data[rows], self.width)
+
+    def __array__(self, dtype=None, copy=None):
+        # so np.asarray() still gives the bool array the halftones used to be
+        img = self.unpack().view(np.bool_)
+        return img if dtype is None else img.astype(dtype)
+
+    def unpack(self, one=1):
+        """
+        Returns a uint8 array with `one` for every set pixel and 0 for the
+        rest. 255 gives an image that can be saved directly.
+        """
+        return unpack_bits(self.data, self.width, one)
+
+    def style(self, color_dark, color_light):
+        """Returns an RGB image in the two colors."""
+        return style_bits(self.data, self.width, color_dark, color_light)
+
+    def style_alpha(self, alpha, color_dark, color_light, color_alpha):
+        """Same as style, but composited over color_alpha."""
+        return style_alpha_bits(
+            self.data, self.width, alpha, color_dark, color_light, color_alpha
+        )
+
+    def invert(self):
+        """Inverts the image in place."""
+        np.invert(self.data, out=self.data)
+        return self
+
+    def fliplr(self):
+        data = _REVERSED[self.data[:, ::-1]]
+        # the padding is now at the start of the rows, so they are shifted
+        # left by it.
+        pad = self.data.shape[1] * 8 - self.width
+        if pad:
+            shifted = data << pad
+            shifted[:, :-1] |= data[:, 1:] >> (8 - pad)
+            data = shifted
+        return PackedBits(data, self.width)
+
+    def rot90(self, k=1):
+        # rotating moves bits between rows, which is a lot simpler unpacked.
+        # it's only done on user input, so the short lived copy is fine.
+        img = np.rot90(self.unpack(), k=k)
+        return PackedBits.pack(np.ascontiguousarray(img))
@@ -171,6 +171,10 @@ class QueueWriter(QObject):
         message = {"type": "ignore_alpha", "value": value}
         self.queue.put(message)
 
+    def send_low_memory(self, value):
+        message = {"type": "low_memory", "value": value}
+        self.queue.put(message)
+
     def resize(self, width, height, interpolation):
         message = {
             "type": "resize",
@@ -0,0 +1,122 @@
+"""
+The outputs of the processing stages, kept between runs.
+
+The processing is a chain of stages: grayscale, tone, median, blur, unsharp,
+laplacian, halftone and style. Every output is cached under a key made of the
+settings of its stage and the key of the stage before it, so a key stands for
+everything that went into the output. A change to a stage only gives new keys
+from there on, and everything upstream of it is found in the cache instead of
+being run again. Going back to settings used before finds the rest as well.
+
+The cache is an LRU with a budget in bytes. The enhanced and the processed
+image of the last run are pinned on top of that, the storage keeps them
+anyway, so a halftone slider never runs the enhancements again, even with a
+budget of 0.
+"""
+
+import hashlib
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# the default budget. a 12 MP image is 24 MB per stage in 16 bit.
+STAGE_CACHE_BYTES = 512 * 2**20
+
+
+def stage_key(name, settings, upstream=None):
+    """
+    The key of the output of a stage.
+
+    Args:
+        name (str): The stage.
+        settings: Everything of the stage its output depends on, hashed with
+            repr(), so it has to repr() the same for the same settings.
+        upstream (str): The key of the stage before it, None for the first.
+    """
+    key = repr((name, settings, upstream))
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def nbytes(value):
+    """The memory a stage output takes, PackedBits included."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    # PackedBits
+    return value.data.nbytes
+
+
+class StageCache:
+    """
+    The stage outputs by key, least recently used first. The outputs are
+    shared, nothing may modify them in place.
+
+    Args:
+        budget (int): The bytes the cache may hold, pinned outputs aside.
+    """
+
+    def __init__(self, budget=STAGE_CACHE_BYTES):
+        self._entries = OrderedDict()
+        self._pinned = {}
+        self.nbytes = 0
+        self._budget = budget
+
+    @property
+    def budget(self):
+        return self._budget
+
+    @budget.setter
+    def budget(self, budget):
+        self._budget = budget
+        self._evict()
+
+    def get(self, key):
+        """The output cached under key, None if there is none."""
+        for pinned_key, value in self._pinned.values():
+            if pinned_key == key:
+                return value
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        """
+        Caches an output, evicting the least recently used ones. Returns
+        whether it was kept, it isn't if it's bigger than the budget.
+        """
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        size = nbytes(value)
+        self._entries[key] = (value, size)
+        self.nbytes += size
+        self._evict()
+        return key in self._entries
+
+    def pin(self, name, key, value):
+        """
+        Keeps the output of a stage until the next one of the same name is
+        pinned, no matter the budget.
+        """
+        self._pinned[name] = (key, value)
+
+    def pinned(self, name):
+        """The key of the pinned output of a stage, None if there is none."""
+        if name not in self._pinned:
+            return None
+        return self._pinned[name][0]
+
+    def clear(self):
+        """Forgets everything, for when the image itself changes."""
+        self._entries.clear()
+        self._pinned = {}
+        self.nbytes = 0
+
+    def _evict(self):
+        while self.nbytes > self._budget and self._entries:
+            key, (_, size) = self._entries.popitem(last=False)
+            self.nbytes -= size
+            logger.debug(f"Evicted stage output {key}")
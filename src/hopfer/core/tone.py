@@ -0,0 +1,179 @@
+"""
+The tone adjustments of the image settings as a single curve.
+
+Normalize, equalize and brightness / contrast all map a gray level to a new
+one, no matter where the pixel is. Instead of a pass over the image each,
+they are composed into one lut with an entry for every level, 256 or 65536 of
+them, which apply_lut runs over the image once. Normalize and equalize depend
+on the image only through its histogram, which is counted once and pushed
+through the curve as it's built.
+
+Every step gives the same levels as the pass it replaced: the float32 math of
+normalize.pxi, cv2.equalizeHist for 8 bit, equalize.pxi for 16 bit and
+cv2.addWeighted for brightness / contrast.
+"""
+
+from functools import partial
+
+import numpy as np
+
+from hopfer.core.algorithms.cython_ops import apply_lut, histogram
+
+
+def adjust_tone(image, im_settings):
+    """
+    Applies normalize, equalize and brightness / contrast of im_settings to a
+    uint8 or uint16 image, in place, and returns it.
+    """
+    bc = brightness_contrast(im_settings)
+    if not (im_settings["normalize"] or im_settings["equalize"] or bc):
+        return image
+
+    if not (im_settings["normalize"] or im_settings["equalize"]):
+        # an affine map alone is faster through cv2 than through any lut,
+        # and still a single pass
+        return _add_weighted(image, *bc)
+
+    hist = histogram(image)
+    bit_depth = 8 if image.dtype == np.uint8 else 16
+    lut = tone_curve(im_settings, bit_depth, hist)
+    if lut is not None:
+        apply_lut(image, lut)
+    return image
+
+
+def tone_curve(im_settings, bit_depth=8, hist=None):
+    """
+    Builds the lut of the tone adjustments of im_settings.
+
+    Args:
+        im_settings (dict): The image settings.
+        bit_depth (int): 8 or 16.
+        hist (np.ndarray): The histogram of the image, only needed for
+            normalize and equalize.
+
+    Returns:
+        np.ndarray: The lut as uint8 or uint16, or None if it would leave
+        every level as it is.
+    """
+    levels = 2**bit_depth
+    lut = np.arange(levels)
+    if hist is not None:
+        hist = np.asarray(hist, dtype=np.int64)
+
+    steps = []
+    if im_settings["normalize"]:
+        steps.append(_normalize)
+    if im_settings["equalize"]:
+        steps.append(_equalize)
+    bc = brightness_contrast(im_settings)
+    if bc:
+        steps.append(partial(_brightness_contrast, *bc))
+
+    for step in steps:
+        mapping = step(hist, bit_depth)
+        if mapping is None:
+            continue
+        lut = mapping[lut]
+        if hist is not None:
+            # the histogram of the image after this step
+            hist = np.bincount(mapping, weights=hist, minlength=levels)
+            hist = hist.astype(np.int64)
+
+    if np.array_equal(lut, np.arange(levels)):
+        return None
+    return lut.astype(np.uint8 if bit_depth == 8 else np.uint16)
+
+
+def brightness_contrast(im_settings):
+    """
+    The brightness and the contrast of the sliders as factors, None if they
+    are off or leave the image as it is.
+    """
+    if not im_settings["bc_t"]:
+        return None
+
+    _brightness = im_settings["brightness"]
+    if _brightness > 0:
+        # using a log function makes the adjustment feel a bit more natural
+        _brightness = 5 * (np.log(1 + (0.01 - 1) * _brightness) / np.log(0.01))
+    _brightness += 1
+
+    _contrast = im_settings["contrast"]
+    if _contrast > 0:
+        # using a log function makes the adjustment feel a bit more natural
+        _contrast = 5 * (np.log(1 + (0.01 - 1) * _contrast) / np.log(0.01))
+    _contrast += 1
+
+    if _brightness == 1.0 and _contrast == 1.0:
+        return None
+    return float(_brightness), float(_contrast)
+
+
+def _normalize(hist, bit_depth):
+    max_val = 2**bit_depth - 1
+    used = np.flatnonzero(hist)
+    if used.size == 0:
+        return None
+    min_v, max_v = int(used[0]), int(used[-1])
+    # normalizing the full range does nothing, a single level can't be
+    if (min_v == 0 and max_v == max_val) or min_v == max_v:
+        return None
+
+    scale = np.float32(max_val / (max_v - min_v))
+    levels = np.arange(max_val + 1)
+    mapping = (levels.astype(np.float32) - np.float32(min_v)) * scale
+    mapping = np.clip(mapping, 0, max_val).astype(np.int64)
+    if bit_depth == 8:
+        # the ends of the lut of normalize(lut=True)
+        mapping[: min_v + 1] = 0
+        mapping[max_v:] = max_val
+    return mapping
+
+
+def _equalize(hist, bit_depth):
+    max_val = 2**bit_depth - 1
+    used = np.flatnonzero(hist)
+    if used.size == 0:
+        return None
+    first = int(used[0])
+    total = int(hist.sum())
+    if hist[first] == total:
+        # a single level stays where it is, like cv2.equalizeHist does. the
+        # 16 bit equalize turned it black.
+        return None
+
+    # the count of every level above the first one that's used
+    above = np.cumsum(hist) - hist[first]
+    if bit_depth == 8:
+        # cv2.equalizeHist, in float32 and rounded to even
+        scale = np.float32(max_val) / np.float32(total - hist[first])
+        mapping = np.rint(above.astype(np.float32) * scale)
+    else:
+        # equalize.pxi, in double and rounded half up
+        scale = max_val / (total - hist[first])
+        mapping = np.floor(above * scale + 0.5)
+    mapping = np.clip(mapping, 0, max_val).astype(np.int64)
+    mapping[: first + 1] = 0
+    return mapping
+
+
+def _brightness_contrast(brightness, contrast, hist, bit_depth):
+    # cv2 itself on every level, so the rounding is exactly that of the image
+    # it used to run on
+    dtype = np.uint8 if bit_depth == 8 else np.uint16
+    levels = np.arange(2**bit_depth, dtype=dtype)[None, :]
+    return _add_weighted(levels, brightness, contrast)[0].astype(np.int64)
+
+
+def _add_weighted(image, brightness, contrast):
+    # imported here as it takes a good part of the startup time of a worker,
+    # see _enhance_image
+    import cv2
+
+    scale = 255 if image.dtype == np.uint8 else 65535
+    alpha = contrast
+    beta = (scale / 2) * (1.0 - alpha) + (brightness - 1.0) * scale
+    # addWeighted is much much faster than any implementation i could come up
+    # and it does support uint16 ootb
+    return cv2.addWeighted(image, alpha, image, 0, beta, dst=image)
@@ -0,0 +1,51 @@
+"""
+A small persistent cache for arrays that are slow to build but never change,
+like the screens and the blue noise masks. They are kept as .npy files in the
+user cache dir, one folder per kind.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import platformdirs
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(platformdirs.user_cache_dir("hopfer"))
+
+
+def cached_array(folder, key, build):
+    """
+    Returns the array cached under `key`, or builds it with `build()` and
+    caches it. A cache that can't be read or written is only logged, the
+    array is then just built every time.
+
+    Args:
+        folder (str): The folder in the cache dir, one per kind of array.
+        key (tuple): Everything the array depends on, hashed with repr().
+        build (callable): Builds the array.
+    """
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()[:16]
+    path = CACHE_DIR / folder / f"{digest}.npy"
+
+    if path.exists():
+        try:
+            return np.load(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load {path}: {e}")
+
+    array = build()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # written next to it first, so no other process sees half a file
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".npy")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Could not cache {path}: {e}")
+    return array
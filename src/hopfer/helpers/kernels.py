@@ -1,5 +1,18 @@
+import json
+import logging
+import os
+from functools import lru_cache
+
 import numpy as np
 
+from hopfer.core.defaults import DEFAULT_SETTINGS
+from hopfer.helpers.config import CONFIG_FOLDER
+
+logger = logging.getLogger(__name__)
+
+# the users own kernels, see user_kernels()
+KERNELS_PATH = os.path.join(CONFIG_FOLDER, "kernels.json")
+
 
 def get_kernel(algorithm):
     if algorithm == "Floyd-Steinberg":
@@ -161,6 +174,9 @@ def get_kernel(algorithm):
         )
         # Normalize the kernel as im too lazy to count the values
         kernel /= float(np.sum(kernel))
+    elif algorithm in user_kernels():
+        # copied, as the parsed kernels are shared
+        kernel = user_kernels()[algorithm].copy()
     else:
         # in case something goes wrong return the Sierra2 4A
         # fmt: off
@@ -171,3 +187,80 @@ def get_kernel(algorithm):
         # fmt: on
 
     return kernel
+
+
+def user_kernels():
+    """
+    The error diffusion kernels of the user, read from kernels.json in the
+    config folder. Every entry is a matrix laid out like the ones above, with
+    the current pixel in the center, and an optional divisor which defaults
+    to the sum of the weights and can't be below it:
+
+        {
+            "Shiau-Fan": {
+                "matrix": [[0, 0, 0, 0, 0],
+                           [0, 0, 0, 4, 0],
+                           [1, 1, 2, 0, 0]],
+                "divisor": 8
+            }
+        }
+
+    Broken entries are skipped with a warning. The file is only parsed again
+    once it changes.
+
+    Returns:
+        dict: The kernels as float64 arrays, by name.
+    """
+    try:
+        mtime = os.stat(KERNELS_PATH).st_mtime_ns
+    except OSError:
+        return {}
+    return _read_user_kernels(mtime)
+
+
+@lru_cache(maxsize=1)
+def _read_user_kernels(mtime):
+    try:
+        with open(KERNELS_PATH, "r") as f:
+            entries = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not read {KERNELS_PATH}: {e}")
+        return {}
+    if not isinstance(entries, dict):
+        logger.warning(f"Could not read {KERNELS_PATH}: not a dict of kernels")
+        return {}
+
+    kernels = {}
+    for name, entry in entries.items():
+        try:
+            kernels[name] = _parse_kernel(name, entry)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Skipping the kernel {name}: {e}")
+    return kernels
+
+
+def _parse_kernel(name, entry):
+    # every algorithm, not just the built in kernels, or the settings and the
+    # dispatch would pick the algorithm over the kernel
+    if name in DEFAULT_SETTINGS:
+        raise ValueError("the name is taken by an algorithm")
+
+    matrix = np.array(entry["matrix"], dtype=np.float64)
+    if matrix.ndim != 2 or matrix.shape[0] % 2 == 0 or matrix.shape[1] % 2 == 0:
+        raise ValueError("the matrix needs an odd number of rows and columns")
+    if (matrix < 0).any() or not matrix.any():
+        raise ValueError("the weights need to be positive")
+
+    # the error can only go to pixels that are still to be processed
+    cy, cx = matrix.shape[0] // 2, matrix.shape[1] // 2
+    if matrix[:cy].any() or matrix[cy, : cx + 1].any():
+        raise ValueError("the matrix diffuses into processed pixels")
+
+    divisor = float(entry.get("divisor", matrix.sum()))
+    # more error handed on than there is grows without bound
+    if divisor < matrix.sum():
+        raise ValueError("the divisor is smaller than the sum of the weights")
+
+    kernel = matrix / divisor
+    kernel.flags.writeable = False
+    return kernel
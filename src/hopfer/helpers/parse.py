@@ -44,3 +44,62 @@ def parse_args(version):
     parser.add_argument("file", nargs="?", default=None, help=argparse.SUPPRESS)
 
     return parser.parse_args()
+
+
+def parse_batch_args(version, argv):
+    parser = argparse.ArgumentParser(
+        prog="hopfer batch",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=textwrap.dedent(f"""\
+            Halftone many files without starting the GUI.
+            Version: {version}
+
+            Inputs may be files or folders. Outputs are written to the
+            output folder together with a manifest.json describing the run.
+
+            Usage: hopfer batch [options] -o OUTPUT inputs...
+            """),
+        usage=argparse.SUPPRESS,
+    )
+    parser.add_argument("inputs", nargs="+", help="files or folders to process")
+    parser.add_argument(
+        "-o", "--output", required=True, metavar="DIR", help="output folder"
+    )
+    parser.add_argument(
+        "-a",
+        "--algorithm",
+        default=None,
+        help="halftoning algorithm, e.g. 'Floyd-Steinberg'",
+    )
+    parser.add_argument(
+        "-p",
+        "--preset",
+        default=None,
+        metavar="JSON",
+        help="a json file with grayscale, enhance and halftone settings",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        default=None,
+        help="OpenMP threads per worker (defaults to cores / jobs)",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        default="png",
+        help="output file format (default: png)",
+    )
+    parser.add_argument(
+        "-d", "--debug", action="store_true", help="enable debug logging"
+    )
+
+    return parser.parse_args(argv)
@@ -4,17 +4,7 @@ import os
 import sys
 from pathlib import Path
 
-from PySide6.QtGui import QFontDatabase, QGuiApplication, QIcon
-from PySide6.QtQml import QQmlApplicationEngine
-
 from hopfer import VERSION
-from hopfer.bridge.bridge import Bridge
-from hopfer.bridge.image_provider import ImageProvider
-from hopfer.core.config_object import Config
-from hopfer.core.daemon import Daemon
-from hopfer.helpers.config import update_config
-from hopfer.helpers.logfile import get_handlers
-from hopfer.helpers.parse import parse_args
 
 # Block the portal for any child process before they are born
 if "-c" in sys.argv or "--multiprocessing-fork" in sys.argv:
@@ -36,6 +26,24 @@ WINDOW_ICON_PATH = os.fspath(UI_PATH / "Assets" / "hopfer.png")
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        # the batch mode never touches Qt. this also keeps the spawned
+        # workers from importing PySide6 when they re-import this module.
+        from hopfer.core.batch import main as batch_main
+
+        sys.exit(batch_main(sys.argv[2:]))
+
+    from PySide6.QtGui import QFontDatabase, QGuiApplication, QIcon
+    from PySide6.QtQml import QQmlApplicationEngine
+
+    from hopfer.bridge.bridge import Bridge
+    from hopfer.bridge.image_provider import ImageProvider
+    from hopfer.core.config_object import Config
+    from hopfer.core.daemon import Daemon
+    from hopfer.helpers.config import update_config
+    from hopfer.helpers.logfile import get_handlers
+    from hopfer.helpers.parse import parse_args
+
     args = parse_args(VERSION)
 
     logger = logging.getLogger("hopfer")
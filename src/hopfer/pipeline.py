@@ -0,0 +1,139 @@
+"""
+The processing pipeline as a plain library API.
+
+It runs the same grayscale -> enhance -> halftone steps as the daemon, but
+without a Daemon, an ImageStorage or any queues, so it can be called from
+thread pools, batch jobs or other services directly:
+
+    from hopfer import pipeline
+
+    result = pipeline.run(image, algorithm="Floyd-Steinberg")
+"""
+
+import numpy as np
+
+from hopfer.core.arena import BufferArena
+from hopfer.core.defaults import DEFAULT_ENHANCE, DEFAULT_SETTINGS
+from hopfer.core.image_processor import ImageProcessor
+from hopfer.helpers.kernels import user_kernels
+
+
+def default_settings(algorithm):
+    """Returns a copy of the default halftoning settings for an algorithm."""
+    if algorithm not in DEFAULT_SETTINGS and algorithm in user_kernels():
+        # the kernels of the user are plain error diffusions
+        return dict(DEFAULT_SETTINGS["Floyd-Steinberg"])
+    return dict(DEFAULT_SETTINGS.get(algorithm, {}))
+
+
+class Pipeline:
+    """
+    A reusable pipeline. It keeps its settings and scratch buffers between
+    calls, so processing many images of the same size allocates less. An
+    instance is not meant to be shared between threads, use one per thread.
+    """
+
+    def __init__(
+        self,
+        grayscale="Luminance",
+        enhance=None,
+        algorithm="None",
+        settings=None,
+        grayscale_settings=None,
+    ):
+        self.grayscale = grayscale
+        self.grayscale_settings = grayscale_settings or {}
+        self.enhance = enhance
+        self.algorithm = algorithm
+        self.settings = settings
+
+        # the enhancement works in place, so grayscale input is copied into
+        # a scratch array instead of a freshly allocated one on every call.
+        # the enhancements and the halftone take theirs from here as well.
+        self.arena = BufferArena()
+
+    def run(self, image, **overrides):
+        """
+        Processes a single image. Expects a 2d grayscale or a 3d RGB array of
+        uint8 or uint16. Keyword arguments override the pipeline settings for
+        this call only.
+
+        Returns PackedBits for halftones, or a uint8 array for "None".
+        np.asarray() unpacks the former into the bool array it stands for.
+        The result never shares memory with the input or the scratch buffers.
+        """
+        grayscale = overrides.get("grayscale", self.grayscale)
+        grayscale_settings = overrides.get(
+            "grayscale_settings", self.grayscale_settings
+        )
+        enhance = overrides.get("enhance", self.enhance)
+        algorithm = overrides.get("algorithm", self.algorithm)
+        settings = overrides.get("settings", self.settings)
+
+        if image.ndim == 2 and not enhance:
+            # nothing downstream modifies the input, no need for a copy
+            gray = image
+        else:
+            gray = self.grayscale_image(image, grayscale, grayscale_settings)
+
+        if enhance:
+            im_settings = dict(DEFAULT_ENHANCE)
+            im_settings.update(enhance)
+            gray = ImageProcessor._enhance_image(gray, im_settings, self.arena)
+
+        if settings is None:
+            settings = default_settings(algorithm)
+
+        result = ImageProcessor._apply_algorithm(
+            gray, algorithm, settings, arena=self.arena
+        )
+        if result is gray:
+            # "None" on uint8 hands back the image it got, which is either
+            # the input or a scratch array the next call overwrites
+            result = gray.copy()
+        return result
+
+    def grayscale_image(self, image, mode="Luminance", settings=None):
+        """Returns a grayscale copy of the image that is safe to modify."""
+        if image.ndim == 3:
+            return ImageProcessor._convert_to_grayscale(
+                image, mode, settings or {}
+            )
+
+        gray = self.arena.get("gray", image.shape, image.dtype)
+        np.copyto(gray, image)
+        return gray
+
+    def release(self):
+        """Drops the scratch buffers."""
+        self.arena.release()
+
+
+def run(
+    image,
+    grayscale="Luminance",
+    enhance=None,
+    algorithm="None",
+    settings=None,
+    grayscale_settings=None,
+):
+    """
+    Stateless version of Pipeline.run. The input image is never modified.
+
+    Args:
+        image (np.ndarray): A 2d grayscale or 3d RGB image, uint8 or uint16.
+        grayscale (str): The grayscale mode, e.g. "Luminance" or "Manual RGB".
+        enhance (dict): Image adjustments as sent by the GUI, None to skip.
+        algorithm (str): The halftoning algorithm, e.g. "Floyd-Steinberg".
+        settings (dict): The halftoning settings, None for the defaults.
+        grayscale_settings (dict): Settings for "Manual RGB".
+    Returns:
+        PackedBits: The halftoned image, a uint8 array for "None".
+    """
+    return Pipeline(
+        grayscale=grayscale,
+        enhance=enhance,
+        algorithm=algorithm,
+        settings=settings,
+        grayscale_settings=grayscale_settings,
+    ).run(image)
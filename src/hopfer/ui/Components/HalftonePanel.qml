@@ -18,6 +18,7 @@ ColumnLayout {
     Component { id: mezzoN; MezzoNormal {} }
     Component { id: bayer; Bayer {} }
     Component { id: clustered; Clustered {} }
+    Component { id: bluenoise; BlueNoise {} }
     Component { id: errordiffusion; ErrorDiffusion {} }
     Component { id: errordiffusion_s; ErrorDiffusion {serpentine: true} }
     Component { id: levien; Levien {serpentine: true} }
@@ -33,6 +34,7 @@ ColumnLayout {
         mezzoN,
         bayer,
         clustered,
+        bluenoise,
         errordiffusion,
         errordiffusion,
         errordiffusion,
@@ -81,6 +83,7 @@ ColumnLayout {
             "Mezzotint normal",
             "Bayer",
             "Clustered dot",
+            "Blue noise",
             "Floyd-Steinberg",
             "False Floyd-Steinberg",
             "Jarvis",
@@ -96,7 +99,7 @@ ColumnLayout {
             "Zhou-Fang",
             "Levien",
             "Nakano",
-            ]
+            ].concat(bridge.user_kernels)
 
         onCurrentIndexChanged: {
             let new_algorithm = combo.valueAt(combo.currentIndex);
@@ -159,7 +162,10 @@ ColumnLayout {
         id: loader
         // Layout.margins: 5
         Layout.fillWidth: true
-        sourceComponent: root.componentMap[combo.currentIndex]
+        // the kernels of the user come after the built in ones
+        sourceComponent: combo.currentIndex < root.componentMap.length
+            ? root.componentMap[combo.currentIndex]
+            : errordiffusion
     }
 
     Item {
@@ -147,6 +147,15 @@ Item {
                     config.options.memory_warning_threshold = value
                 }
             }
+
+            LabeledSwitch {
+                Layout.fillWidth: true
+                text: "Low memory"
+                value: config.options.low_memory
+                onInteraction: {
+                    config.options.low_memory = value
+                }
+            }
         }
     }
     Item {
@@ -17,7 +17,8 @@ ColumnLayout {
         return {
             "size": size.value,
             "perturbation": perturbation.value,
-            "offset": offset.value
+            "offset": offset.value,
+            "seed": seed.value
         };
     }
 
@@ -61,4 +62,29 @@ ColumnLayout {
         precision: 2
         onInteraction: root.settingsChanged()
     }
+
+    SpinBox {
+        id: seed
+
+        Layout.fillWidth: true
+        editable: true
+        from: 0
+        to: 9999
+        value: 0
+        // only the perturbation is random
+        enabled: perturbation.value > 0
+        onValueModified: root.settingsChanged()
+
+        contentItem: TextField {
+            text: seed.textFromValue(seed.value, seed.locale)
+            validator: seed.validator
+            readOnly: !seed.editable
+            font.pointSize: 10.5
+            horizontalAlignment: Text.AlignHCenter
+            verticalAlignment: Text.AlignVCenter
+            color: Material.foreground
+            background: null
+        }
+
+    }
 }
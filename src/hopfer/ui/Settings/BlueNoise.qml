@@ -0,0 +1,61 @@
+import Components
+import QtQuick
+import QtQuick.Controls
+import QtQuick.Controls.Material
+import QtQuick.Layouts
+
+ColumnLayout {
+    id: root
+
+    signal settingsChanged()
+
+    function handleSliderInteraction() {
+        root.settingsChanged();
+    }
+
+    function getDict() {
+        return {
+            "size": size.value,
+            "seed": seed.value
+        };
+    }
+
+    LabeledSlider {
+        id: size
+
+        text: "Mask size"
+        from: 4
+        to: 8
+        step: 1
+        value: 6
+        default_value: 6
+        precision: 0
+        onInteraction: root.settingsChanged()
+        // display the actual size, but use just the power under the hood
+        valueText: 2 ** value.toFixed(precision)
+    }
+
+    SpinBox {
+        id: seed
+
+        Layout.fillWidth: true
+        editable: true
+        from: 0
+        to: 9999
+        value: 0
+        onValueModified: root.settingsChanged()
+
+        contentItem: TextField {
+            text: seed.textFromValue(seed.value, seed.locale)
+            validator: seed.validator
+            readOnly: !seed.editable
+            font.pointSize: 10.5
+            horizontalAlignment: Text.AlignHCenter
+            verticalAlignment: Text.AlignVCenter
+            color: Material.foreground
+            background: null
+        }
+
+    }
+
+}
@@ -16,6 +16,9 @@ ColumnLayout {
     function getDict() {
         return {
             "size": dot_size.value,
+            "angle": angle.value,
+            "lpi": lpi.value,
+            "dpi": dpi.value
         };
     }
 
@@ -27,8 +30,52 @@ ColumnLayout {
         to: 150
         step: 1
         value: 15
-      default_value: 15
+        default_value: 15
         precision: 0
+        // the size comes from the LPI when that's set
+        enabled: lpi.value === 0
+        onInteraction: root.settingsChanged()
+    }
+
+    LabeledSlider {
+        id: angle
+
+        text: "Screen angle"
+        from: 0
+        to: 90
+        step: 1
+        value: 45
+        default_value: 45
+        precision: 0
+        onInteraction: root.settingsChanged()
+        valueText: value.toFixed(precision) + "°"
+    }
+
+    LabeledSlider {
+        id: lpi
+
+        text: "LPI"
+        from: 0
+        to: 300
+        step: 1
+        value: 0
+        default_value: 0
+        precision: 0
+        onInteraction: root.settingsChanged()
+        valueText: value === 0 ? "Off" : value.toFixed(precision)
+    }
+
+    LabeledSlider {
+        id: dpi
+
+        text: "DPI"
+        from: 72
+        to: 2400
+        step: 1
+        value: 600
+        default_value: 600
+        precision: 0
+        enabled: lpi.value > 0
         onInteraction: root.settingsChanged()
     }
 }
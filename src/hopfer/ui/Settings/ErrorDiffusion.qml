@@ -19,7 +19,8 @@ ColumnLayout {
         return {
             "diffusion_factor": diffusion_factor.value,
             "serpentine": serpentine.value,
-            "noise": noise.value
+            "noise": noise.value,
+            "tiled": tiled.value
         };
     }
 
@@ -50,4 +51,11 @@ ColumnLayout {
         onInteraction: root.settingsChanged()
     }
 
+    LabeledSwitch {
+        id: tiled
+
+        text: "Tiled (approximate)"
+        onInteraction: root.settingsChanged()
+    }
+
 }
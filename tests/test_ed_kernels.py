@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from hopfer.core.algorithms.cython_ops import ED_KERNELS, ed, ed_kernel, eds
+from hopfer.helpers.kernels import get_kernel
+
+# the tiny ones only hit the paths along the edges
+SHAPES = [(61, 103), (1, 1), (2, 3), (5, 2), (3, 9)]
+
+
+def _image(shape):
+    rng = np.random.default_rng(sum(shape))
+    return rng.integers(0, 65536, shape, dtype=np.uint16)
+
+
+@pytest.mark.parametrize("algorithm", list(ED_KERNELS))
+@pytest.mark.parametrize("serpentine", [False, True])
+@pytest.mark.parametrize("shape", SHAPES)
+def test_matches_the_float_reference(algorithm, serpentine, shape):
+    # at a diffusion factor of 1.0 the integer weights spread the error
+    # exactly like the float kernel does
+    img = _image(shape)
+    kernel = get_kernel(algorithm)
+    if serpentine:
+        expected = eds(img, kernel, 1.0)
+    else:
+        expected = ed(img, kernel, 1.0, 1)
+    got = ed_kernel(img, ED_KERNELS[algorithm], 1.0, serpentine, 1)
+    np.testing.assert_array_equal(got, expected)
+
+
+@pytest.mark.parametrize("algorithm", ["Floyd-Steinberg", "Stucki large"])
+def test_density_at_other_factors(algorithm):
+    # the error is truncated before it's spread, which only lets the
+    # patterns drift apart, not the tone
+    img = _image((128, 160))
+    kernel = get_kernel(algorithm)
+    for factor in (0.5, 0.8):
+        expected = np.unpackbits(ed(img, kernel, factor, 1), axis=1)
+        got = np.unpackbits(
+            ed_kernel(img, ED_KERNELS[algorithm], factor, False, 1), axis=1
+        )
+        assert abs(got[:, :160].mean() - expected[:, :160].mean()) < 2e-3
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# the GUI and the network stay out of the core, so the pipeline and the
+# daemon run headless and start fast
+HEAVY = ["PySide6", "requests"]
+
+# seconds, best of a few runs. both take about 0.15 s, cv2 alone about 0.1 s.
+IMPORT_BUDGET = 0.5
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+CORE = ["hopfer.pipeline", "hopfer.core.daemon"]
+
+# makes the GUI and the network look like they aren't installed
+BLOCK = f"""
+import sys
+from importlib.abc import MetaPathFinder
+
+class Block(MetaPathFinder):
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in {HEAVY!r}:
+            raise ImportError(f"{{name}} is blocked")
+
+sys.meta_path.insert(0, Block())
+"""
+
+
+def _python(*args):
+    # a fresh interpreter, the test session may have imported anything
+    path = os.pathsep.join([os.fspath(SRC), os.environ.get("PYTHONPATH", "")])
+    return subprocess.run(
+        [sys.executable, *args],
+        env={**os.environ, "PYTHONPATH": path},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _loaded(module, names):
+    code = (
+        f"import sys, {module}\n"
+        f"print(' '.join(n for n in {names!r} if n in sys.modules))"
+    )
+    return _python("-c", code).stdout.split()
+
+
+def _import_times(module):
+    # (cumulative seconds, name) of every module imported, from -X importtime
+    lines = _python("-X", "importtime", "-c", f"import {module}").stderr
+    times = []
+    for line in lines.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times.append((int(cumulative) / 1e6, name.strip()))
+    return times
+
+
+@pytest.mark.parametrize("module", CORE)
+def test_no_gui_or_network(module):
+    assert _loaded(module, HEAVY) == []
+
+
+@pytest.mark.parametrize("module", CORE)
+def test_without_gui_or_network(module):
+    # the headless install has neither, the core has to work all the same
+    code = BLOCK + (
+        f"import numpy as np, {module}\n"
+        "from hopfer.pipeline import run\n"
+        "run(np.zeros((8, 8), np.uint8), algorithm='Floyd-Steinberg')\n"
+    )
+    _python("-c", code)
+
+
+@pytest.mark.parametrize("module", CORE)
+def test_without_cv2(module):
+    # the enhancements, reading and writing import it once they run
+    assert _loaded(module, ["cv2"]) == []
+
+
+@pytest.mark.parametrize("module", CORE)
+def test_import_time(module):
+    runs = [{name: t for t, name in _import_times(module)} for _ in "abc"]
+    best = min(run[module] for run in runs)
+    slowest = sorted(runs[0].items(), key=lambda item: -item[1])[:10]
+    assert best < IMPORT_BUDGET, slowest
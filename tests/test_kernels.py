@@ -0,0 +1,93 @@
+import json
+import logging
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from hopfer.core.compiler.ed_compiler import (
+    MAX_DIVISOR,
+    kernel_is_exact,
+    kernel_taps,
+)
+from hopfer.helpers import kernels
+from hopfer.helpers.kernels import get_kernel
+
+SHIAU_FAN = {"matrix": [[0, 0, 0, 0, 0], [0, 0, 0, 4, 0], [1, 1, 2, 0, 0]]}
+
+
+@pytest.fixture
+def kernels_file(tmp_path, monkeypatch):
+    path = tmp_path / "kernels.json"
+    monkeypatch.setattr(kernels, "KERNELS_PATH", str(path))
+    kernels._read_user_kernels.cache_clear()
+    yield path
+    kernels._read_user_kernels.cache_clear()
+
+
+def test_user_kernels(kernels_file):
+    kernels_file.write_text(json.dumps({"Shiau-Fan": SHIAU_FAN}))
+    user = kernels.user_kernels()
+    assert list(user) == ["Shiau-Fan"]
+    assert user["Shiau-Fan"].sum() == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("entries", [[SHIAU_FAN], "Shiau-Fan", 3, None])
+def test_user_kernels_not_a_dict(kernels_file, entries, caplog):
+    kernels_file.write_text(json.dumps(entries))
+    with caplog.at_level(logging.WARNING):
+        assert kernels.user_kernels() == {}
+    assert "not a dict" in caplog.text
+
+
+def test_user_kernels_skip_broken_entries(kernels_file):
+    kernels_file.write_text(
+        json.dumps(
+            {
+                "Shiau-Fan": SHIAU_FAN,
+                "No matrix": {"divisor": 8},
+                "A list": [1, 2, 3],
+                "A string": "matrix",
+                "Ragged": {"matrix": [[0, 0, 0], [0, 0, 1], [1]]},
+                "Too small a divisor": {**SHIAU_FAN, "divisor": 7},
+                "No divisor": {**SHIAU_FAN, "divisor": 0},
+            }
+        )
+    )
+    assert list(kernels.user_kernels()) == ["Shiau-Fan"]
+
+
+def test_user_kernels_bigger_divisor(kernels_file):
+    # losing some of the error is fine, handing on more than there is isn't
+    kernels_file.write_text(json.dumps({"Lossy": {**SHIAU_FAN, "divisor": 10}}))
+    assert kernels.user_kernels()["Lossy"].sum() == pytest.approx(0.8)
+
+
+@pytest.mark.parametrize("name", ["Floyd-Steinberg", "Bayer", "None"])
+def test_user_kernels_reserved_names(kernels_file, name):
+    kernels_file.write_text(json.dumps({name: SHIAU_FAN}))
+    assert kernels.user_kernels() == {}
+
+
+def test_kernel_taps_exact():
+    taps, divisor = kernel_taps(get_kernel("Floyd-Steinberg"))
+    assert divisor == 16
+    assert taps == [(0, 1, 7), (1, -1, 3), (1, 0, 5), (1, 1, 1)]
+    assert kernel_is_exact(get_kernel("Stucki large"))
+
+
+def test_kernel_taps_capped():
+    # pairwise coprime denominators, their lcm is way past any int32
+    kernel = np.zeros((3, 3))
+    kernel[1, 2] = 500 / 997
+    kernel[2, 0] = 200 / 991
+    kernel[2, 1] = 150 / 983
+    kernel[2, 2] = 1 - kernel.sum()
+    assert not kernel_is_exact(kernel)
+
+    taps, divisor = kernel_taps(kernel)
+    assert divisor == MAX_DIVISOR
+    assert sum(w for _, _, w in taps) == MAX_DIVISOR
+    for dy, dx, weight in taps:
+        exact = Fraction(float(kernel[1 + dy, 1 + dx]))
+        assert abs(Fraction(weight, divisor) - exact) < Fraction(1, divisor)
@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+import pytest
+
+from hopfer.core.algorithms.cython_ops import median
+from hopfer.core.arena import BufferArena
+from hopfer.core.image_processor import _median
+
+
+def _reference(img, ksize):
+    r = ksize // 2
+    padded = np.pad(img, r, mode="edge")
+    windows = np.lib.stride_tricks.sliding_window_view(padded, (ksize, ksize))
+    return np.median(windows, axis=(2, 3)).astype(img.dtype)
+
+
+@pytest.mark.parametrize("shape", [(37, 150), (1, 9), (9, 1), (4, 4)])
+@pytest.mark.parametrize("ksize", [1, 3, 7, 15])
+def test_median_uint16(shape, ksize):
+    rng = np.random.default_rng(ksize)
+    img = rng.integers(0, 65536, shape, dtype=np.uint16)
+    np.testing.assert_array_equal(median(img, ksize), _reference(img, ksize))
+
+
+def test_median_smooth():
+    # most windows share their histogram segments with the pixel before
+    y, x = np.mgrid[0:80, 0:200]
+    img = (x * 300 + y * 40).astype(np.uint16)
+    np.testing.assert_array_equal(median(img, 9), _reference(img, 9))
+
+
+def test_median_rejects():
+    img = np.zeros((8, 8), dtype=np.uint16)
+    with pytest.raises(ValueError):
+        median(img.astype(np.uint8), 3)
+    with pytest.raises(ValueError):
+        median(img, 4)
+    with pytest.raises(ValueError):
+        median(img, 3, out=img)
+    # more than 65535 pixels in a window would wrap the uint16 bins
+    with pytest.raises(ValueError):
+        median(np.full((300, 300), 1000, dtype=np.uint16), 257)
+
+
+@pytest.mark.parametrize("ksize", [3, 9])
+def test_uint8_stays_with_cv2(ksize):
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (40, 64), dtype=np.uint8)
+    expected = cv2.medianBlur(img, ksize)
+    got = _median(img.copy(), {"median": ksize}, BufferArena())
+    np.testing.assert_array_equal(got, expected)
+
+
+def test_uint16_stage():
+    # through uint8 by default, the exact one is opt in
+    rng = np.random.default_rng(1)
+    img = rng.integers(0, 65536, (40, 64), dtype=np.uint16)
+    got = _median(img.copy(), {"median": 9}, BufferArena())
+    expected = cv2.medianBlur((img >> 8).astype(np.uint8), 9)
+    np.testing.assert_array_equal(got, expected.astype(np.uint16) << 8)
+
+    exact = {"median": 9, "median_exact": True}
+    got = _median(img.copy(), exact, BufferArena())
+    np.testing.assert_array_equal(got, _reference(img, 9))
+
+
+def test_uint16_stage_past_the_exact_limit():
+    img = np.full((40, 64), 1000, dtype=np.uint16)
+    settings = {"median": 257, "median_exact": True}
+    got = _median(img.copy(), settings, BufferArena())
+    np.testing.assert_array_equal(got, np.full_like(img, 1000 >> 8 << 8))
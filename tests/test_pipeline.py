@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from hopfer import pipeline
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (32, 48), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("enhance", [None, {"normalize": True}])
+def test_none_returns_a_copy(image, enhance):
+    original = image.copy()
+    p = pipeline.Pipeline(algorithm="None", enhance=enhance)
+    first = p.run(image)
+    assert not np.shares_memory(first, image)
+
+    # the next call reuses the scratch buffers, the first result stays
+    expected = first.copy()
+    p.run(255 - image)
+    np.testing.assert_array_equal(first, expected)
+    np.testing.assert_array_equal(image, original)
+
+
+def test_none_on_rgb(image):
+    rgb = np.dstack([image] * 3)
+    p = pipeline.Pipeline(algorithm="None")
+    first = p.run(rgb)
+    expected = first.copy()
+    p.run(255 - rgb)
+    np.testing.assert_array_equal(first, expected)
+
+
+def test_none_uint16(image):
+    wide = image.astype(np.uint16) << 8
+    result = pipeline.run(wide)
+    assert result.dtype == np.uint8
+    np.testing.assert_array_equal(result, image)
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from hopfer.core.algorithms.bayer import generate_bayer_matrix
+from hopfer.core.algorithms.cython_ops import ordered_dither_p, random_dither
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+BAYER = generate_bayer_matrix(3, bit_depth=16)
+# white as often as the level says, in 1 / 2^32
+CHANCE = np.arange(65536, dtype=np.uint64) << 16
+
+OPS = {
+    "ordered_dither_p": lambda img, seed: ordered_dither_p(
+        img, BAYER, 0.1, seed
+    ),
+    "random_dither": lambda img, seed: random_dither(img, CHANCE, seed),
+}
+
+# prints a hash of the halftone of every seed, with as many threads as
+# OMP_NUM_THREADS says
+RUN = """
+import hashlib, sys
+sys.path.insert(0, {tests!r})
+from test_rng import OPS, _image
+img = _image()
+for seed in [0, 1, 12345]:
+    print(hashlib.sha256(OPS[{name!r}](img, seed).tobytes()).hexdigest())
+"""
+
+
+def _image(h=301, w=403):
+    # a gradient with a wave, odd sizes so the rows don't split evenly
+    y, x = np.mgrid[0:h, 0:w]
+    img = 0.5 + 0.4 * np.sin(x / 17) * np.cos(y / 23)
+    return (img * 65535).astype(np.uint16)
+
+
+def _hashes(name, threads):
+    # OpenMP reads the thread count once when it starts, so a fresh process
+    code = RUN.format(tests=os.fspath(Path(__file__).parent), name=name)
+    path = os.pathsep.join([os.fspath(SRC), os.environ.get("PYTHONPATH", "")])
+    env = {**os.environ, "PYTHONPATH": path, "OMP_NUM_THREADS": str(threads)}
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.split()
+
+
+@pytest.mark.parametrize("name", OPS)
+def test_same_for_any_number_of_threads(name):
+    # every pixel draws its own number from the seed and where it is, see
+    # rng.pxi, so how the rows are split up doesn't matter
+    expected = _hashes(name, 1)
+    assert len(expected) == 3
+    for threads in [2, 3, 8]:
+        assert _hashes(name, threads) == expected
+    # and the same as in this process, with however many threads it has
+    img = _image()
+    here = hashlib.sha256(OPS[name](img, 0).tobytes()).hexdigest()
+    assert here == expected[0]
+
+
+@pytest.mark.parametrize("name", OPS)
+def test_seeds_differ(name):
+    img = _image()
+    halftones = [np.unpackbits(OPS[name](img, seed)) for seed in [0, 1, 2]]
+    for a in range(3):
+        for b in range(a + 1, 3):
+            # 8% of the pixels with a perturbation of 0.1, half with random
+            assert (halftones[a] != halftones[b]).mean() > 0.01
+    # and the same seed is the same
+    np.testing.assert_array_equal(
+        halftones[0], np.unpackbits(OPS[name](img, 0))
+    )
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from hopfer.core.algorithms import screens
+from hopfer.core.algorithms.bayer import clustered
+from hopfer.core.algorithms.screens import dot_period, screen_matrix
+from hopfer.helpers import array_cache
+
+
+def _old_matrix(size, bit_depth):
+    # generate_halftone_matrix as it was before the screens had an angle
+    max_val = 2**bit_depth - 1
+    matrix = np.zeros((size, size), dtype=int)
+    center = (size - 1) / 2
+    distances = np.zeros((size, size))
+    for i in range(size):
+        for j in range(size):
+            distances[i, j] = (i - center) ** 2 + (j - center) ** 2
+    matrix.flat[np.argsort(distances, axis=None)] = np.arange(size**2)
+    matrix = (matrix / np.max(matrix)) * 0.5
+    negative = np.fliplr(1 - matrix)
+    stacked = np.block([[negative, matrix], [matrix, negative]])
+    normalized = stacked / np.max(stacked)
+    return np.round(normalized * max_val).astype(
+        np.uint16 if bit_depth == 16 else np.uint8
+    )
+
+
+@pytest.mark.parametrize("bit_depth", [8, 16])
+@pytest.mark.parametrize("size", [2, 3, 8, 16, 31, 151])
+def test_default_angle_is_the_old_matrix(size, bit_depth):
+    matrix = screen_matrix(dot_period(size), 45, bit_depth)
+    np.testing.assert_array_equal(matrix, _old_matrix(size, bit_depth))
+
+
+def test_defaults_dither_like_before():
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (50, 70), dtype=np.uint8)
+    settings = {"size": 15, "angle": 45, "lpi": 0, "dpi": 600}
+    tiles = np.tile(_old_matrix(16, 8), (2, 3))[:50, :70]
+    expected = img >= np.maximum(tiles, 2)
+    got = np.asarray(clustered(img, settings))
+    np.testing.assert_array_equal(got, expected)
+
+
+@pytest.mark.parametrize("angle", [0, 15, 30, 60, 75])
+def test_angled_density(angle):
+    img = np.full((256, 256), 100, dtype=np.uint8)
+    settings = {"size": 7, "angle": angle, "lpi": 0, "dpi": 600}
+    assert abs(np.asarray(clustered(img, settings)).mean() - 100 / 255) < 0.01
+
+
+def test_cache_version(tmp_path, monkeypatch):
+    # a new version of the supercells doesn't get the old ones from disk
+    monkeypatch.setattr(array_cache, "CACHE_DIR", tmp_path)
+    builds = []
+
+    def supercell(*args):
+        builds.append(args)
+        return np.full((4, 4), len(builds), dtype=np.uint8)
+
+    monkeypatch.setattr(screens, "supercell", supercell)
+    for version in [1, 1, 2]:
+        monkeypatch.setattr(screens, "SCREEN_VERSION", version)
+        screens._cached_matrix.cache_clear()
+        matrix = screens._cached_matrix(3, 2, 20, 8)
+    screens._cached_matrix.cache_clear()
+    assert len(builds) == 2
+    assert matrix[0, 0] == 2
@@ -0,0 +1,284 @@
+import queue
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from hopfer.core import image_processor
+from hopfer.core.image_processor import ENHANCEMENTS, ImageProcessor
+from hopfer.core.image_storage import ImageStorage
+from hopfer.core.stages import StageCache
+
+
+class _Daemon:
+    def __init__(self):
+        self.res_queue = queue.Queue()
+        self.req_queue = queue.Queue()
+
+
+@pytest.fixture
+def processor():
+    daemon = _Daemon()
+    storage = ImageStorage(daemon)
+    daemon.processor = ImageProcessor(daemon, storage)
+    return daemon.processor
+
+
+@pytest.fixture
+def runs(processor, monkeypatch):
+    """Counts the runs of every stage of the processor by name."""
+    counts = Counter()
+
+    def counted(name, run):
+        def wrapper(*args):
+            counts[name] += 1
+            return run(*args)
+
+        return wrapper
+
+    monkeypatch.setattr(
+        image_processor,
+        "ENHANCEMENTS",
+        tuple(
+            (name, settings_of, counted(name, run))
+            for name, settings_of, run in ENHANCEMENTS
+        ),
+    )
+    monkeypatch.setattr(
+        processor,
+        "_grayscale_stage",
+        counted("grayscale", processor._grayscale_stage),
+    )
+    monkeypatch.setattr(
+        processor,
+        "_process_algorithm",
+        counted("halftone", processor._process_algorithm),
+    )
+
+    storage = processor.storage
+    rng = np.random.default_rng(0)
+    storage.resized = rng.integers(0, 65536, (48, 64), dtype=np.uint16)
+    storage.original_grayscale = True
+    processor.algorithm = "Fixed threshold"
+    processor.settings = {"threshold": 128}
+    processor.image_settings.update(
+        normalize=True,
+        blur_t=True,
+        median=7,
+        unsharp_t=True,
+        laplacian_t=True,
+    )
+    return counts
+
+
+def _run(processor, runs):
+    runs.clear()
+    processed = processor._run_stages()
+    processor.storage.processed_image = processed
+    return dict(runs)
+
+
+def _contents(cache):
+    # copies of everything cached, PackedBits by their bits
+    values = [value for value, _ in cache._entries.values()]
+    values += [value for _, value in cache._pinned.values()]
+    return [
+        (value, np.array(getattr(value, "data", value))) for value in values
+    ]
+
+
+def test_cache_lru():
+    cache = StageCache(budget=300)
+    a, b, c, d = (np.full(100, i, dtype=np.uint8) for i in range(4))
+    for key, value in zip("abc", (a, b, c), strict=True):
+        assert cache.put(key, value)
+    assert cache.nbytes == 300
+
+    # a was used last, so b goes first
+    assert cache.get("a") is a
+    assert cache.put("d", d)
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == [a, c, d]
+    assert cache.nbytes == 300
+
+    # the same key again replaces it instead of counting it twice
+    assert cache.put("d", d)
+    assert cache.nbytes == 300
+
+    # bigger than the whole budget, it isn't kept and doesn't evict others
+    # to no end either
+    assert not cache.put("e", np.zeros(301, dtype=np.uint8))
+    assert cache.get("e") is None
+    assert cache.nbytes == 0
+
+    cache.put("a", a)
+    cache.put("c", c)
+    cache.budget = 100
+    assert cache.get("a") is None
+    assert cache.get("c") is c
+    assert cache.nbytes == 100
+
+
+def test_cache_pinned_outside_the_budget():
+    cache = StageCache(budget=0)
+    a, b = np.zeros(10, dtype=np.uint8), np.ones(10, dtype=np.uint8)
+    assert not cache.put("a", a)
+    cache.pin("enhanced", "a", a)
+    assert cache.get("a") is a
+    assert cache.pinned("enhanced") == "a"
+    assert cache.nbytes == 0
+
+    # the next one of the name replaces it
+    cache.pin("enhanced", "b", b)
+    assert cache.get("a") is None
+    assert cache.get("b") is b
+
+    cache.clear()
+    assert cache.get("b") is None
+    assert cache.pinned("enhanced") is None
+
+
+def test_run_stages_from_the_changed_one(processor, runs):
+    everything = {
+        "grayscale": 1,
+        "tone": 1,
+        "median": 1,
+        "unsharp": 1,
+        "laplacian": 1,
+        "halftone": 1,
+    }
+    assert _run(processor, runs) == everything
+    assert _run(processor, runs) == {}
+
+    processor.image_settings["u_strength"] = 0.5
+    assert _run(processor, runs) == {
+        "unsharp": 1,
+        "laplacian": 1,
+        "halftone": 1,
+    }
+
+    # the settings of before are still cached, all the way through
+    processor.image_settings["u_strength"] = 0.25
+    assert _run(processor, runs) == {}
+
+    processor.settings = {"threshold": 100}
+    assert _run(processor, runs) == {"halftone": 1}
+
+    # off, the image passes through to the next stage
+    processor.image_settings["laplacian_t"] = False
+    assert _run(processor, runs) == {"halftone": 1}
+
+    # a new image runs everything again
+    processor.storage.resized = processor.storage.resized.copy()
+    del everything["laplacian"]
+    assert _run(processor, runs) == everything
+
+
+def test_run_stages_without_a_budget(processor, runs):
+    # the enhanced and the processed image stay pinned
+    processor.storage.stage_cache.budget = 0
+    _run(processor, runs)
+    assert processor.storage.stage_cache.nbytes == 0
+    assert _run(processor, runs) == {}
+
+    processor.settings = {"threshold": 100}
+    assert _run(processor, runs) == {"halftone": 1}
+
+    # nothing upstream of them is kept, a change to the enhancements runs
+    # them all again
+    processor.image_settings["u_strength"] = 0.5
+    assert _run(processor, runs) == {
+        "grayscale": 1,
+        "tone": 1,
+        "median": 1,
+        "unsharp": 1,
+        "laplacian": 1,
+        "halftone": 1,
+    }
+    assert processor.storage.stage_cache.nbytes == 0
+
+
+def test_run_stages_keeps_cached_outputs(processor, runs):
+    cache = processor.storage.stage_cache
+    _run(processor, runs)
+    before = _contents(cache)
+    enhanced = processor.storage.enhanced_image
+
+    for key, value in [
+        ("u_strength", 0.5),
+        ("median", 9),
+        ("brightness", 0.3),
+        ("laplacian_t", False),
+    ]:
+        processor.image_settings[key] = value
+        _run(processor, runs)
+    processor.settings = {"threshold": 50}
+    _run(processor, runs)
+
+    for value, copy in before:
+        np.testing.assert_array_equal(getattr(value, "data", value), copy)
+    assert processor.storage.enhanced_image is not enhanced
+
+
+def test_style_stage(processor, runs, monkeypatch):
+    storage = processor.storage
+    storage.shm_preview = None
+    styled = Counter()
+    process_image = storage._process_image
+
+    def counted(*args):
+        styled["runs"] += 1
+        return process_image(*args)
+
+    monkeypatch.setattr(storage, "_process_image", counted)
+
+    def preview():
+        styled.clear()
+        result = storage._styled_preview(True, True)
+        return result, styled["runs"]
+
+    _run(processor, runs)
+    first, count = preview()
+    assert count == 1
+    again, count = preview()
+    assert count == 0
+    assert again is first
+
+    storage.color_dark = np.array((0, 0, 0), dtype=np.uint8)
+    dark, count = preview()
+    assert count == 1
+    assert not np.array_equal(dark, first)
+
+    # a new halftone is a new processed key, the old style doesn't fit it
+    processor.settings = {"threshold": 100}
+    _run(processor, runs)
+    assert preview()[1] == 1
+    assert preview()[1] == 0
+
+    # without a key, as after a new image, it's never cached
+    storage.processed_key = None
+    assert preview()[1] == 1
+    assert preview()[1] == 1
+
+
+def test_default_settings_have_every_key(processor):
+    # the first load runs with these, before the GUI sent any
+    image = np.arange(64 * 64, dtype=np.uint16).reshape(64, 64)
+    for toggle in ("blur_t", "unsharp_t", "laplacian_t"):
+        settings = dict(processor.image_settings, **{toggle: True})
+        for _, settings_of, _ in ENHANCEMENTS:
+            settings_of(settings)
+        ImageProcessor._enhance_image(image.copy(), settings)
+
+
+@pytest.mark.parametrize("blur_t", [False, True])
+def test_blur_settings_without_values(processor, blur_t):
+    # only the toggles, as sent before the adjustments panel was touched
+    settings = {
+        key: value
+        for key, value in processor.image_settings.items()
+        if key not in ("median", "box", "blur")
+    }
+    settings["blur_t"] = blur_t
+    for _, settings_of, _ in ENHANCEMENTS:
+        assert settings_of(settings) is None
@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+import pytest
+
+from hopfer.core.algorithms.bayer import generate_bayer_matrix
+from hopfer.core.algorithms.cython_ops import (
+    ED_KERNELS,
+    ed,
+    ed_kernel,
+    eds,
+    equalize,
+    levien,
+    luminance,
+    median,
+    nakano,
+    niblack,
+    normalize,
+    ordered_dither,
+    ordered_dither_p,
+    ostromoukhov,
+    ostromoukhov_s,
+    random_dither,
+    sauvola,
+    sierra24a,
+    stack_blur,
+    zhou_fang_fast,
+    zhou_fang_fast_s,
+)
+from hopfer.core.algorithms.ved_data import (
+    OSTROMOUKHOV_Q16,
+    ZF_PERT_Q16,
+    ZF_Q16,
+)
+from hopfer.helpers.kernels import get_kernel
+
+BAYER = generate_bayer_matrix(3, bit_depth=16)
+FS = ED_KERNELS["Floyd-Steinberg"]
+STUCKI = get_kernel("Stucki")
+# white as often as the level says, in 1 / 2^32
+CHANCE = np.arange(65536, dtype=np.uint64) << 16
+
+# the ops on a uint16 image, the ones working in place on a copy. the thread
+# counts are left to OpenMP, so the threads also run their own teams.
+OPS = {
+    "luminance": lambda img: luminance(np.dstack([img, img >> 1, ~img])),
+    "normalize": lambda img: normalize((img >> 1) + 4096),
+    "equalize": lambda img: equalize(img.copy()),
+    "median": lambda img: median(img, 9),
+    "stack_blur": lambda img: stack_blur(img.copy(), 9),
+    "niblack": lambda img: niblack((img >> 8).astype(np.uint8), 25, 0.2),
+    "sauvola": lambda img: sauvola((img >> 8).astype(np.uint8), 25, 0.5, 0.2),
+    "ordered_dither": lambda img: ordered_dither(img, BAYER),
+    "ordered_dither_p": lambda img: ordered_dither_p(img, BAYER, 0.1, 7),
+    "random_dither": lambda img: random_dither(img, CHANCE, 7),
+    "ed": lambda img: ed(img, STUCKI, 1.0, 0),
+    "eds": lambda img: eds(img, STUCKI, 1.0),
+    "ed_kernel": lambda img: ed_kernel(img, FS, 1.0, False, 0),
+    "ed_kernel serpentine": lambda img: ed_kernel(img, FS, 1.0, True, 0),
+    "sierra24a": lambda img: sierra24a(img, 1.0, False, 0),
+    "ostromoukhov": lambda img: ostromoukhov(img, OSTROMOUKHOV_Q16, 1.0, 0),
+    "ostromoukhov_s": lambda img: ostromoukhov_s(img, OSTROMOUKHOV_Q16, 1.0),
+    "zhou_fang_fast": lambda img: zhou_fang_fast(
+        img, ZF_Q16, ZF_PERT_Q16, 1.0, 0
+    ),
+    "zhou_fang_fast_s": lambda img: zhou_fang_fast_s(
+        img, ZF_Q16, ZF_PERT_Q16, 1.0
+    ),
+    "levien": lambda img: levien(img, 1.0, 0.5, True),
+    "nakano": lambda img: nakano(img, 1.0, 0.5, True),
+}
+
+
+def _images(n, h=384, w=512):
+    # a different image per thread, smooth enough for the ops to have
+    # something to do and noisy enough to differ everywhere
+    y, x = np.mgrid[0:h, 0:w]
+    images = []
+    for seed in range(n):
+        rng = np.random.default_rng(seed)
+        wave = np.sin(x / (20 + 7 * seed)) * np.cos(y / (30 + 5 * seed))
+        img = 0.5 + 0.4 * wave + rng.normal(0, 0.05, (h, w))
+        images.append((np.clip(img, 0, 1) * 65535).astype(np.uint16))
+    return images
+
+
+def _at_once(op, images):
+    # a thread per image, all of them let go at the same moment
+    results = [None] * len(images)
+    start = threading.Barrier(len(images))
+
+    def work(i):
+        start.wait()
+        results[i] = np.asarray(op(images[i]))
+
+    threads = [
+        threading.Thread(target=work, args=(i,)) for i in range(len(images))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.mark.parametrize("name", OPS)
+def test_two_threads_at_once(name):
+    # the GIL is released for the actual work, so these really run at the
+    # same time. anything shared between calls would show here.
+    op = OPS[name]
+    images = _images(2)
+    expected = [np.asarray(op(img)) for img in images]
+    for _ in range(3):
+        for result, serial in zip(_at_once(op, images), expected, strict=True):
+            np.testing.assert_array_equal(result, serial)
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from hopfer.core.algorithms.cython_ops import niblack, phansalkar, sauvola
+
+
+def _image(shape=(90, 120)):
+    rng = np.random.default_rng(3)
+    return rng.integers(0, 256, shape, dtype=np.uint8)
+
+
+@pytest.mark.parametrize(
+    "local", [niblack, sauvola, phansalkar], ids=lambda f: f.__name__
+)
+def test_window_too_big(local):
+    # 255 * 4105² doesn't fit the uint32 sums. a view, so the image takes
+    # no memory, it's refused before it's read.
+    img = np.broadcast_to(np.uint8(0), (4105, 4105))
+    with pytest.raises(ValueError):
+        local(img, 4105)
+    with pytest.raises(ValueError):
+        local(img, 4105, low_memory=True)
+
+
+def test_window_bigger_than_the_image():
+    # the window is cut off at the edges, it only has to fit the image
+    img = _image()
+    np.testing.assert_array_equal(niblack(img, 60000), niblack(img, 999))
+
+
+@pytest.mark.parametrize("n", [3, 25, 201])
+def test_streamed_matches_the_tables(n):
+    img = _image()
+    np.testing.assert_array_equal(
+        sauvola(img, n, 0.5, 0.2), sauvola(img, n, 0.5, 0.2, low_memory=True)
+    )
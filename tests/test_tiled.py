@@ -0,0 +1,132 @@
+import cv2
+import numpy as np
+import pytest
+
+from hopfer.core.algorithms.cython_ops import (
+    ED_KERNELS,
+    ed_kernel,
+    repair_seam,
+)
+from hopfer.core.algorithms.tiled import (
+    SEAM_ROWS,
+    _band_starts,
+    tiled_diffusion,
+)
+
+BANDS = 6
+
+
+def _gradient(h=768, w=1024):
+    # a gradient between flat patches of 25% and 75%, the flat ones have the
+    # most regular dot patterns, where a seam shows the most
+    img = np.tile(np.linspace(0, 1, w), (h, 1))
+    img[:, : w // 4] = 0.25
+    img[:, 3 * w // 4 :] = 0.75
+    return (img * 65535).astype(np.uint16)
+
+
+def _stripes(h=768, w=1024):
+    # flat stripes with a texture in between, the seams fall into flat ones
+    # unless they move
+    rng = np.random.default_rng(0)
+    texture = cv2.GaussianBlur(rng.random((h, w)).astype(np.float32), (0, 0), 3)
+    texture = (texture - texture.min()) / (texture.max() - texture.min())
+    stripe = (np.arange(h) + 16) // 32 % 3
+    img = np.empty((h, w), np.float32)
+    img[stripe == 0] = 0.25
+    img[stripe == 1] = 0.75
+    img[stripe == 2] = texture[stripe == 2]
+    return (img * 65535).astype(np.uint16)
+
+
+def seam_ratio(img, tiled, serial, seams, rows=4):
+    """
+    The error of the tiled output in the rows around the seams, over the
+    error of a single pass in the same rows. The error is the difference
+    to the image after a blur of about the size a dot is seen at. 1.0 means
+    the seams can't be told apart.
+    """
+
+    def error(out):
+        blurred = cv2.GaussianBlur(out.astype(np.float32), (0, 0), 2)
+        ref = cv2.GaussianBlur(img.astype(np.float32) / 65535, (0, 0), 2)
+        return np.abs(blurred - ref).mean(axis=1)
+
+    near = np.zeros(img.shape[0], dtype=bool)
+    for y in seams:
+        near[y - rows : y + rows] = True
+    return error(tiled)[near].mean() / error(serial)[near].mean()
+
+
+def _diffuse(algorithm, serpentine):
+    kernel_id = ED_KERNELS[algorithm]
+
+    def diffuse(img, prime=None):
+        return ed_kernel(img, kernel_id, 1.0, serpentine, 1, prime)
+
+    return diffuse
+
+
+def _unpack(packed, width):
+    return np.unpackbits(packed, axis=1)[:, :width]
+
+
+# the gradient gives the seams nowhere busy to go, there they were at 3.2, 1.5
+# and 3.0 before they were touched up, 1.3, 0.7 and 1.2 after. the texture
+# takes the touch up better than the single pass, 0.6, 0.6 and 0.2.
+@pytest.mark.parametrize(
+    "algorithm, serpentine, gradient_limit, stripes_limit",
+    [
+        ("Floyd-Steinberg", False, 1.5, 0.8),
+        ("Floyd-Steinberg", True, 1.0, 0.8),
+        ("Jarvis", False, 1.5, 0.8),
+    ],
+)
+def test_seams(algorithm, serpentine, gradient_limit, stripes_limit):
+    diffuse = _diffuse(algorithm, serpentine)
+    for img, limit in [
+        (_gradient(), gradient_limit),
+        (_stripes(), stripes_limit),
+    ]:
+        band_h = img.shape[0] // BANDS
+        seams = _band_starts(img, band_h)[1:]
+        tiled = _unpack(
+            tiled_diffusion(img, diffuse, bands=BANDS), img.shape[1]
+        )
+        serial = _unpack(diffuse(img), img.shape[1])
+        assert seam_ratio(img, tiled, serial, seams) < limit
+        # and the error isn't just pushed past the rows touched up
+        assert seam_ratio(img, tiled, serial, seams, rows=16) < limit
+
+
+def test_repair_seam_rows():
+    img = _gradient(256, 256)
+    diffuse = _diffuse("Floyd-Steinberg", False)
+    # a seam of its own, the lower half diffused apart from the upper
+    bits = np.vstack([diffuse(img[:128]), diffuse(img[128:])])
+    before = _unpack(bits, 256)
+
+    changes = repair_seam(bits, img, 128, SEAM_ROWS, passes=100)
+    after = _unpack(bits, 256)
+    changed = np.flatnonzero((before != after).any(axis=1))
+    assert changes > 0
+    assert changed.min() >= 128 - SEAM_ROWS
+    assert changed.max() < 128 + SEAM_ROWS
+
+    # fewer errors around the seam, and none left to fix
+    serial = _unpack(diffuse(img), 256)
+    assert seam_ratio(img, after, serial, [128], rows=16) < seam_ratio(
+        img, before, serial, [128], rows=16
+    )
+    assert repair_seam(bits, img, 128, SEAM_ROWS, passes=100) == 0
+
+
+def test_seams_move_into_busy_rows():
+    img = _stripes()
+    band_h = img.shape[0] // BANDS
+    starts = _band_starts(img, band_h)
+    assert starts[0] == 0
+    assert all(y % 2 == 0 for y in starts)
+    assert np.diff(starts).min() >= band_h // 2
+    # every seam is in a textured stripe
+    assert all((y + 16) // 32 % 3 == 2 for y in starts[1:])
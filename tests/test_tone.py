@@ -0,0 +1,81 @@
+import itertools
+
+import cv2
+import numpy as np
+import pytest
+
+from hopfer.core.algorithms.cython_ops import equalize, normalize
+from hopfer.core.tone import adjust_tone, brightness_contrast
+
+# (normalize, equalize, bc_t, brightness, contrast)
+SETTINGS = [
+    *itertools.product([False, True], [False, True], [False], [0.0], [0.0]),
+    *itertools.product(
+        [False, True], [False, True], [True], [-0.3, 0.0, 0.4], [-0.2, 0.5]
+    ),
+]
+
+
+def _settings(norm, eq, bc_t, brightness, contrast):
+    return {
+        "normalize": norm,
+        "equalize": eq,
+        "bc_t": bc_t,
+        "brightness": brightness,
+        "contrast": contrast,
+    }
+
+
+def _old_passes(image, im_settings):
+    # the three passes _enhance_image made before there was a tone curve
+    if im_settings["normalize"]:
+        image = normalize(image, lut=True)
+    if im_settings["equalize"]:
+        if image.dtype == np.uint8:
+            cv2.equalizeHist(image, dst=image)
+        else:
+            image = equalize(image)
+    bc = brightness_contrast(im_settings)
+    if bc:
+        brightness, alpha = bc
+        scale = 255 if image.dtype == np.uint8 else 65535
+        beta = (scale / 2) * (1.0 - alpha) + (brightness - 1.0) * scale
+        image = cv2.addWeighted(image, alpha, image, 0, beta, dst=image)
+    return image
+
+
+def _image(dtype, narrow, h=64, w=96):
+    # a gradient with noise on top, either over all the levels or a few
+    max_val = np.iinfo(dtype).max
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:h, 0:w]
+    img = x / (w - 1) + 0.2 * np.sin(y / 5) + rng.normal(0, 0.05, (h, w))
+    lo, hi = (0.3, 0.6) if narrow else (0.0, 1.0)
+    img = lo + (hi - lo) * np.clip(img, 0, 1)
+    return np.round(img * max_val).astype(dtype)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+@pytest.mark.parametrize("narrow", [False, True])
+@pytest.mark.parametrize("settings", SETTINGS)
+def test_same_levels_as_the_old_passes(dtype, narrow, settings):
+    im_settings = _settings(*settings)
+    img = _image(dtype, narrow)
+    expected = _old_passes(img.copy(), im_settings)
+    got = adjust_tone(img.copy(), im_settings)
+    assert got.dtype == dtype
+    np.testing.assert_array_equal(got, expected)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+def test_equalize_a_single_level(dtype):
+    # it stays where it is, like cv2.equalizeHist leaves it. the old 16 bit
+    # equalize turned it black.
+    level = np.iinfo(dtype).max // 3
+    img = np.full((16, 24), level, dtype=dtype)
+    got = adjust_tone(img.copy(), _settings(False, True, False, 0.0, 0.0))
+    np.testing.assert_array_equal(got, img)
+    if dtype == np.uint8:
+        np.testing.assert_array_equal(cv2.equalizeHist(img), img)
+    else:
+        assert not equalize(img.copy()).any()
@@ -0,0 +1,99 @@
+import cv2
+import numpy as np
+import pytest
+
+from hopfer.core.algorithms.cython_ops import (
+    ostromoukhov,
+    ostromoukhov_s,
+    zhou_fang_fast,
+    zhou_fang_fast_s,
+)
+from hopfer.core.algorithms.ved_data import (
+    OSTROMOUKHOV_COEFFN,
+    OSTROMOUKHOV_Q16,
+    ZF_COEFFN,
+    ZF_PERT,
+    ZF_PERT_Q16,
+    ZF_Q16,
+)
+
+# the Q16 kernels, taking the image and the diffusion factor
+KERNELS = {
+    ("Ostromoukhov", False): lambda img, f: ostromoukhov(
+        img, OSTROMOUKHOV_Q16, f, 1
+    ),
+    ("Ostromoukhov", True): lambda img, f: ostromoukhov_s(
+        img, OSTROMOUKHOV_Q16, f
+    ),
+    ("Zhou-Fang", False): lambda img, f: zhou_fang_fast(
+        img, ZF_Q16, ZF_PERT_Q16, f, 1
+    ),
+    ("Zhou-Fang", True): lambda img, f: zhou_fang_fast_s(
+        img, ZF_Q16, ZF_PERT_Q16, f
+    ),
+}
+
+
+def _reference(img, algorithm, serpentine, factor, seed=0):
+    """
+    The variable EDs in floats all the way, with the tables they were made
+    from. Zhou-Fang draws its own perturbation, so only the tone can match.
+    """
+    if algorithm == "Ostromoukhov":
+        coeff, pert = OSTROMOUKHOV_COEFFN, None
+    else:
+        coeff, pert = ZF_COEFFN, ZF_PERT
+    rng = np.random.default_rng(seed)
+    h, w = img.shape
+    # a column of padding on either side, what falls off the edges is lost
+    err = np.zeros((h + 1, w + 2))
+    out = np.zeros((h, w), dtype=np.uint8)
+    for y in range(h):
+        # serpentine starts right to left
+        step = -1 if serpentine and y % 2 == 0 else 1
+        noise = rng.uniform(0, 32768, w)
+        for x in range(w) if step == 1 else range(w - 1, -1, -1):
+            old = img[y, x] + err[y, x + 1]
+            i = min(max(int(old) >> 8, 0), 255)
+            threshold = old if pert is None else old + noise[x] * pert[i]
+            new = 65535 if threshold >= 32768 else 0
+            out[y, x] = new > 0
+            error = (old - new) * factor
+            err[y, x + 1 + step] += error * coeff[i, 0]
+            err[y + 1, x + 1 - step] += error * coeff[i, 1]
+            err[y + 1, x + 1] += error * coeff[i, 2]
+    return out
+
+
+def _image(h=96, w=128):
+    # a gradient with some waves on top
+    y, x = np.mgrid[0:h, 0:w]
+    img = 0.1 + 0.8 * x / (w - 1) + 0.08 * np.sin(y / 7) * np.cos(x / 11)
+    return (np.clip(img, 0, 1) * 65535).astype(np.uint16)
+
+
+def _blurred(img):
+    # about the size a dot is seen at, without the edges
+    blurred = cv2.GaussianBlur(img.astype(np.float32), (0, 0), 2)
+    return blurred[8:-8, 8:-8]
+
+
+# the Q16 tables and the rounding of every tap move pixels around, 25-40% of
+# them differ, but not the tone. the differences were 0.0015 in density and
+# 0.0104 blurred at most.
+@pytest.mark.parametrize("algorithm, serpentine", list(KERNELS))
+@pytest.mark.parametrize("factor", [1.0, 0.8])
+def test_matches_the_float_reference(algorithm, serpentine, factor):
+    img = _image()
+    width = img.shape[1]
+    got = KERNELS[algorithm, serpentine](img, factor)
+    got = np.unpackbits(got, axis=1)[:, :width]
+    expected = _reference(img, algorithm, serpentine, factor)
+
+    assert abs(got.mean() - expected.mean()) < 3e-3
+    source = _blurred(img / 65535)
+    difference = np.abs(_blurred(got) - _blurred(expected)).mean()
+    assert difference < 0.015
+    # and not further from the image than the reference
+    error = np.abs(_blurred(got) - source).mean()
+    assert error < 1.2 * np.abs(_blurred(expected) - source).mean()
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from hopfer.core.algorithms.cython_ops import (
+    ED_KERNELS,
+    ed,
+    ed_kernel,
+    ostromoukhov,
+    sierra24a,
+    zhou_fang_fast,
+)
+from hopfer.core.algorithms.priming import noise_rows, ved_noise_rows
+from hopfer.core.algorithms.ved_data import (
+    OSTROMOUKHOV_Q16,
+    ZF_PERT_Q16,
+    ZF_Q16,
+)
+from hopfer.helpers.kernels import get_kernel
+
+# a thread count forces the wavefront, even on an image this small and on
+# fewer cores than threads
+THREADS = [2, 3, 4, 7]
+
+# the raster scans with a wavefront, taking the image, the threads and the
+# priming rows
+SCANS = {
+    "ed": lambda img, t, p: ed(img, get_kernel("Stucki"), 1.0, t, p),
+    "ed_kernel FS": lambda img, t, p: ed_kernel(
+        img, ED_KERNELS["Floyd-Steinberg"], 1.0, False, t, p
+    ),
+    "ed_kernel Stucki large": lambda img, t, p: ed_kernel(
+        img, ED_KERNELS["Stucki large"], 0.8, False, t, p
+    ),
+    "sierra24a": lambda img, t, p: sierra24a(img, 1.0, False, t, p),
+    "ostromoukhov": lambda img, t, p: ostromoukhov(
+        img, OSTROMOUKHOV_Q16, 1.0, t, p
+    ),
+    "zhou_fang_fast": lambda img, t, p: zhou_fang_fast(
+        img, ZF_Q16, ZF_PERT_Q16, 1.0, t, p
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def image():
+    rng = np.random.default_rng(7)
+    return rng.integers(0, 65536, (67, 301), dtype=np.uint16)
+
+
+@pytest.mark.parametrize("name", list(SCANS))
+@pytest.mark.parametrize("primed", [False, True])
+def test_wavefront_matches_serial(image, name, primed):
+    scan = SCANS[name]
+    prime = None
+    if primed:
+        width = image.shape[1]
+        if name in ("ostromoukhov", "zhou_fang_fast"):
+            prime = ved_noise_rows(width)
+        else:
+            prime = noise_rows(width)
+    serial = scan(image, 1, prime)
+    for threads in THREADS:
+        np.testing.assert_array_equal(scan(image, threads, prime), serial)